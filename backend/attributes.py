@@ -5,6 +5,7 @@
 
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import os
@@ -19,6 +20,9 @@ from attribute_recognition import (
     validate_extracted_attributes,
     highlight_text_with_attributes
 )
+from ocr_correction import get_corrector
+from result_cache import make_cache_key
+from request_coalescing import processing_flights
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -33,6 +37,7 @@ class AttributeExtractionRequest(BaseModel):
     text: Optional[str] = None
     extraction_rules: Optional[Dict[str, Any]] = None
     validation_enabled: Optional[bool] = True
+    post_correction: Optional[bool] = False  # Исправить ошибки OCR в переданном тексте перед извлечением
 
 class AttributeExtractionResponse(BaseModel):
     status: str
@@ -118,16 +123,15 @@ async def get_attribute_types() -> JSONResponse:
             detail=f"Ошибка при получении типов атрибутов: {str(e)}"
         )
 
-@router.post("/extract")
-async def extract_attributes_from_text(request: AttributeExtractionRequest) -> JSONResponse:
+def _extract_attributes(request: AttributeExtractionRequest) -> Dict[str, Any]:
     """
-    Извлечение атрибутов из текста
+    Выполняет извлечение атрибутов (блокирующая часть запроса)
     
     Args:
         request: Запрос на извлечение атрибутов
         
     Returns:
-        JSON с извлеченными атрибутами
+        Содержимое JSON-ответа с извлеченными атрибутами
     """
     try:
         logger.info(f"Начинаем извлечение атрибутов для файла: {request.file_id}")
@@ -155,6 +159,11 @@ async def extract_attributes_from_text(request: AttributeExtractionRequest) -> J
         # Выполняем извлечение атрибутов
         start_time = time.time()
         
+        # Результаты OCR уже исправлены при распознавании; переданный текст - по запросу
+        corrections = None
+        if request.text and request.post_correction:
+            text, corrections = get_corrector().correct_text(text)
+        
         # Извлекаем атрибуты
         extracted_attributes = extract_attributes(text)
         
@@ -206,32 +215,30 @@ async def extract_attributes_from_text(request: AttributeExtractionRequest) -> J
         
         logger.info(f"Извлечение атрибутов завершено за {processing_time:.2f} секунд")
         
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "success",
-                "message": "Извлечение атрибутов завершено успешно",
-                "data": {
-                    "file_id": request.file_id,
-                    "source_text": text,
-                    "extracted_attributes": extracted_attributes,
-                    "attributes_list": attributes_list,
-                    "attributes_with_positions": attributes_with_positions,
-                    "validation_results": validation_results,
-                    "highlighted_html": highlighted_html,
-                    "statistics": {
-                        "total_attributes": len(extracted_attributes),
-                        "extracted_attributes": len([v for v in extracted_attributes.values() if v]),
-                        "validated_attributes": len([v for v in validation_results.values() if v]) if validation_results else 0,
-                        "text_length": len(text)
-                    },
-                    "extraction_rules": request.extraction_rules or {},
-                    "result_file": result_path,
-                    "processing_time": processing_time,
-                    "extracted_at": datetime.now().isoformat()
-                }
+        return {
+            "status": "success",
+            "message": "Извлечение атрибутов завершено успешно",
+            "data": {
+                "file_id": request.file_id,
+                "source_text": text,
+                "corrections": corrections,
+                "extracted_attributes": extracted_attributes,
+                "attributes_list": attributes_list,
+                "attributes_with_positions": attributes_with_positions,
+                "validation_results": validation_results,
+                "highlighted_html": highlighted_html,
+                "statistics": {
+                    "total_attributes": len(extracted_attributes),
+                    "extracted_attributes": len([v for v in extracted_attributes.values() if v]),
+                    "validated_attributes": len([v for v in validation_results.values() if v]) if validation_results else 0,
+                    "text_length": len(text)
+                },
+                "extraction_rules": request.extraction_rules or {},
+                "result_file": result_path,
+                "processing_time": processing_time,
+                "extracted_at": datetime.now().isoformat()
             }
-        )
+        }
         
     except HTTPException:
         raise
@@ -242,6 +249,28 @@ async def extract_attributes_from_text(request: AttributeExtractionRequest) -> J
             detail=f"Ошибка при извлечении атрибутов: {str(e)}"
         )
 
+@router.post("/extract")
+async def extract_attributes_from_text(request: AttributeExtractionRequest) -> JSONResponse:
+    """
+    Извлечение атрибутов из текста
+    
+    Одновременные одинаковые запросы (тот же файл, текст и правила)
+    выполняются один раз и получают общий результат.
+    
+    Args:
+        request: Запрос на извлечение атрибутов
+        
+    Returns:
+        JSON с извлеченными атрибутами
+    """
+    flight_key = make_cache_key("attributes", request.model_dump())
+    content, _coalesced = await processing_flights.do(
+        flight_key,
+        "attributes",
+        lambda: run_in_threadpool(_extract_attributes, request)
+    )
+    return JSONResponse(status_code=200, content=content)
+
 @router.get("/result/{file_id}")
 async def get_attribute_result(file_id: str) -> JSONResponse:
     """
@@ -0,0 +1,149 @@
+"""
+Модуль хеширования содержимого
+Вычисляет хеши содержимого файлов для дедупликации и кеширования
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple, Union
+
+import cv2
+import numpy as np
+
+# Размер блока чтения файла при потоковом хешировании
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Перцептивный хеш страницы: сравнение плотности чернил соседних ячеек сетки
+# PERCEPTUAL_HASH_SIZE x PERCEPTUAL_HASH_SIZE; разница меньше PERCEPTUAL_HASH_MARGIN (из 255) - шум
+PERCEPTUAL_HASH_SIZE = 32
+PERCEPTUAL_HASH_MARGIN = 8
+
+# Мемоизация хешей: (путь, размер, mtime_ns) -> хеш
+HASH_MEMO_SIZE = 4096
+_hash_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_hash_memo_lock = threading.Lock()
+
+
+def compute_file_hash(file_path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    Вычисляет SHA-256 хеш содержимого файла
+
+    Файл читается блоками, поэтому память не зависит от размера файла.
+
+    Args:
+        file_path: Путь к файлу
+        chunk_size: Размер блока чтения в байтах
+
+    Returns:
+        Хеш содержимого в шестнадцатеричном виде
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_file_hash(file_path: str) -> str:
+    """
+    Возвращает хеш содержимого файла с мемоизацией
+
+    Повторное хеширование выполняется только если изменились размер
+    или время модификации файла.
+
+    Args:
+        file_path: Путь к файлу
+
+    Returns:
+        Хеш содержимого в шестнадцатеричном виде
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    with _hash_memo_lock:
+        cached = _hash_memo.get(memo_key)
+        if cached is not None:
+            _hash_memo.move_to_end(memo_key)
+            return cached
+
+    content_hash = compute_file_hash(file_path)
+
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = content_hash
+        while len(_hash_memo) > HASH_MEMO_SIZE:
+            _hash_memo.popitem(last=False)
+    return content_hash
+
+
+def compute_bytes_hash(data: Union[bytes, bytearray, memoryview]) -> str:
+    """
+    Вычисляет SHA-256 хеш последовательности байтов
+
+    Args:
+        data: Данные для хеширования
+
+    Returns:
+        Хеш данных в шестнадцатеричном виде
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def compute_image_hash(image: np.ndarray) -> str:
+    """
+    Вычисляет SHA-256 хеш пикселей изображения
+
+    В отличие от хеша файла не зависит от контейнера: пересохраненный PDF
+    или TIFF с теми же пикселями страницы дает тот же хеш.
+
+    Args:
+        image: Декодированное изображение
+
+    Returns:
+        Хеш в шестнадцатеричном виде
+    """
+    digest = hashlib.sha256(f"{image.shape}:{image.dtype.str}".encode("ascii"))
+    digest.update(memoryview(np.ascontiguousarray(image)).cast("B"))
+    return digest.hexdigest()
+
+
+def compute_perceptual_hash(image: np.ndarray, size: int = PERCEPTUAL_HASH_SIZE) -> str:
+    """
+    Вычисляет перцептивный хеш страницы (dHash по маске чернил)
+
+    Маска чернил (порог Оцу) обрезается по рамке текста и уменьшается до
+    сетки size x (size + 1) с усреднением; бит хеша - больше ли чернил в
+    ячейке справа. Повторный скан той же страницы (шум, сдвиг, яркость)
+    дает хеш на малом расстоянии Хэмминга, замена строк текста - на большом.
+    Изменения отдельных символов хеш может не различить.
+
+    Args:
+        image: Изображение (оттенки серого или BGR)
+        size: Размер сетки (хеш из size * size бит)
+
+    Returns:
+        Хеш в шестнадцатеричном виде
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    x, y, width, height = cv2.boundingRect(mask)
+    if width and height:
+        mask = mask[y:y + height, x:x + width]
+    small = cv2.resize(mask, (size + 1, size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = small[:, 1:] > small[:, :-1] + PERCEPTUAL_HASH_MARGIN
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming_distance(first: str, second: str) -> int:
+    """
+    Расстояние Хэмминга между перцептивными хешами
+
+    Args:
+        first: Хеш в шестнадцатеричном виде
+        second: Хеш той же длины
+
+    Returns:
+        Число различающихся бит
+    """
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
@@ -0,0 +1,891 @@
+"""
+Модуль многостраничных документов
+Разбивает многостраничные TIFF и PDF на страницы и обрабатывает их параллельно
+"""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+import cv2
+
+from image_processing import PREPROCESS_VERSION, QUALITY_ANALYZER_VERSION, load_image, preprocess_page, process_shared_page
+from ocr_engines import recognize_page, OCR_ENGINE_VERSION, SUPPORTED_LANGUAGES, MODEL_TYPES
+from layout import LAYOUT_VERSION
+from language_detection import AUTO_LANGUAGE, LANGUAGE_DETECTOR_VERSION, detect_language
+from handwriting_detection import AUTO_MODEL_TYPE, CLASSIFIER_VERSION
+from shared_images import shared_images
+from structured_results import StructuredResult, structured_result_path
+from ocr_correction import POST_CORRECTION_DEFAULT, correct_page, get_corrector
+from content_hash import compute_bytes_hash, compute_image_hash, compute_perceptual_hash, hamming_distance
+from result_cache import DiskLRUCache, MemoryLRUCache, TieredCache, make_cache_key
+from request_coalescing import processing_flights
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Создаем роутер для маршрутов многостраничных документов
+router = APIRouter(prefix="/documents", tags=["documents"])
+
+# Конфигурация (через переменные окружения)
+DOCUMENT_PAGE_WORKERS = int(os.getenv("DOCUMENT_PAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Где выполняется предобработка страниц: thread - потоки процесса сервера,
+# process - отдельные процессы (страница передается через общую память)
+DOCUMENT_PAGE_EXECUTOR = os.getenv("DOCUMENT_PAGE_EXECUTOR", "thread")
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "300"))
+
+# Проверка качества текстового слоя PDF: слой используется вместо OCR,
+# если на странице достаточно символов и они не похожи на "мусор"
+# (неверная кодировка шрифта, символы из области частного использования)
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "20"))
+PDF_TEXT_MIN_VALID_RATIO = float(os.getenv("PDF_TEXT_MIN_VALID_RATIO", "0.95"))
+PDF_TEXT_MIN_LETTER_RATIO = float(os.getenv("PDF_TEXT_MIN_LETTER_RATIO", "0.5"))
+# Версия извлечения и проверки текстового слоя: входит в ключ кеша OCR
+TEXT_LAYER_VERSION = "1"
+
+MULTIPAGE_EXTENSIONS = {".pdf", ".tif", ".tiff"}
+
+# Результаты страниц для повторной обработки документов:
+# (хеш пикселей страницы, параметры обработки) -> результат страницы
+DOCUMENT_PAGE_CACHE_DIR = os.getenv("DOCUMENT_PAGE_CACHE_DIR", os.path.join("cache", "document_pages"))
+DOCUMENT_PAGE_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_PAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+DOCUMENT_PAGE_CACHE_MEMORY_ENTRIES = int(os.getenv("DOCUMENT_PAGE_CACHE_MEMORY_ENTRIES", "1024"))
+page_cache = TieredCache(
+    MemoryLRUCache(DOCUMENT_PAGE_CACHE_MEMORY_ENTRIES, name="document-pages-memory"),
+    DiskLRUCache(DOCUMENT_PAGE_CACHE_DIR, DOCUMENT_PAGE_CACHE_MAX_BYTES, name="document-pages-disk")
+)
+
+# Похожая страница (reuse_similar_pages): страница новой версии документа берется
+# из предыдущей, если ее перцептивный хеш отличается не больше чем на столько бит
+# (из 1024). Хеш не различает отдельные символы, поэтому такое переиспользование
+# включается только явно
+PAGE_HASH_MAX_DISTANCE = int(os.getenv("PAGE_HASH_MAX_DISTANCE", "12"))
+
+# Поля результата страницы, которые относятся к конкретному документу, а не к содержимому
+PAGE_IDENTITY_FIELDS = ("page", "page_id", "page_hash", "reused", "reused_from", "processing_time")
+
+
+# Модели данных
+class DocumentProcessRequest(BaseModel):
+    file_id: str
+    steps: Optional[List[str]] = None
+    parameters: Optional[Dict[str, Any]] = None
+    adaptive: Optional[bool] = True  # Без steps: выбрать этапы по качеству каждой страницы
+    language: Optional[str] = AUTO_LANGUAGE  # "auto" - язык определяется для каждой страницы
+    model_type: Optional[str] = AUTO_MODEL_TYPE  # "auto" - модель выбирается по типу текста каждой строки
+    ocr: Optional[bool] = True
+    post_correction: Optional[bool] = POST_CORRECTION_DEFAULT  # Исправление ошибок OCR по словарям
+    use_text_layer: Optional[bool] = True  # Брать текст из текстового слоя PDF вместо OCR
+    max_workers: Optional[int] = None
+    reuse_pages: Optional[bool] = True  # Брать сохраненные результаты страниц с неизмененным содержимым
+    previous_file_id: Optional[str] = None  # Предыдущая версия документа (например, до пересканирования)
+    reuse_similar_pages: Optional[bool] = False  # Брать страницы previous_file_id с близким перцептивным хешем
+
+
+def make_page_id(file_id: str, page_number: int) -> str:
+    """
+    Формирует идентификатор страницы как поддокумента
+
+    Args:
+        file_id: ID исходного файла
+        page_number: Номер страницы (с 1)
+
+    Returns:
+        ID страницы вида {file_id}_p0001
+    """
+    return f"{file_id}_p{page_number:04d}"
+
+
+def _to_gray(page: np.ndarray) -> np.ndarray:
+    """Приводит декодированную страницу к оттенкам серого uint8"""
+    if page.dtype == np.uint16:
+        page = (page >> 8).astype(np.uint8)
+    elif page.dtype == np.bool_:
+        page = page.astype(np.uint8) * 255
+    elif page.dtype != np.uint8:
+        page = np.clip(page, 0, 255).astype(np.uint8)
+    if page.ndim == 3:
+        conversion = cv2.COLOR_RGBA2GRAY if page.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        page = cv2.cvtColor(np.ascontiguousarray(page[:, :, :4]), conversion)
+    return page
+
+
+def _import_pymupdf():
+    try:
+        import pymupdf
+        return pymupdf
+    except ImportError:
+        pass
+    try:
+        import fitz  # Имя модуля в версиях PyMuPDF до 1.24
+        return fitz
+    except ImportError:
+        raise ValueError("Для обработки PDF требуется PyMuPDF (pip install PyMuPDF)")
+
+
+def render_pdf_page(pdf_page: Any, dpi: int = PDF_RENDER_DPI) -> np.ndarray:
+    """
+    Рендерит страницу PDF в изображение в оттенках серого
+
+    Args:
+        pdf_page: Страница PyMuPDF
+        dpi: Разрешение рендеринга
+
+    Returns:
+        Изображение страницы uint8
+    """
+    pymupdf = _import_pymupdf()
+    pixmap = pdf_page.get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY, alpha=False)
+    page = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)
+    return np.ascontiguousarray(page[:, :pixmap.width])
+
+
+def assess_text_layer(text: str) -> Dict[str, Any]:
+    """
+    Проверяет качество извлеченного текстового слоя
+
+    Слой считается пригодным, если в нем достаточно символов, почти все
+    символы печатные (нет U+FFFD и символов области частного
+    использования - признаков неверной кодировки шрифта), значимая доля
+    символов - буквы и средняя длина слова правдоподобна.
+
+    Args:
+        text: Текст слоя страницы
+
+    Returns:
+        Метрики качества и признак пригодности (usable)
+    """
+    characters = [char for char in text if not char.isspace()]
+    char_count = len(characters)
+    if char_count == 0:
+        return {"usable": False, "char_count": 0, "valid_ratio": 0.0, "letter_ratio": 0.0, "mean_word_length": 0.0}
+
+    valid = sum(
+        1 for char in characters
+        if char.isprintable() and char != "\ufffd" and not "\ue000" <= char <= "\uf8ff"
+    )
+    letters = sum(1 for char in characters if char.isalpha())
+    words = text.split()
+    valid_ratio = valid / char_count
+    letter_ratio = letters / char_count
+    mean_word_length = char_count / len(words)
+
+    usable = (
+        char_count >= PDF_TEXT_MIN_CHARS
+        and valid_ratio >= PDF_TEXT_MIN_VALID_RATIO
+        and letter_ratio >= PDF_TEXT_MIN_LETTER_RATIO
+        and 1.5 <= mean_word_length <= 25.0
+    )
+    return {
+        "usable": usable,
+        "char_count": char_count,
+        "valid_ratio": round(valid_ratio, 4),
+        "letter_ratio": round(letter_ratio, 4),
+        "mean_word_length": round(mean_word_length, 2)
+    }
+
+
+def extract_page_text_layer(pdf_page: Any, dpi: int = PDF_RENDER_DPI) -> Dict[str, Any]:
+    """
+    Извлекает текстовый слой страницы PDF с позициями строк
+
+    Args:
+        pdf_page: Страница PyMuPDF
+        dpi: Разрешение, в пикселях которого возвращаются координаты
+            (совпадает с разрешением рендеринга страниц)
+
+    Returns:
+        Словарь с текстом, блоками строк (bbox в пикселях) и оценкой качества
+    """
+    scale = dpi / 72.0
+    lines: Dict[Tuple[int, int], List[Tuple[float, float, float, float, str]]] = {}
+    for x0, y0, x1, y1, word, block_number, line_number, _word_number in pdf_page.get_text("words"):
+        lines.setdefault((block_number, line_number), []).append((x0, y0, x1, y1, word))
+
+    text_blocks = []
+    for words in lines.values():
+        x0 = min(word[0] for word in words)
+        y0 = min(word[1] for word in words)
+        x1 = max(word[2] for word in words)
+        y1 = max(word[3] for word in words)
+        text_blocks.append({
+            "text": " ".join(word[4] for word in words),
+            "confidence": 1.0,
+            "bbox": {
+                "x": int(round(x0 * scale)),
+                "y": int(round(y0 * scale)),
+                "width": int(round((x1 - x0) * scale)),
+                "height": int(round((y1 - y0) * scale))
+            }
+        })
+
+    text = pdf_page.get_text("text").strip()
+    return {
+        "text": text,
+        "text_blocks": text_blocks,
+        "width": int(round(pdf_page.rect.width * scale)),
+        "height": int(round(pdf_page.rect.height * scale)),
+        "quality": assess_text_layer(text)
+    }
+
+
+def load_pdf_page(file_path: str, page_number: int, dpi: int = PDF_RENDER_DPI) -> np.ndarray:
+    """
+    Рендерит одну страницу PDF
+
+    Args:
+        file_path: Путь к PDF
+        page_number: Номер страницы (с 1)
+        dpi: Разрешение рендеринга
+
+    Returns:
+        Изображение страницы в оттенках серого
+    """
+    pymupdf = _import_pymupdf()
+    with pymupdf.open(file_path) as pdf:
+        return render_pdf_page(pdf.load_page(page_number - 1), dpi)
+
+
+def extract_pdf_text_layers(file_path: str, dpi: int = PDF_RENDER_DPI) -> List[Dict[str, Any]]:
+    """
+    Извлекает текстовые слои всех страниц PDF без рендеринга
+
+    Args:
+        file_path: Путь к PDF
+        dpi: Разрешение для координат блоков
+
+    Returns:
+        Текстовые слои страниц по порядку
+    """
+    pymupdf = _import_pymupdf()
+    with pymupdf.open(file_path) as pdf:
+        return [extract_page_text_layer(pdf.load_page(index), dpi) for index in range(pdf.page_count)]
+
+
+def get_page_count(file_path: str) -> int:
+    """
+    Определяет количество страниц документа без декодирования страниц
+
+    Args:
+        file_path: Путь к файлу
+
+    Returns:
+        Количество страниц (1 для одностраничных форматов)
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".pdf":
+        pymupdf = _import_pymupdf()
+        with pymupdf.open(file_path) as pdf:
+            return pdf.page_count
+    if extension in (".tif", ".tiff"):
+        try:
+            import tifffile
+            with tifffile.TiffFile(file_path) as tif:
+                return len(tif.pages)
+        except ImportError:
+            from PIL import Image
+            with Image.open(file_path) as pil_image:
+                return getattr(pil_image, "n_frames", 1)
+    return 1
+
+
+def iter_document_pages(
+    file_path: str,
+    use_text_layer: bool = False
+) -> Iterator[Tuple[int, Optional[np.ndarray], Optional[Dict[str, Any]]]]:
+    """
+    Лениво декодирует страницы документа по одной
+
+    Следующая страница декодируется только когда потребитель запрашивает
+    ее у генератора, поэтому в памяти одновременно находится одна страница
+    (плюс страницы, которые уже обрабатываются потребителем). Страницы PDF
+    с пригодным текстовым слоем при use_text_layer не рендерятся.
+
+    Args:
+        file_path: Путь к файлу (PDF, многостраничный TIFF или изображение)
+        use_text_layer: Проверять текстовый слой страниц PDF
+
+    Yields:
+        (номер страницы с 1, изображение страницы в оттенках серого или None,
+        текстовый слой страницы или None)
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension == ".pdf":
+        pymupdf = _import_pymupdf()
+        with pymupdf.open(file_path) as pdf:
+            for index in range(pdf.page_count):
+                pdf_page = pdf.load_page(index)
+                text_layer = extract_page_text_layer(pdf_page) if use_text_layer else None
+                if text_layer is not None and text_layer["quality"]["usable"]:
+                    yield index + 1, None, text_layer
+                else:
+                    yield index + 1, render_pdf_page(pdf_page), text_layer
+        return
+
+    if extension in (".tif", ".tiff"):
+        try:
+            import tifffile
+        except ImportError:
+            tifffile = None
+
+        if tifffile is not None:
+            with tifffile.TiffFile(file_path) as tif:
+                for index, tiff_page in enumerate(tif.pages):
+                    yield index + 1, _to_gray(tiff_page.asarray()), None
+            return
+
+        from PIL import Image
+        with Image.open(file_path) as pil_image:
+            for index in range(getattr(pil_image, "n_frames", 1)):
+                pil_image.seek(index)
+                yield index + 1, np.array(pil_image.convert("L")), None
+        return
+
+    yield 1, load_image(file_path), None
+
+
+def process_pages(
+    file_path: str,
+    handler: Callable[[int, Optional[np.ndarray], Optional[Dict[str, Any]]], Dict[str, Any]],
+    max_workers: int = DOCUMENT_PAGE_WORKERS,
+    use_text_layer: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Обрабатывает страницы документа параллельно с ограничением памяти
+
+    Новая страница декодируется только когда освобождается один из
+    обработчиков, поэтому одновременно в памяти не больше max_workers
+    страниц в обработке и одной декодируемой.
+
+    Args:
+        file_path: Путь к документу
+        handler: Обработчик страницы (номер страницы, изображение, текстовый слой) -> результат
+        max_workers: Количество параллельно обрабатываемых страниц
+        use_text_layer: Не рендерить страницы PDF с пригодным текстовым слоем
+
+    Returns:
+        Результаты обработки страниц в порядке страниц
+    """
+    max_workers = max(int(max_workers), 1)
+    slots = threading.BoundedSemaphore(max_workers)
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="document-page") as executor:
+        for page_number, page, text_layer in iter_document_pages(file_path, use_text_layer):
+            slots.acquire()
+            future = executor.submit(handler, page_number, page, text_layer)
+            future.add_done_callback(lambda _future: slots.release())
+            futures.append(future)
+            del page
+
+    return [future.result() for future in futures]
+
+
+_page_process_pool: Optional[ProcessPoolExecutor] = None
+_page_process_pool_lock = threading.Lock()
+
+
+def get_page_process_pool() -> ProcessPoolExecutor:
+    """Возвращает пул процессов предобработки страниц (создается при первом обращении)"""
+    global _page_process_pool
+    with _page_process_pool_lock:
+        if _page_process_pool is None:
+            _page_process_pool = ProcessPoolExecutor(
+                max_workers=DOCUMENT_PAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Запущен пул процессов предобработки страниц: {DOCUMENT_PAGE_WORKERS}")
+        return _page_process_pool
+
+
+def shutdown_page_process_pool() -> None:
+    """Останавливает пул процессов предобработки и освобождает общие буферы"""
+    global _page_process_pool
+    with _page_process_pool_lock:
+        if _page_process_pool is not None:
+            _page_process_pool.shutdown(wait=True, cancel_futures=True)
+            _page_process_pool = None
+    shared_images.close()
+
+
+def _find_upload(file_id: str) -> Optional[str]:
+    """Ищет загруженный файл по ID"""
+    upload_dir = "uploads"
+    if os.path.exists(upload_dir):
+        for filename in os.listdir(upload_dir):
+            if filename.startswith(file_id):
+                return os.path.join(upload_dir, filename)
+    return None
+
+
+def _load_document(file_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Загружает последний сводный результат обработки документа
+
+    Args:
+        file_id: ID файла
+
+    Returns:
+        Содержимое document_{file_id}_{timestamp}.json или None
+    """
+    prefix = f"document_{file_id}_"
+    if not os.path.isdir("ocr_results"):
+        return None
+    paths = [
+        os.path.join("ocr_results", filename)
+        for filename in os.listdir("ocr_results")
+        if filename.startswith(prefix) and filename.endswith(".json")
+    ]
+    if not paths:
+        return None
+    with open(max(paths, key=os.path.getmtime), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _stored_page(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Результат страницы без полей, привязанных к документу
+
+    Returns:
+        Результат или None, если обработанное изображение страницы уже удалено
+    """
+    processed_file = result.get("processed_file")
+    if processed_file and not os.path.exists(processed_file):
+        return None
+    return {key: value for key, value in result.items() if key not in PAGE_IDENTITY_FIELDS}
+
+
+def _match_previous_page(page_number: int, perceptual_hash: str,
+                         previous_pages: Dict[int, Dict[str, Any]]) -> Optional[Tuple[Dict[str, Any], int]]:
+    """
+    Сравнивает страницу со страницей с тем же номером в предыдущей версии документа
+
+    Страницы с другими номерами не рассматриваются: у страниц одного макета
+    (бланки, описи) перцептивные хеши близки и при разном тексте.
+
+    Args:
+        page_number: Номер страницы
+        perceptual_hash: Перцептивный хеш страницы
+        previous_pages: Страницы предыдущей версии по номерам
+
+    Returns:
+        (страница, расстояние Хэмминга) или None, если страница изменилась
+    """
+    previous = previous_pages.get(page_number)
+    if previous is None or not (previous.get("page_hash") or {}).get("perceptual"):
+        return None
+    distance = hamming_distance(perceptual_hash, previous["page_hash"]["perceptual"])
+    return (previous, distance) if distance <= PAGE_HASH_MAX_DISTANCE else None
+
+
+def _fill_perceptual_hashes(file_id: str, previous_pages: Dict[int, Dict[str, Any]]) -> None:
+    """
+    Досчитывает перцептивные хеши страниц предыдущей версии документа
+
+    Перцептивный хеш вычисляется только при сравнении с предыдущей версией,
+    поэтому у страниц, обработанных без сравнения, его нет. Такие страницы
+    декодируются из загруженного файла предыдущей версии.
+
+    Args:
+        file_id: ID предыдущей версии документа
+        previous_pages: Страницы предыдущей версии по номерам (дополняются на месте)
+    """
+    missing = {
+        number for number, page in previous_pages.items() if not (page.get("page_hash") or {}).get("perceptual")
+    }
+    if not missing:
+        return
+    file_path = _find_upload(file_id)
+    if not file_path:
+        logger.info(f"Файл предыдущей версии документа {file_id} не найден, сравнение страниц без перцептивных хешей невозможно")
+        return
+    try:
+        for page_number, page, _text_layer in iter_document_pages(file_path):
+            if page_number in missing:
+                previous_pages[page_number]["page_hash"] = dict(
+                    previous_pages[page_number].get("page_hash") or {}, perceptual=compute_perceptual_hash(page)
+                )
+                missing.discard(page_number)
+            if not missing:
+                break
+    except ValueError as e:
+        logger.warning(f"Не удалось декодировать предыдущую версию документа {file_id}: {str(e)}")
+
+
+def run_document_processing(request: DocumentProcessRequest) -> Dict[str, Any]:
+    """
+    Выполняет постраничную обработку документа (блокирующая часть запроса)
+
+    Вызывается эндпоинтом /documents/process и горячей папкой.
+
+    Args:
+        request: Запрос на обработку документа
+
+    Returns:
+        Содержимое JSON-ответа с результатами по страницам и документу
+    """
+    try:
+        logger.info(f"Постраничная обработка документа: {request.file_id}")
+
+        # Валидация параметров до декодирования страниц
+        if request.language not in SUPPORTED_LANGUAGES and request.language != AUTO_LANGUAGE:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый язык: {request.language}")
+        if request.model_type not in MODEL_TYPES and request.model_type != AUTO_MODEL_TYPE:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый тип модели: {request.model_type}")
+
+        file_path = _find_upload(request.file_id)
+        if not file_path or not os.path.exists(file_path):
+            raise HTTPException(
+                status_code=404,
+                detail="Файл не найден"
+            )
+
+        adaptive = request.steps is None and request.adaptive
+        steps = request.steps or ["align_image", "enhance_contrast", "remove_noise"]
+        timestamp = int(time.time())
+        os.makedirs("processed", exist_ok=True)
+
+        # Параметры, от которых зависит результат страницы с данными пикселями
+        processing_key = make_cache_key(
+            None if adaptive else steps, adaptive, request.parameters, PREPROCESS_VERSION,
+            QUALITY_ANALYZER_VERSION if adaptive else None,
+            request.ocr, request.language if request.ocr else None, request.model_type if request.ocr else None,
+            get_corrector().version if request.ocr and request.post_correction else None, OCR_ENGINE_VERSION, LAYOUT_VERSION, LANGUAGE_DETECTOR_VERSION, CLASSIFIER_VERSION
+        )
+
+        # Страницы предыдущей версии документа, обработанной с теми же параметрами
+        previous_pages: Dict[int, Dict[str, Any]] = {}
+        if request.reuse_pages and request.reuse_similar_pages and request.previous_file_id:
+            previous = _load_document(request.previous_file_id)
+            if previous is None:
+                logger.info(f"Предыдущая версия документа {request.previous_file_id} не найдена")
+            elif previous.get("processing_key") != processing_key:
+                logger.info(f"Предыдущая версия документа {request.previous_file_id} обработана с другими параметрами")
+            else:
+                previous_pages = {
+                    page["page"]: page for page in previous["pages"] if page.get("text_source") != "text_layer"
+                }
+                _fill_perceptual_hashes(request.previous_file_id, previous_pages)
+
+        def reuse_page(page_hash: Dict[str, str], page_number: int) -> Optional[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]]:
+            stored = page_cache.get(make_cache_key(page_hash["content"], processing_key))
+            if stored is not None and _stored_page(stored) is not None:
+                return "content", stored, None
+            match = _match_previous_page(page_number, page_hash["perceptual"], previous_pages)
+            if match is not None:
+                stored = _stored_page(match[0])
+                if stored is not None:
+                    # В кеш по хешу пикселей не записывается: пиксели отличаются, совпадение лишь похожее
+                    logger.info(f"Страница {page_number} похожа на страницу предыдущей версии (расстояние {match[1]})")
+                    return "perceptual", stored, {
+                        "file_id": request.previous_file_id,
+                        "page": page_number,
+                        "distance": match[1]
+                    }
+            return None
+
+        def handle_page(page_number: int, page: Optional[np.ndarray], text_layer: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            page_id = make_page_id(request.file_id, page_number)
+            page_start = time.time()
+
+            if page is None:
+                # Страница с пригодным текстовым слоем: без рендеринга и OCR
+                page_language = request.language
+                if page_language == AUTO_LANGUAGE:
+                    page_language = detect_language(text_layer["text"])["language"]
+                return {
+                    "page": page_number,
+                    "page_id": page_id,
+                    "text_source": "text_layer",
+                    "text_layer_quality": text_layer["quality"],
+                    "recognized_text": text_layer["text"],
+                    "raw_text": text_layer["text"],
+                    "language": page_language,
+                    "text_blocks": [dict(block, language=page_language) for block in text_layer["text_blocks"]],
+                    "page_size": {"width": text_layer["width"], "height": text_layer["height"]},
+                    "page_hash": {"content": compute_bytes_hash(text_layer["text"].encode("utf-8")), "perceptual": None},
+                    "reused": None,
+                    "reused_from": None,
+                    "processing_time": time.time() - page_start
+                }
+
+            # Хеши страницы: пиксели (точное совпадение) и перцептивный (повторный скан);
+            # перцептивный нужен только для сравнения с предыдущей версией
+            page_hash = {
+                "content": compute_image_hash(page),
+                "perceptual": compute_perceptual_hash(page) if previous_pages else None
+            }
+            if request.reuse_pages:
+                reused = reuse_page(page_hash, page_number)
+                if reused is not None:
+                    result = {"page": page_number, "page_id": page_id, **reused[1]}
+                    if text_layer is not None:
+                        result["text_layer_quality"] = text_layer["quality"]
+                    result.update({
+                        "page_hash": page_hash,
+                        "reused": reused[0],
+                        "reused_from": reused[2],
+                        "processing_time": time.time() - page_start
+                    })
+                    return result
+
+            processed_path = os.path.join("processed", f"processed_{page_id}_{timestamp}.jpg")
+            if DOCUMENT_PAGE_EXECUTOR == "process":
+                # В процесс-обработчик передается дескриптор общего буфера, а не копия страницы
+                with shared_images.lease(page) as descriptor:
+                    page_result = get_page_process_pool().submit(
+                        process_shared_page, descriptor, processed_path, steps, request.parameters, adaptive
+                    ).result()
+            else:
+                page_result = preprocess_page(page, processed_path, steps, request.parameters, adaptive)
+
+            result = {"page": page_number, "page_id": page_id, **page_result}
+
+            if text_layer is not None:
+                result["text_layer_quality"] = text_layer["quality"]
+
+            if request.ocr:
+                result["text_source"] = "ocr"
+                page_text = recognize_page(
+                    result["processed_file"],
+                    language=request.language,
+                    model_type=request.model_type
+                )
+                if request.post_correction:
+                    result["post_correction"] = correct_page(page_text)
+                result["recognized_text"] = page_text["recognized_text"]
+                result["raw_text"] = page_text.get("raw_text", page_text["recognized_text"])
+                result["language"] = page_text["language"]
+                result["text_blocks"] = page_text["text_blocks"]
+                result["confidence_scores"] = page_text["confidence_scores"]
+                result["page_size"] = {"width": page_text["layout"]["width"], "height": page_text["layout"]["height"]}
+
+            page_cache.put(make_cache_key(page_hash["content"], processing_key), _stored_page(result))
+            result["page_hash"] = page_hash
+            result["reused"] = None
+            result["reused_from"] = None
+            result["processing_time"] = time.time() - page_start
+            return result
+
+        start_time = time.time()
+        max_workers = request.max_workers or DOCUMENT_PAGE_WORKERS
+        try:
+            pages = process_pages(
+                file_path,
+                handle_page,
+                max_workers,
+                use_text_layer=request.ocr and request.use_text_layer
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        processing_time = time.time() - start_time
+
+        document = {
+            "file_id": request.file_id,
+            "source_file": file_path,
+            "page_count": len(pages),
+            "pages": pages,
+            "processing_steps": None if adaptive else steps,
+            "adaptive": adaptive,
+            "parameters": request.parameters or {},
+            "max_workers": max_workers,
+            "processing_key": processing_key,
+            "incremental": {
+                "previous_file_id": request.previous_file_id,
+                "reuse_similar_pages": bool(request.reuse_similar_pages),
+                "previous_pages": len(previous_pages),
+                "reused_pages": sum(1 for page in pages if page.get("reused")),
+                "reused_by_content": sum(1 for page in pages if page.get("reused") == "content"),
+                "reused_by_perceptual_hash": sum(1 for page in pages if page.get("reused") == "perceptual"),
+                "processed_pages": sum(
+                    1 for page in pages if page.get("text_source") != "text_layer" and not page.get("reused")
+                )
+            },
+            "processing_time": processing_time,
+            "processed_at": datetime.now().isoformat()
+        }
+
+        if request.ocr:
+            document["text_layer_pages"] = sum(1 for page in pages if page.get("text_source") == "text_layer")
+            recognized_text = "\n\n".join(page["recognized_text"] for page in pages)
+            os.makedirs("ocr_results", exist_ok=True)
+            result_path = os.path.join("ocr_results", f"ocr_result_{request.file_id}_{timestamp}.txt")
+            with open(result_path, "w", encoding="utf-8") as f:
+                f.write(recognized_text)
+            # Язык документа - язык большинства страниц (определяется для каждой страницы)
+            page_languages = [page.get("language") or request.language for page in pages]
+            document_language = max(page_languages, key=page_languages.count) if page_languages else request.language
+            structured = StructuredResult.build(
+                recognized_text,
+                [
+                    {
+                        "page": page["page"],
+                        **page["page_size"],
+                        "text_blocks": [dict(block, page=page["page"]) for block in page["text_blocks"]]
+                    }
+                    for page in pages
+                ],
+                file_id=request.file_id,
+                source_file=file_path,
+                engine_version=OCR_ENGINE_VERSION,
+                language=document_language,
+                page_languages=page_languages,
+                model_type=request.model_type,
+                recognized_at=datetime.now().isoformat()
+            )
+            document.update({
+                "recognized_text": recognized_text,
+                "raw_text": "\n\n".join(page.get("raw_text", page["recognized_text"]) for page in pages),
+                "statistics": structured.statistics,
+                "result_file": result_path,
+                "structured_file": structured.save(structured_result_path(request.file_id, timestamp)),
+                "engine_version": OCR_ENGINE_VERSION,
+                "language": document_language,
+                "page_languages": page_languages,
+                "model_type": request.model_type
+            })
+
+        # Сводный результат по документу
+        os.makedirs("ocr_results", exist_ok=True)
+        document_path = os.path.join("ocr_results", f"document_{request.file_id}_{timestamp}.json")
+        with open(document_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+        document["document_file"] = document_path
+
+        logger.info(f"Документ {request.file_id}: {len(pages)} страниц обработано за {processing_time:.2f} секунд")
+
+        return {
+            "status": "success",
+            "message": "Постраничная обработка завершена успешно",
+            "data": document
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при обработке документа {request.file_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при обработке документа: {str(e)}"
+        )
+
+
+@router.get("/{file_id}/pages")
+async def get_document_pages(file_id: str) -> JSONResponse:
+    """
+    Получение списка страниц документа
+
+    Args:
+        file_id: ID файла
+
+    Returns:
+        JSON с количеством страниц и их идентификаторами
+    """
+    try:
+        logger.info(f"Получение страниц документа: {file_id}")
+
+        file_path = _find_upload(file_id)
+        if not file_path or not os.path.exists(file_path):
+            raise HTTPException(
+                status_code=404,
+                detail="Файл не найден"
+            )
+
+        try:
+            page_count = await run_in_threadpool(get_page_count, file_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "status": "success",
+                "data": {
+                    "file_id": file_id,
+                    "multipage": os.path.splitext(file_path)[1].lower() in MULTIPAGE_EXTENSIONS,
+                    "page_count": page_count,
+                    "pages": [
+                        {"page": number, "page_id": make_page_id(file_id, number)}
+                        for number in range(1, page_count + 1)
+                    ]
+                }
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при получении страниц документа: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при получении страниц документа: {str(e)}"
+        )
+
+
+@router.post("/process")
+async def process_document(request: DocumentProcessRequest) -> JSONResponse:
+    """
+    Постраничная предобработка и распознавание многостраничного документа
+
+    Страницы декодируются по одной и обрабатываются параллельно,
+    результаты собираются по документу.
+
+    Args:
+        request: Запрос на обработку документа
+
+    Returns:
+        JSON с результатами по страницам и документу
+    """
+    flight_key = make_cache_key("documents", request.model_dump())
+    content, _coalesced = await processing_flights.do(
+        flight_key,
+        "documents",
+        lambda: run_in_threadpool(run_document_processing, request)
+    )
+    return JSONResponse(status_code=200, content=content)
+
+
+@router.get("/health")
+async def health_check() -> JSONResponse:
+    """
+    Проверка состояния модуля многостраничных документов
+
+    Returns:
+        JSON со статусом модуля
+    """
+    try:
+        _import_pymupdf()
+        pdf_support = True
+    except ValueError:
+        pdf_support = False
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "status": "ok",
+            "message": "Documents module is working",
+            "data": {
+                "page_workers": DOCUMENT_PAGE_WORKERS,
+                "page_executor": DOCUMENT_PAGE_EXECUTOR,
+                "shared_images": shared_images.get_stats(),
+                "pdf_support": pdf_support,
+                "pdf_render_dpi": PDF_RENDER_DPI,
+                "page_cache": page_cache.get_stats(),
+                "page_hash_max_distance": PAGE_HASH_MAX_DISTANCE
+            }
+        }
+    )
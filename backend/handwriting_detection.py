@@ -0,0 +1,160 @@
+"""
+Модуль определения типа текста строки (печатный, рукописный, смешанный)
+Дешевые признаки формы штрихов на уменьшенных фрагментах строк для выбора модели OCR
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+from layout import estimate_char_height, ink_mask
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Значение model_type, при котором модель выбирается по каждой строке
+AUTO_MODEL_TYPE = "auto"
+
+# Версия классификатора: входит в ключ кеша OCR при model_type="auto"
+CLASSIFIER_VERSION = "1"
+
+# Строка приводится к высоте символа не больше STYLE_CHAR_HEIGHT пикселей
+STYLE_CHAR_HEIGHT = 24
+# Меньше компонент - признаков недостаточно, строка считается смешанной
+STYLE_MIN_COMPONENTS = 3
+# Пороги оценки "рукописности" (0 - печатный, 1 - рукописный)
+PRINTED_MAX_SCORE = 0.35
+HANDWRITTEN_MIN_SCORE = 0.6
+
+# Вклад признаков: (вес, значение печатного текста, значение рукописного текста)
+STYLE_FEATURES = {
+    # доля энергии контуров вдоль горизонтали и вертикали: у шрифтов штрихи прямые
+    "axis_alignment": (0.45, 0.45, 0.3),
+    # разброс нижней границы букв относительно линии строки (в высотах символа)
+    "baseline_jitter": (0.25, 0.02, 0.1),
+    # коэффициент вариации высот букв
+    "height_variation": (0.15, 0.13, 0.18),
+    # медианная ширина компоненты (в высотах символа): слитное письмо
+    "joined_width": (0.15, 0.9, 1.3)
+}
+
+# Счетчики решений классификатора
+_stats_lock = threading.Lock()
+classifier_stats = {
+    "lines": 0,
+    "printed": 0,
+    "handwritten": 0,
+    "mixed": 0,
+    "classification_ms": 0.0
+}
+
+
+def line_style_features(image: np.ndarray) -> Optional[Dict[str, float]]:
+    """
+    Вычисляет признаки формы штрихов строки
+
+    Args:
+        image: Фрагмент страницы со строкой (оттенки серого)
+
+    Returns:
+        Словарь признаков или None, если в строке слишком мало символов
+    """
+    mask = ink_mask(image)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    char_height = estimate_char_height(stats[1:, cv2.CC_STAT_HEIGHT])
+    if char_height is None:
+        return None
+    scale = min(1.0, STYLE_CHAR_HEIGHT / char_height)
+    if scale < 1.0:
+        mask = cv2.resize(mask, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        mask = np.where(mask > 127, 255, 0).astype(np.uint8)
+        char_height *= scale
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT].astype(np.float64)
+    widths = stats[1:, cv2.CC_STAT_WIDTH].astype(np.float64)
+    letters = heights >= char_height * 0.4  # без точек и запятых
+    if letters.sum() < STYLE_MIN_COMPONENTS:
+        return None
+
+    # Линия строки - прямая по нижним краям строчных букв, разброс - остатки от нее
+    body = letters & (heights < char_height * 1.3)
+    baseline_jitter = 0.0
+    if body.sum() >= STYLE_MIN_COMPONENTS:
+        centers = stats[1:, cv2.CC_STAT_LEFT][body] + widths[body] / 2
+        bottoms = stats[1:, cv2.CC_STAT_TOP][body] + heights[body]
+        fit = np.polyfit(centers, bottoms, 1)
+        residuals = bottoms - np.polyval(fit, centers)
+        # Медианное отклонение: выносные элементы (р, у, д) не считаются разбросом
+        baseline_jitter = float(np.median(np.abs(residuals - np.median(residuals))) * 1.4826 / char_height)
+
+    ink = mask.astype(np.float32)
+    gx = cv2.Sobel(ink, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(ink, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude = cv2.magnitude(gx, gy)
+    angle = np.degrees(np.arctan2(gy, gx)) % 90.0
+    aligned = np.minimum(angle, 90.0 - angle) < 12.0
+    total = float(magnitude.sum())
+
+    return {
+        "axis_alignment": float((magnitude * aligned).sum() / total) if total else 0.0,
+        "baseline_jitter": baseline_jitter,
+        "height_variation": float(heights[letters].std() / heights[letters].mean()),
+        "joined_width": float(np.median(widths[letters]) / char_height)
+    }
+
+
+def classify_line(image: np.ndarray) -> Dict[str, Any]:
+    """
+    Определяет тип текста строки
+
+    Каждый признак переводится в шкалу от 0 (печатный) до 1 (рукописный),
+    взвешенная сумма сравнивается с порогами. Неуверенные строки и строки
+    с малым числом символов получают "mixed".
+
+    Args:
+        image: Фрагмент страницы со строкой
+
+    Returns:
+        Словарь: model_type, score и признаки
+    """
+    started = time.perf_counter()
+    features = line_style_features(image)
+    if features is None:
+        score = None
+        model_type = "mixed"
+    else:
+        score = 0.0
+        for name, (weight, printed, handwritten) in STYLE_FEATURES.items():
+            evidence = (features[name] - printed) / (handwritten - printed)
+            score += weight * min(max(evidence, 0.0), 1.0)
+        if score <= PRINTED_MAX_SCORE:
+            model_type = "printed"
+        elif score >= HANDWRITTEN_MIN_SCORE:
+            model_type = "handwritten"
+        else:
+            model_type = "mixed"
+
+    with _stats_lock:
+        classifier_stats["lines"] += 1
+        classifier_stats[model_type] += 1
+        classifier_stats["classification_ms"] += (time.perf_counter() - started) * 1000.0
+    return {
+        "model_type": model_type,
+        "score": round(score, 4) if score is not None else None,
+        "features": {name: round(value, 4) for name, value in features.items()} if features else None
+    }
+
+
+def get_classifier_stats() -> Dict[str, Any]:
+    """Возвращает счетчики решений классификатора"""
+    with _stats_lock:
+        return {
+            "version": CLASSIFIER_VERSION,
+            **{key: round(value, 1) if isinstance(value, float) else value for key, value in classifier_stats.items()}
+        }
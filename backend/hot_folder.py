@@ -0,0 +1,731 @@
+"""
+Модуль горячей папки
+Отслеживает папку сканирующих станций и автоматически регистрирует готовые файлы
+"""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from typing import List, Dict, Any, Optional, Tuple
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import queue
+import select
+import shutil
+import struct
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+
+from upload import UPLOAD_DIR, MAX_FILE_SIZE, ALLOWED_EXTENSIONS
+from content_hash import compute_file_hash
+from documents import DocumentProcessRequest, run_document_processing
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Создаем роутер для маршрутов горячей папки
+router = APIRouter(prefix="/hot-folder", tags=["hot-folder"])
+
+# Конфигурация (через переменные окружения)
+HOT_FOLDER_DIR = os.getenv("HOT_FOLDER_DIR", "")  # Пустое значение - наблюдение отключено
+HOT_FOLDER_MODE = os.getenv("HOT_FOLDER_MODE", "auto")  # auto, inotify, poll
+HOT_FOLDER_STABLE_SECONDS = float(os.getenv("HOT_FOLDER_STABLE_SECONDS", "5"))
+HOT_FOLDER_POLL_INTERVAL = float(os.getenv("HOT_FOLDER_POLL_INTERVAL", "5"))
+HOT_FOLDER_BATCH_WINDOW = float(os.getenv("HOT_FOLDER_BATCH_WINDOW", "2"))
+HOT_FOLDER_BATCH_SIZE = int(os.getenv("HOT_FOLDER_BATCH_SIZE", "500"))
+INGEST_INDEX_PATH = os.getenv("HOT_FOLDER_INDEX", os.path.join("logs", "ingest_index.json"))
+# Обработка зарегистрированных файлов: document - постраничная предобработка и OCR
+# (как POST /documents/process), none - только регистрация в uploads
+HOT_FOLDER_PIPELINE = os.getenv("HOT_FOLDER_PIPELINE", "document")
+HOT_FOLDER_PIPELINE_WORKERS = int(os.getenv("HOT_FOLDER_PIPELINE_WORKERS", "1"))
+
+# Страховочный интервал полного сканирования при работе через inotify:
+# на сетевых папках (SMB/NFS) события от других хостов могут не приходить
+INOTIFY_RESCAN_INTERVAL = 60.0
+
+# Флаги inotify (см. <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Очередь зарегистрированных файлов, ожидающих обработки в конвейере
+ingest_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+
+class _Inotify:
+    """Минимальная обертка над inotify(7) через ctypes"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.watches: Dict[int, str] = {}
+
+    def add_watch(self, path: str) -> None:
+        """Добавляет наблюдение за каталогом"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.watches[wd] = path
+
+    def read_events(self, timeout: float) -> List[Tuple[str, int]]:
+        """
+        Читает накопленные события
+
+        Args:
+            timeout: Максимальное время ожидания событий в секундах
+
+        Returns:
+            Список пар (путь, маска события)
+        """
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0.0))
+        if not ready:
+            return []
+
+        events = []
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset:offset + name_len].rstrip(b"\0")
+                offset += name_len
+
+                if mask & IN_Q_OVERFLOW:
+                    events.append(("", mask))
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name)) if name else directory
+                events.append((path, mask))
+        return events
+
+    def close(self) -> None:
+        """Закрывает дескриптор inotify"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class HotFolderWatcher:
+    """
+    Наблюдатель горячей папки
+
+    Обнаруживает завершенные файлы (событие close-write или стабильный
+    размер), группирует их в пакеты, отбрасывает дубликаты по хешу
+    содержимого, копирует в uploads и ставит в очередь конвейера;
+    потоки конвейера забирают файлы из очереди и обрабатывают документ.
+    """
+
+    def __init__(
+        self,
+        watch_dir: str,
+        mode: str = HOT_FOLDER_MODE,
+        stable_seconds: float = HOT_FOLDER_STABLE_SECONDS,
+        poll_interval: float = HOT_FOLDER_POLL_INTERVAL,
+        batch_window: float = HOT_FOLDER_BATCH_WINDOW,
+        batch_size: int = HOT_FOLDER_BATCH_SIZE,
+        index_path: str = INGEST_INDEX_PATH,
+        pipeline: str = HOT_FOLDER_PIPELINE,
+        pipeline_workers: int = HOT_FOLDER_PIPELINE_WORKERS,
+    ):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.requested_mode = mode
+        self.mode = "poll"
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.index_path = index_path
+        self.pipeline = pipeline
+        self.pipeline_workers = max(pipeline_workers, 1)
+
+        self._inotify: Optional[_Inotify] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pipeline_threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        # Останов конвейера подается отдельно: после регистрации последнего пакета
+        self._pipeline_stop = threading.Event()
+        self._lock = threading.Lock()
+
+        # Кандидаты на регистрацию, накопленные в текущем пакете
+        self._pending: Dict[str, float] = {}
+        self._batch_started: Optional[float] = None
+        # Наблюдения опроса: путь -> (размер, mtime_ns, момент первого совпадения)
+        self._observed: Dict[str, Tuple[int, int, float]] = {}
+        # Уже обработанные версии файлов, еще лежащие в папке: путь -> (размер, mtime_ns)
+        self._handled: Dict[str, Tuple[int, int]] = {}
+        # Индекс загруженного содержимого: хеш -> сведения о файле
+        self._index: Dict[str, Dict[str, Any]] = {}
+
+        self.stats = {
+            "events_received": 0,
+            "batches_processed": 0,
+            "files_ingested": 0,
+            "duplicates_skipped": 0,
+            "rejected_files": 0,
+            "errors": 0,
+            "full_rescans": 0,
+            "last_batch_at": None,
+            "files_processed": 0,
+            "processing_errors": 0,
+        }
+        self.recent_ingested: List[Dict[str, Any]] = []
+        self.recent_processed: List[Dict[str, Any]] = []
+
+    def start(self) -> None:
+        """Запускает наблюдение в фоновом потоке"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        self._load_index()
+        self._seed_index_from_uploads()
+
+        if self.requested_mode in ("auto", "inotify"):
+            try:
+                self._inotify = _Inotify()
+                self._watch_tree(self.watch_dir)
+                self.mode = "inotify"
+            except (OSError, AttributeError) as e:
+                if self.requested_mode == "inotify":
+                    raise
+                logger.warning(f"inotify недоступен ({e}), используется опрос каталога")
+                self._close_inotify()
+
+        self._stop_event.clear()
+        self._pipeline_stop.clear()
+        self._thread = threading.Thread(target=self._run, name="hot-folder-watcher", daemon=True)
+        self._thread.start()
+        if self.pipeline == "document":
+            self._pipeline_threads = [
+                threading.Thread(target=self._run_pipeline, name=f"hot-folder-pipeline-{index}", daemon=True)
+                for index in range(self.pipeline_workers)
+            ]
+            for thread in self._pipeline_threads:
+                thread.start()
+        logger.info(
+            f"Наблюдение за горячей папкой запущено: {self.watch_dir} "
+            f"(режим: {self.mode}, конвейер: {self.pipeline})"
+        )
+
+    def stop(self) -> None:
+        """
+        Останавливает наблюдение и регистрирует накопленный пакет
+
+        Конвейер останавливается после регистрации последнего пакета:
+        потоки конвейера дообрабатывают очередь, включая этот пакет.
+        Файлы, не обработанные за время ожидания, уже сохранены в uploads
+        и могут быть обработаны вручную.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self._close_inotify()
+        self._flush()
+        self._pipeline_stop.set()
+        for thread in self._pipeline_threads:
+            thread.join(timeout=10)
+        self._pipeline_threads = []
+        logger.info("Наблюдение за горячей папкой остановлено")
+
+    def _run_pipeline(self) -> None:
+        """Цикл потока конвейера: обработка зарегистрированных файлов из очереди"""
+        while True:
+            try:
+                record = ingest_queue.get(timeout=0.5)
+            except queue.Empty:
+                # Поток завершается, только когда очередь после останова пуста
+                if self._pipeline_stop.is_set():
+                    return
+                continue
+            try:
+                self.process_record(record)
+            finally:
+                ingest_queue.task_done()
+
+    def process_record(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Обрабатывает зарегистрированный файл как документ: предобработка и OCR страниц
+
+        Args:
+            record: Сведения о файле из ingest_batch
+
+        Returns:
+            Сводка обработки или None при ошибке
+        """
+        started = time.perf_counter()
+        try:
+            result = run_document_processing(DocumentProcessRequest(file_id=record["file_id"]))
+        except Exception as e:
+            self._increment("processing_errors")
+            logger.error(f"Ошибка обработки файла горячей папки {record['file_id']}: {getattr(e, 'detail', None) or str(e)}")
+            return None
+
+        document = result["data"]
+        summary = {
+            "file_id": record["file_id"],
+            "original_filename": record["original_filename"],
+            "page_count": document.get("page_count"),
+            "result_file": document.get("result_file"),
+            "document_file": document.get("document_file"),
+            "processing_seconds": round(time.perf_counter() - started, 2),
+            "processed_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            self.stats["files_processed"] += 1
+            self.recent_processed = ([summary] + self.recent_processed)[:50]
+        logger.info(f"Файл горячей папки обработан: {record['original_filename']} ({record['file_id']})")
+        return summary
+
+    def _increment(self, counter: str) -> None:
+        """Увеличивает счетчик статистики (вызывается из потоков наблюдения и конвейера)"""
+        with self._lock:
+            self.stats[counter] += 1
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def _close_inotify(self) -> None:
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def _run(self) -> None:
+        rescan_interval = INOTIFY_RESCAN_INTERVAL if self.mode == "inotify" else self.poll_interval
+        next_scan = time.monotonic()
+
+        while not self._stop_event.is_set():
+            try:
+                now = time.monotonic()
+                if now >= next_scan:
+                    self._scan_tree()
+                    next_scan = now + rescan_interval
+
+                timeout = next_scan - time.monotonic()
+                if self._batch_started is not None:
+                    timeout = min(timeout, self._batch_started + self.batch_window - time.monotonic())
+                if self._observed:
+                    # Пока есть файлы в процессе записи, проверяем их чаще
+                    timeout = min(timeout, self.stable_seconds / 2)
+                timeout = max(timeout, 0.05)
+
+                if self._inotify:
+                    self._handle_events(self._inotify.read_events(timeout))
+                else:
+                    self._stop_event.wait(timeout)
+
+                if self._observed:
+                    self._check_observed()
+
+                if self._batch_due():
+                    self._flush()
+            except Exception as e:
+                self._increment("errors")
+                logger.error(f"Ошибка в цикле наблюдения горячей папки: {str(e)}")
+                self._stop_event.wait(1.0)
+
+    def _handle_events(self, events: List[Tuple[str, int]]) -> None:
+        for path, mask in events:
+            self._increment("events_received")
+
+            if mask & IN_Q_OVERFLOW:
+                # Очередь ядра переполнилась - события потеряны, пересканируем
+                logger.warning("Переполнение очереди inotify, выполняется полное сканирование")
+                self._scan_tree()
+                continue
+
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                # Файл или каталог убран из папки - забываем его
+                self._forget(path)
+                continue
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+                    self._scan_tree(path)
+                continue
+
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                # Запись завершена - файл готов к регистрации
+                self._observed.pop(path, None)
+                self._enqueue_candidate(path)
+            elif mask & IN_CREATE:
+                # Файл только создан, ждем close-write или стабилизации размера
+                self._observe(path)
+
+    def _watch_tree(self, root: str) -> None:
+        if not self._inotify:
+            return
+        for directory, _dirs, _files in os.walk(root):
+            try:
+                self._inotify.add_watch(directory)
+            except OSError as e:
+                logger.warning(f"Не удалось добавить наблюдение за {directory}: {e}")
+
+    def _scan_tree(self, root: Optional[str] = None) -> None:
+        """Полное сканирование: находит файлы, пропущенные событиями"""
+        self._increment("full_rescans")
+        found = set()
+        for directory, _dirs, files in os.walk(root or self.watch_dir):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                found.add(path)
+                self._observe(path)
+        if root is None:
+            # Удаления могли пройти без событий (опрос, сетевые папки)
+            for path in set(self._handled) - found:
+                del self._handled[path]
+        self._check_observed()
+
+    def _forget(self, path: str) -> None:
+        """Удаляет сведения о файле или о всех файлах каталога, убранных из папки"""
+        prefix = path + os.sep
+        for known in (self._handled, self._observed):
+            for known_path in [p for p in known if p == path or p.startswith(prefix)]:
+                del known[known_path]
+
+    def _stat_signature(self, path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _is_candidate_name(self, path: str) -> bool:
+        filename = os.path.basename(path)
+        if filename.startswith((".", "~")):
+            return False
+        return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
+
+    def _observe(self, path: str) -> None:
+        if not self._is_candidate_name(path):
+            return
+        signature = self._stat_signature(path)
+        if signature is None or self._handled.get(path) == signature or path in self._pending:
+            return
+        previous = self._observed.get(path)
+        if previous is None or previous[:2] != signature:
+            self._observed[path] = (signature[0], signature[1], time.monotonic())
+
+    def _check_observed(self) -> None:
+        """Переводит файлы со стабильным размером и mtime в кандидаты"""
+        now = time.monotonic()
+        for path, (size, mtime_ns, since) in list(self._observed.items()):
+            signature = self._stat_signature(path)
+            if signature is None:
+                self._forget(path)
+                continue
+            if signature != (size, mtime_ns):
+                self._observed[path] = (signature[0], signature[1], now)
+                continue
+            if size > 0 and now - since >= self.stable_seconds:
+                self._observed.pop(path, None)
+                self._enqueue_candidate(path)
+
+    def _enqueue_candidate(self, path: str) -> None:
+        if not self._is_candidate_name(path):
+            return
+        signature = self._stat_signature(path)
+        if signature is None or self._handled.get(path) == signature:
+            return
+        with self._lock:
+            self._pending[path] = time.monotonic()
+            if self._batch_started is None:
+                self._batch_started = time.monotonic()
+
+    def _batch_due(self) -> bool:
+        if self._batch_started is None:
+            return False
+        return (len(self._pending) >= self.batch_size
+                or time.monotonic() - self._batch_started >= self.batch_window)
+
+    def _flush(self) -> None:
+        with self._lock:
+            paths = list(self._pending.keys())
+            self._pending.clear()
+            self._batch_started = None
+        if paths:
+            self.ingest_batch(paths)
+
+    def ingest_batch(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Регистрирует пакет завершенных файлов
+
+        Индекс дедупликации сохраняется на диск один раз на пакет.
+
+        Args:
+            paths: Пути к файлам в горячей папке
+
+        Returns:
+            Список сведений о зарегистрированных файлах
+        """
+        ingested = []
+        for path in paths:
+            try:
+                record = self._ingest_file(path)
+            except Exception as e:
+                self._increment("errors")
+                logger.error(f"Ошибка при регистрации файла {path}: {str(e)}")
+                continue
+            if record:
+                ingested.append(record)
+
+        if ingested:
+            self._save_index()
+            if self.pipeline == "document":
+                for record in ingested:
+                    ingest_queue.put(record)
+
+        with self._lock:
+            if ingested:
+                self.recent_ingested = (ingested + self.recent_ingested)[:50]
+            self.stats["batches_processed"] += 1
+            self.stats["last_batch_at"] = datetime.now().isoformat()
+        logger.info(f"Пакет горячей папки обработан: {len(paths)} файлов, зарегистрировано {len(ingested)}")
+        return ingested
+
+    def _ingest_file(self, path: str) -> Optional[Dict[str, Any]]:
+        signature = self._stat_signature(path)
+        if signature is None:
+            self._handled.pop(path, None)
+            return None
+        file_size = signature[0]
+
+        if file_size == 0 or file_size > MAX_FILE_SIZE:
+            self._increment("rejected_files")
+            self._handled[path] = signature
+            logger.warning(f"Файл отклонен по размеру: {path} ({file_size} bytes)")
+            return None
+
+        content_hash = compute_file_hash(path)
+        if self._stat_signature(path) != signature:
+            # Файл изменился во время чтения - вернемся к нему позже
+            self._observe(path)
+            return None
+
+        self._handled[path] = signature
+        if content_hash in self._index:
+            self._increment("duplicates_skipped")
+            logger.debug(f"Дубликат пропущен: {path} (file_id: {self._index[content_hash]['file_id']})")
+            return None
+
+        file_id = str(uuid.uuid4())
+        file_extension = os.path.splitext(path)[1].lower()
+        saved_filename = f"{file_id}{file_extension}"
+        file_path = os.path.join(UPLOAD_DIR, saved_filename)
+        shutil.copyfile(path, file_path)
+
+        record = {
+            "file_id": file_id,
+            "original_filename": os.path.basename(path),
+            "source_path": path,
+            "saved_filename": saved_filename,
+            "file_path": file_path,
+            "file_size": file_size,
+            "content_hash": content_hash,
+            "upload_time": datetime.now().isoformat(),
+        }
+        self._index[content_hash] = {
+            "file_id": file_id,
+            "source_path": path,
+            "upload_time": record["upload_time"],
+        }
+        self._increment("files_ingested")
+        return record
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать индекс горячей папки: {str(e)}")
+            self._index = {}
+
+    def _save_index(self) -> None:
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _seed_index_from_uploads(self) -> None:
+        """Добавляет в индекс файлы, загруженные ранее через интерфейс"""
+        known_ids = {entry["file_id"] for entry in self._index.values()}
+        added = 0
+        for filename in os.listdir(UPLOAD_DIR):
+            file_path = os.path.join(UPLOAD_DIR, filename)
+            file_id = os.path.splitext(filename)[0]
+            if not os.path.isfile(file_path) or file_id in known_ids:
+                continue
+            content_hash = compute_file_hash(file_path)
+            self._index.setdefault(content_hash, {
+                "file_id": file_id,
+                "source_path": file_path,
+                "upload_time": datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
+            })
+            added += 1
+        if added:
+            self._save_index()
+            logger.info(f"В индекс горячей папки добавлено ранее загруженных файлов: {added}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Возвращает состояние наблюдателя"""
+        with self._lock:
+            stats = dict(self.stats)
+            pending_in_batch = len(self._pending)
+            recent_ingested = self.recent_ingested[:10]
+            recent_processed = self.recent_processed[:10]
+        return {
+            "watch_dir": self.watch_dir,
+            "mode": self.mode,
+            "running": self.is_running(),
+            "pending_in_batch": pending_in_batch,
+            "files_in_progress": len(self._observed),
+            "queue_size": ingest_queue.qsize(),
+            "indexed_files": len(self._index),
+            "settings": {
+                "stable_seconds": self.stable_seconds,
+                "poll_interval": self.poll_interval,
+                "batch_window": self.batch_window,
+                "batch_size": self.batch_size,
+                "pipeline": self.pipeline,
+                "pipeline_workers": self.pipeline_workers,
+            },
+            "stats": stats,
+            "recent_ingested": recent_ingested,
+            "recent_processed": recent_processed,
+        }
+
+
+# Глобальный наблюдатель (создается при старте приложения)
+watcher: Optional[HotFolderWatcher] = None
+
+
+def start_watcher() -> Optional[HotFolderWatcher]:
+    """
+    Запускает наблюдение, если горячая папка настроена
+
+    Returns:
+        Запущенный наблюдатель или None
+    """
+    global watcher
+    if not HOT_FOLDER_DIR:
+        logger.info("Горячая папка не настроена (HOT_FOLDER_DIR), наблюдение отключено")
+        return None
+    if not os.path.isdir(HOT_FOLDER_DIR):
+        logger.error(f"Горячая папка не найдена: {HOT_FOLDER_DIR}")
+        return None
+
+    watcher = HotFolderWatcher(HOT_FOLDER_DIR)
+    watcher.start()
+    return watcher
+
+
+def stop_watcher() -> None:
+    """Останавливает наблюдение"""
+    if watcher:
+        watcher.stop()
+
+
+@router.get("/status")
+async def get_hot_folder_status() -> JSONResponse:
+    """
+    Получение состояния горячей папки
+
+    Returns:
+        JSON с настройками и счетчиками наблюдателя
+    """
+    try:
+        logger.info("Получение состояния горячей папки")
+
+        if watcher is None:
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "status": "success",
+                    "data": {
+                        "enabled": False,
+                        "queue_size": ingest_queue.qsize()
+                    }
+                }
+            )
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "status": "success",
+                "data": {
+                    "enabled": True,
+                    **watcher.get_status()
+                }
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении состояния горячей папки: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при получении состояния горячей папки: {str(e)}"
+        )
+
+
+@router.get("/health")
+async def health_check() -> JSONResponse:
+    """
+    Проверка состояния модуля горячей папки
+
+    Returns:
+        JSON со статусом модуля
+    """
+    return JSONResponse(
+        status_code=200,
+        content={
+            "status": "ok",
+            "message": "Hot folder module is working",
+            "data": {
+                "enabled": watcher is not None,
+                "running": watcher.is_running() if watcher else False,
+                "watch_dir": HOT_FOLDER_DIR or None
+            }
+        }
+    )
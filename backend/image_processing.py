@@ -1,12 +1,527 @@
 """
 Модуль предобработки изображений
-Содержит заглушки функций для обработки изображений документов
+Содержит функции обработки изображений документов
 """
 
+import io
+import os
+import re
+import math
+import struct
 import time
-from typing import Any, Dict, List
-# from PIL import Image  # TODO: Установить Pillow для работы с изображениями
-# import numpy as np     # TODO: Установить numpy для численных операций
+import uuid
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import cv2
+
+from shared_images import SharedImageDescriptor, attach_shared_image
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Версия движка распознавания: входит в ключ кеша OCR,
+# поэтому при смене модели или ее настроек кеш автоматически устаревает
+OCR_ENGINE_VERSION = "stub-1.0"
+
+# Версия алгоритмов этапов предобработки: входит в ключи кешей предобработки
+# и страниц документов (кеш на диске переживает перезапуск), увеличивается
+# при каждом изменении результата любого этапа
+PREPROCESS_VERSION = "2"
+
+# Этапы, которые при указанных методах сводятся к поэлементному
+# преобразованию яркости (таблице подстановки, LUT). Соседние такие этапы
+# объединяются в один проход по изображению.
+POINTWISE_METHODS = {
+    "enhance_contrast": {"stretch", "gamma"},
+    "binarize_image": {"otsu", "threshold"},
+}
+
+# Методы этапов по умолчанию
+DEFAULT_STEP_METHODS = {
+    "enhance_contrast": "clahe",
+    "remove_noise": "median",
+    "binarize_image": "sauvola",
+}
+
+# Размеры уровней пирамиды для оценки наклона: грубый поиск угла
+# на уровне не больше DESKEW_COARSE_SIZE пикселей по большей стороне,
+# уточнение - на самом детальном уровне не больше DESKEW_REFINE_SIZE
+DESKEW_COARSE_SIZE = int(os.getenv("DESKEW_COARSE_SIZE", "512"))
+DESKEW_REFINE_SIZE = int(os.getenv("DESKEW_REFINE_SIZE", "2048"))
+
+# Высота полосы строк при локальной бинаризации: интегральные таблицы
+# строятся на полосу, а не на всю страницу
+BINARIZE_STRIPE_ROWS = int(os.getenv("BINARIZE_STRIPE_ROWS", "512"))
+
+# Потоковая обработка очень больших сканов тайлами: изображения больше
+# TILED_THRESHOLD_MEGAPIXELS обрабатываются с пиковой рабочей памятью
+# не больше TILED_MEMORY_LIMIT_MB, временные файлы - в TILED_SCRATCH_DIR
+TILED_MEMORY_LIMIT_MB = int(os.getenv("TILED_MEMORY_LIMIT_MB", "512"))
+TILED_THRESHOLD_MEGAPIXELS = float(os.getenv("TILED_THRESHOLD_MEGAPIXELS", "80"))
+TILED_SCRATCH_DIR = os.getenv("TILED_SCRATCH_DIR", os.path.join("cache", "scratch"))
+
+# Максимальный размер ячейки CLAHE в тайловом режиме: поле тайла - две ячейки
+TILED_CLAHE_MAX_CELL = 512
+# Доля стороны окна тайла, которую может занимать поле с каждой стороны:
+# при большем поле ячейка CLAHE уменьшается, иначе тайл обрабатывался бы
+# в основном ради перекрытия с соседями
+TILED_MAX_HALO_FRACTION = 0.125
+
+# Память на пиксель при декодировании целиком форматов без частичного
+# чтения (PNG, JPEG): цветное изображение до перевода в оттенки серого
+FULL_DECODE_BYTES_PER_PIXEL = 3
+
+# Оценка рабочей памяти этапов на пиксель тайла: входной тайл, результат
+# и промежуточные буферы локальной бинаризации в float64
+TILE_WORKING_BYTES_PER_PIXEL = 48
+
+# Этапы, которым нужна вся страница целиком (геометрия листа)
+GLOBAL_STEPS = {"correct_perspective", "align_image"}
+
+# Поэлементные методы, таблица подстановки которых строится по гистограмме всей страницы
+HISTOGRAM_METHODS = {"stretch", "otsu"}
+
+# Бюджет времени этапов в миллисекундах на мегапиксель входного изображения
+# (один поток CPU, параметры по умолчанию). Превышение бюджета пишется
+# в лог предупреждением и отражается в статистике выполнения этапов.
+STEP_TIME_BUDGETS_MS_PER_MP = {
+    "align_image": 150.0,
+    "enhance_contrast": 40.0,
+    "remove_noise": 40.0,
+    "binarize_image": 150.0,
+    "correct_perspective": 150.0,
+    "enhance_resolution": 250.0,
+    "remove_background": 60.0,
+}
+
+# Качество JPEG при сохранении обработанных изображений
+JPEG_QUALITY = int(os.getenv("PROCESSED_JPEG_QUALITY", "95"))
+
+# Хранение черно-белых (бинаризованных) результатов: group4 - TIFF со сжатием
+# CCITT Group 4 (в десятки раз меньше JPEG и без артефактов), jpeg - как прочие
+BILEVEL_STORAGE = os.getenv("BILEVEL_STORAGE", "group4")
+
+# Высота полосы (strip) черно-белого TIFF: полоса упаковывается в биты и
+# сжимается отдельно, поэтому память записи не зависит от высоты изображения
+BILEVEL_PACK_ROWS = 4096
+
+# Анализ качества страницы для выбора минимального набора этапов:
+# версия входит в ключ кеша адаптивной предобработки, метрики
+# считаются на копии не больше QUALITY_ANALYSIS_SIZE по большей стороне
+# и на фрагменте QUALITY_PATCH_SIZE в полном разрешении (шум, резкость)
+QUALITY_ANALYZER_VERSION = "1"
+QUALITY_ANALYSIS_SIZE = int(os.getenv("QUALITY_ANALYSIS_SIZE", "1024"))
+QUALITY_PATCH_SIZE = int(os.getenv("QUALITY_PATCH_SIZE", "512"))
+
+# Пороги метрик качества, при выходе за которые этап включается в обработку
+QUALITY_THRESHOLDS = {
+    "skew_angle": 0.5,              # градусы (погрешность оценки на копии - до 0.2-0.4)
+    "page_coverage": 0.9,           # доля кадра, занятая листом
+    "corner_deviation": 0.02,       # отклонение углов листа от прямоугольника
+    "background_unevenness": 30.0,  # размах яркости фона, уровни
+    "dynamic_range": 150.0,         # размах яркости между 1 и 99 перцентилями
+    "noise_sigma": 3.0,             # СКО гауссова шума, уровни
+    "impulse_ratio": 0.002,         # доля импульсных выбросов
+    "sharpness": 0.5,               # нормированная крутизна краев штрихов
+    "midtone_ratio": 0.02,          # доля полутонов: меньше - страница уже бинарная
+    "separability": 0.85,           # разделимость гистограммы: больше - хватает порога Оцу
+}
+
+# Порядок этапов адаптивной обработки
+ADAPTIVE_STEP_ORDER = [
+    "correct_perspective",
+    "align_image",
+    "remove_background",
+    "enhance_contrast",
+    "remove_noise",
+    "enhance_resolution",
+    "binarize_image",
+]
+
+
+def _otsu_threshold(hist: np.ndarray) -> int:
+    """
+    Вычисляет порог Оцу по гистограмме яркости
+
+    Args:
+        hist: Гистограмма из 256 значений
+
+    Returns:
+        Порог бинаризации
+    """
+    total = hist.sum()
+    if total == 0:
+        return 127
+    levels = np.arange(256, dtype=np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    cum_mean = np.cumsum(hist * levels)
+    mean_bg = cum_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cum_mean[-1] - cum_mean) / np.maximum(weight_fg, 1)
+    between_var = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between_var))
+
+
+def load_image(file_path: str) -> np.ndarray:
+    """
+    Загружает изображение документа в оттенках серого
+
+    Args:
+        file_path: Путь к файлу изображения
+
+    Returns:
+        Изображение uint8 (высота x ширина)
+
+    Raises:
+        ValueError: Если файл не удалось декодировать
+    """
+    image = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        # Форматы, которые не читает OpenCV (например, часть вариантов TIFF)
+        try:
+            from PIL import Image
+            with Image.open(file_path) as pil_image:
+                image = np.array(pil_image.convert("L"))
+        except Exception as e:
+            raise ValueError(f"Не удалось прочитать изображение {file_path}: {str(e)}")
+    return image
+
+
+def is_bilevel(image: np.ndarray) -> bool:
+    """
+    Проверяет, что изображение черно-белое (только уровни 0 и 255)
+
+    Args:
+        image: Изображение NumPy
+
+    Returns:
+        True для одноканального uint8 изображения без полутонов
+    """
+    if image.ndim != 2 or image.dtype != np.uint8 or image.size == 0:
+        return False
+    hist = cv2.calcHist([image], [0], None, [256], [0, 256]).ravel()
+    return not hist[1:255].any()
+
+
+def processed_image_path(image: np.ndarray, file_path: str) -> str:
+    """
+    Выбирает путь сохранения обработанного изображения по его содержимому
+
+    Черно-белые результаты сохраняются в TIFF CCITT Group 4 вместо JPEG.
+
+    Args:
+        image: Обработанное изображение
+        file_path: Путь по умолчанию (с расширением .jpg)
+
+    Returns:
+        Путь с расширением .tif для черно-белого изображения, иначе исходный путь
+    """
+    if BILEVEL_STORAGE == "group4" and is_bilevel(image):
+        return os.path.splitext(file_path)[0] + ".tif"
+    return file_path
+
+
+def find_processed_file(file_id: str, processed_dir: str = "processed") -> Optional[str]:
+    """
+    Ищет последний результат предобработки файла
+
+    Подходят только файлы processed_{file_id}_{timestamp}.*: результаты
+    отдельных этапов ({step}_{file_id}_...) и страниц документа
+    (processed_{file_id}_p0001_...) не выбираются. Из нескольких вариантов
+    берется последний по времени в имени (жесткие ссылки на результат из
+    кеша сохраняют время изменения исходного файла), затем по времени изменения.
+
+    Args:
+        file_id: ID файла
+        processed_dir: Каталог обработанных файлов
+
+    Returns:
+        Путь к файлу или None
+    """
+    if not os.path.isdir(processed_dir):
+        return None
+    pattern = re.compile(rf"processed_{re.escape(file_id)}_(\d+)\.\w+")
+    candidates = []
+    for filename in os.listdir(processed_dir):
+        match = pattern.fullmatch(filename)
+        if match:
+            path = os.path.join(processed_dir, filename)
+            candidates.append((int(match.group(1)), os.path.getmtime(path), path))
+    return max(candidates)[2] if candidates else None
+
+
+def _encode_group4_strip(strip: np.ndarray) -> bytes:
+    """Сжимает полосу черно-белого изображения CCITT Group 4 (данные одной полосы TIFF)"""
+    from PIL import Image
+
+    rows, width = strip.shape
+    buffer = io.BytesIO()
+    packed = np.packbits(np.asarray(strip) > 127, axis=1)
+    # Вся полоса - одна полоса TIFF (RowsPerStrip = высоте полосы)
+    Image.frombytes("1", (width, rows), packed.tobytes()).save(
+        buffer, "TIFF", compression="group4", tiffinfo={278: rows}
+    )
+    buffer.seek(0)
+    with Image.open(buffer) as encoded:
+        offsets, counts = encoded.tag_v2[273], encoded.tag_v2[279]
+    if len(offsets) != 1:
+        raise ValueError(f"Полоса {rows} строк сжата в {len(offsets)} полос TIFF")
+    data = buffer.getvalue()
+    return data[offsets[0]:offsets[0] + counts[0]]
+
+
+def _save_bilevel_tiff(image: np.ndarray, file_path: str) -> None:
+    """
+    Сохраняет черно-белое изображение в TIFF со сжатием CCITT Group 4
+
+    Полосы по BILEVEL_PACK_ROWS строк сжимаются независимо (в Group 4
+    каждая полоса TIFF кодируется отдельно) и сразу пишутся в файл,
+    каталог тегов (IFD) записывается в конце. В памяти одновременно
+    находится одна полоса, поэтому запись результата тайловой обработки
+    (memmap) не загружает изображение целиком.
+    """
+    height, width = image.shape
+    offsets: List[int] = []
+    counts: List[int] = []
+    with open(file_path, "wb") as f:
+        # Заголовок little-endian TIFF, смещение IFD дописывается после полос
+        f.write(b"II*\0" + struct.pack("<I", 0))
+        for top in range(0, height, BILEVEL_PACK_ROWS):
+            data = _encode_group4_strip(image[top:min(top + BILEVEL_PACK_ROWS, height)])
+            offsets.append(f.tell())
+            counts.append(len(data))
+            f.write(data)
+            if f.tell() % 2:
+                f.write(b"\0")
+
+        def array_value(values: List[int]) -> int:
+            # Массив из одного значения хранится в самом теге, иначе - перед IFD
+            if len(values) == 1:
+                return values[0]
+            offset = f.tell()
+            f.write(struct.pack(f"<{len(values)}I", *values))
+            return offset
+
+        strip_offsets = array_value(offsets)
+        strip_counts = array_value(counts)
+        # Теги: (код, тип, число значений, значение); тип 3 - SHORT, 4 - LONG
+        tags = [
+            (256, 4, 1, width),                      # ImageWidth
+            (257, 4, 1, height),                     # ImageLength
+            (258, 3, 1, 1),                          # BitsPerSample
+            (259, 3, 1, 4),                          # Compression: CCITT Group 4
+            (262, 3, 1, 1),                          # PhotometricInterpretation: BlackIsZero
+            (273, 4, len(offsets), strip_offsets),   # StripOffsets
+            (277, 3, 1, 1),                          # SamplesPerPixel
+            (278, 4, 1, min(BILEVEL_PACK_ROWS, height)),  # RowsPerStrip
+            (279, 4, len(counts), strip_counts),     # StripByteCounts
+        ]
+        ifd_offset = f.tell()
+        f.write(struct.pack("<H", len(tags)))
+        for code, value_type, count, value in tags:
+            packed_value = struct.pack("<HH", value, 0) if value_type == 3 and count == 1 else struct.pack("<I", value)
+            f.write(struct.pack("<HHI", code, value_type, count) + packed_value)
+        f.write(struct.pack("<I", 0))
+        f.seek(4)
+        f.write(struct.pack("<I", ifd_offset))
+
+
+def save_image(image: np.ndarray, file_path: str) -> None:
+    """
+    Сохраняет обработанное изображение
+
+    Черно-белое изображение в TIFF сохраняется со сжатием CCITT Group 4
+    (OpenCV читает такой файл сразу в uint8 с уровнями 0/255).
+
+    Args:
+        image: Изображение NumPy
+        file_path: Путь к файлу; формат определяется расширением
+    """
+    if file_path.lower().endswith((".tif", ".tiff")):
+        if BILEVEL_STORAGE == "group4" and is_bilevel(image):
+            _save_bilevel_tiff(image, file_path)
+            return
+        try:
+            import tifffile
+            # Тайловая запись: большие изображения (в т.ч. memmap) пишутся по частям
+            tile = (256, 256) if min(image.shape[:2]) >= 256 else None
+            tifffile.imwrite(file_path, image, tile=tile, compression="zlib")
+            return
+        except ImportError:
+            pass
+    
+    params = []
+    if file_path.lower().endswith((".jpg", ".jpeg")):
+        params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+    if not cv2.imwrite(file_path, image, params):
+        raise ValueError(f"Не удалось сохранить изображение {file_path}")
+
+
+def get_image_size(file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Определяет размер изображения по заголовку файла, не декодируя пиксели
+
+    Args:
+        file_path: Путь к файлу изображения
+
+    Returns:
+        Кортеж (высота, ширина) или None, если размер определить не удалось
+    """
+    if file_path.lower().endswith((".tif", ".tiff")):
+        try:
+            import tifffile
+            with tifffile.TiffFile(file_path) as tif:
+                page = tif.pages[0]
+                return int(page.imagelength), int(page.imagewidth)
+        except ImportError:
+            pass
+        except Exception:
+            return None
+    try:
+        from PIL import Image
+        with Image.open(file_path) as pil_image:
+            width, height = pil_image.size
+            return height, width
+    except Exception:
+        return None
+
+
+class TiledImageSource:
+    """
+    Источник изображения для потоковой обработки тайлами
+
+    Пиксели не загружаются в память целиком: несжатые TIFF и .npy
+    отображаются в память (memory-mapped), сжатые TIFF декодируются
+    полосами/тайлами во временный файл на диске (tifffile). Прочие форматы
+    (PNG, JPEG) не читаются по частям и декодируются целиком, поэтому
+    принимаются, только если декодированное изображение укладывается в
+    memory_limit_bytes.
+    """
+
+    def __init__(self, file_path: str, scratch_dir: str = None, memory_limit_bytes: Optional[int] = None):
+        self.file_path = file_path
+        self.scratch_path: Optional[str] = None
+        self.mode = "memmap"
+        scratch_dir = scratch_dir or TILED_SCRATCH_DIR
+        
+        lower_path = file_path.lower()
+        if lower_path.endswith(".npy"):
+            self._data = np.load(file_path, mmap_mode="r")
+        elif lower_path.endswith((".tif", ".tiff")) and self._tifffile() is not None:
+            tifffile = self._tifffile()
+            try:
+                self._data = tifffile.memmap(file_path, mode="r")
+            except ValueError:
+                # Сжатый или фрагментированный TIFF: декодируем полосами в файл
+                os.makedirs(scratch_dir, exist_ok=True)
+                self.scratch_path = os.path.join(scratch_dir, f"source_{uuid.uuid4().hex}.bin")
+                with tifffile.TiffFile(file_path) as tif:
+                    self._data = tif.pages[0].asarray(out=self.scratch_path)
+                self.mode = "striped"
+        else:
+            size = get_image_size(file_path)
+            if memory_limit_bytes is not None and size is not None:
+                decoded_bytes = size[0] * size[1] * FULL_DECODE_BYTES_PER_PIXEL
+                if decoded_bytes > memory_limit_bytes:
+                    message = (
+                        f"Изображение {size[1]}x{size[0]} в формате {os.path.splitext(file_path)[1] or 'без расширения'} "
+                        f"не читается по частям: для декодирования нужно {decoded_bytes // (1024 * 1024)} MB при лимите "
+                        f"{memory_limit_bytes // (1024 * 1024)} MB, сохраните скан в TIFF"
+                    )
+                    logger.error(message)
+                    raise ValueError(message)
+            logger.warning(f"Формат {file_path} не поддерживает частичное чтение, изображение декодируется целиком")
+            image = load_image(file_path)
+            os.makedirs(scratch_dir, exist_ok=True)
+            self.scratch_path = os.path.join(scratch_dir, f"source_{uuid.uuid4().hex}.npy")
+            self._data = np.lib.format.open_memmap(self.scratch_path, mode="w+", dtype=np.uint8, shape=image.shape)
+            self._data[:] = image
+            del image
+            self.mode = "decoded"
+    
+    @classmethod
+    def from_array(cls, data: np.ndarray) -> "TiledImageSource":
+        """
+        Источник над уже декодированным изображением в памяти
+
+        Args:
+            data: Изображение (оттенки серого, RGB или RGBA)
+
+        Returns:
+            Источник с тем же интерфейсом чтения областей
+        """
+        source = cls.__new__(cls)
+        source.file_path = None
+        source.scratch_path = None
+        source.mode = "memory"
+        source._data = data
+        return source
+
+    @staticmethod
+    def _tifffile():
+        try:
+            import tifffile
+            return tifffile
+        except ImportError:
+            return None
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Размер изображения (высота, ширина)"""
+        return int(self._data.shape[0]), int(self._data.shape[1])
+    
+    def read(self, top: int, bottom: int, left: int, right: int, step: int = 1, gray: bool = True) -> np.ndarray:
+        """
+        Читает прямоугольную область в оттенках серого или RGB
+        
+        Args:
+            top, bottom, left, right: Границы области в пикселях
+            step: Шаг выборки строк и столбцов (прореживание для уменьшенных копий)
+            gray: True - оттенки серого, False - RGB
+            
+        Returns:
+            Область изображения uint8 (копия в памяти)
+        """
+        region = np.asarray(self._data[top:bottom:step, left:right:step])
+        if region.dtype == np.uint16:
+            region = (region >> 8).astype(np.uint8)
+        elif region.dtype == np.bool_:
+            region = region.astype(np.uint8) * 255
+        elif region.dtype != np.uint8:
+            region = np.clip(region, 0, 255).astype(np.uint8)
+        if region.ndim == 3 and region.shape[2] == 1:
+            region = region[:, :, 0]
+        if gray and region.ndim == 3:
+            conversion = cv2.COLOR_RGBA2GRAY if region.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+            region = cv2.cvtColor(np.ascontiguousarray(region[:, :, :4]), conversion)
+        elif not gray and region.ndim == 2:
+            region = cv2.cvtColor(np.ascontiguousarray(region), cv2.COLOR_GRAY2RGB)
+        elif not gray and region.shape[2] == 4:
+            region = cv2.cvtColor(np.ascontiguousarray(region), cv2.COLOR_RGBA2RGB)
+        return np.ascontiguousarray(region)
+    
+    def close(self) -> None:
+        """Освобождает отображение и удаляет временные файлы"""
+        self._data = None
+        if self.scratch_path and os.path.exists(self.scratch_path):
+            os.remove(self.scratch_path)
+    
+    def __enter__(self) -> "TiledImageSource":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _percentile_level(hist: np.ndarray, percentile: float) -> int:
+    """Возвращает уровень яркости, соответствующий перцентилю гистограммы"""
+    cumulative = np.cumsum(hist)
+    if cumulative[-1] == 0:
+        return 0
+    target = cumulative[-1] * percentile / 100.0
+    return int(np.searchsorted(cumulative, target))
 
 
 class ImageProcessor:
@@ -16,6 +531,12 @@ class ImageProcessor:
         self.processing_log: List[str] = []
         self.current_step = 0
         self.total_steps = 0
+        self.execution_plan: List[Dict[str, Any]] = []
+        self.step_timings: List[Dict[str, Any]] = []
+        self.quality_report: Optional[Dict[str, Any]] = None
+        # Буферы, созданные процессором в текущем запуске: их можно
+        # перезаписывать на месте, не трогая изображение вызывающего кода
+        self._owned_buffers: Dict[int, np.ndarray] = {}
     
     def _log_step(self, message: str) -> None:
         """Логирует этап обработки"""
@@ -29,153 +550,678 @@ class ImageProcessor:
         self.processing_log = []
         self.current_step = 0
     
-    def align_image(self, image: Any) -> Any:
+    def _is_owned(self, image: np.ndarray) -> bool:
+        return self._owned_buffers.get(id(image)) is image
+    
+    def _own(self, image: np.ndarray) -> np.ndarray:
+        self._owned_buffers[id(image)] = image
+        return image
+    
+    def _step_method(self, step: str, params: Optional[Dict[str, Any]]) -> Optional[str]:
+        return (params or {}).get("method", DEFAULT_STEP_METHODS.get(step))
+    
+    def is_pointwise(self, step: str, params: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Проверяет, сводится ли этап с данными параметрами к LUT-преобразованию
+        
+        Args:
+            step: Название этапа
+            params: Параметры этапа
+            
+        Returns:
+            True, если этап поэлементный
+        """
+        return self._step_method(step, params) in POINTWISE_METHODS.get(step, set())
+    
+    def plan_steps(self, steps: List[str], parameters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Строит план выполнения этапов
+        
+        Соседние поэлементные этапы (гамма, растяжение контраста, пороговая
+        бинаризация) объединяются в одну группу, которая выполняется одним
+        проходом по изображению.
+        
+        Args:
+            steps: Список этапов обработки
+            parameters: Параметры этапов {название этапа: {параметр: значение}}
+            
+        Returns:
+            Список групп {"kind": "fused" | "step", "steps": [...]}
+        """
+        parameters = parameters or {}
+        plan: List[Dict[str, Any]] = []
+        
+        for step in steps:
+            if self.is_pointwise(step, parameters.get(step)):
+                if plan and plan[-1]["kind"] == "fused":
+                    plan[-1]["steps"].append(step)
+                else:
+                    plan.append({"kind": "fused", "steps": [step]})
+            else:
+                plan.append({"kind": "step", "steps": [step]})
+        
+        return plan
+    
+    def _contrast_lut(self, params: Dict[str, Any], hist: np.ndarray) -> np.ndarray:
+        """LUT растяжения контраста по перцентилям и/или гамма-коррекции"""
+        levels = np.arange(256, dtype=np.float32)
+        method = self._step_method("enhance_contrast", params)
+        
+        if method == "stretch":
+            low = _percentile_level(hist, float(params.get("low_percentile", 1.0)))
+            high = _percentile_level(hist, float(params.get("high_percentile", 99.0)))
+            if high > low:
+                levels = (levels - low) * (255.0 / (high - low))
+        
+        gamma = float(params.get("gamma", 1.0))
+        if gamma != 1.0:
+            levels = 255.0 * (np.clip(levels, 0, 255) / 255.0) ** gamma
+        
+        return np.clip(np.rint(levels), 0, 255).astype(np.uint8)
+    
+    def _binarize_lut(self, params: Dict[str, Any], hist: np.ndarray) -> np.ndarray:
+        """LUT глобальной пороговой бинаризации (порог Оцу или фиксированный)"""
+        if self._step_method("binarize_image", params) == "threshold":
+            threshold = int(params.get("threshold", 127))
+        else:
+            threshold = _otsu_threshold(hist)
+        return np.where(np.arange(256) > threshold, 255, 0).astype(np.uint8)
+    
+    def _apply_pointwise(
+        self,
+        image: np.ndarray,
+        steps: List[str],
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        """
+        Выполняет группу поэлементных этапов за один проход
+        
+        Таблицы подстановки этапов компонуются в одну: гистограмма
+        вычисляется один раз по входному изображению, а гистограммы
+        промежуточных результатов получаются ее пересчетом через уже
+        собранную LUT. Само изображение читается и записывается один раз.
+        
+        Args:
+            image: Входное изображение (uint8)
+            steps: Поэлементные этапы группы
+            parameters: Параметры этапов
+            
+        Returns:
+            Обработанное изображение
+        """
+        parameters = parameters or {}
+        image = self._as_gray(image)
+        
+        hist = np.bincount(image.ravel(), minlength=256).astype(np.float64)
+        lut = np.arange(256, dtype=np.uint8)
+        
+        for step in steps:
+            params = parameters.get(step) or {}
+            # Гистограмма промежуточного результата без прохода по изображению
+            step_hist = np.bincount(lut, weights=hist, minlength=256)
+            if step == "enhance_contrast":
+                step_lut = self._contrast_lut(params, step_hist)
+            else:
+                step_lut = self._binarize_lut(params, step_hist)
+            lut = step_lut[lut]
+        
+        # Пишем на место, если буфер принадлежит процессору
+        if self._is_owned(image):
+            return cv2.LUT(image, lut, dst=image)
+        return self._own(cv2.LUT(image, lut))
+    
+    def _as_gray(self, image: np.ndarray) -> np.ndarray:
+        """Приводит изображение к одноканальному uint8"""
+        if image.ndim == 3:
+            image = self._own(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        if image.dtype != np.uint8:
+            image = self._own(np.clip(image, 0, 255).astype(np.uint8))
+        return image
+    
+    def _output_buffer(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Возвращает буфер для записи результата фильтра того же размера
+        
+        Буфер процессора переиспользуется (фильтры OpenCV, которые не могут
+        работать на месте, сами копируют вход во временный буфер).
+        """
+        return image if self._is_owned(image) else None
+    
+    def _build_pyramid(self, gray: np.ndarray, min_size: int) -> List[np.ndarray]:
+        """
+        Строит пирамиду изображений (каждый уровень вдвое меньше предыдущего)
+        
+        Args:
+            gray: Одноканальное изображение
+            min_size: Уровни строятся, пока большая сторона больше min_size
+            
+        Returns:
+            Уровни от исходного к самому грубому
+        """
+        levels = [gray]
+        while max(levels[-1].shape) > min_size:
+            levels.append(cv2.pyrDown(levels[-1]))
+        return levels
+    
+    def _search_skew_angle(self, level: np.ndarray, angles: np.ndarray) -> float:
+        """
+        Выбирает угол с максимальной резкостью горизонтального профиля проекции
+        
+        Вместо поворота изображения для каждого угла поворачиваются только
+        координаты пикселей текста, профиль строится гистограммой.
+        
+        Args:
+            level: Уровень пирамиды
+            angles: Проверяемые углы в градусах
+            
+        Returns:
+            Угол с максимальной дисперсией профиля
+        """
+        _, mask = cv2.threshold(level, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        ys, xs = np.nonzero(mask)
+        if ys.size == 0:
+            return 0.0
+        ys = ys.astype(np.float32)
+        xs = xs.astype(np.float32) - level.shape[1] / 2.0
+        offset = float(level.shape[1])
+        
+        best_angle, best_score = 0.0, -1.0
+        for angle in angles:
+            radians = np.radians(angle)
+            projected = ys * np.cos(radians) - xs * np.sin(radians) + offset
+            profile = np.bincount(projected.astype(np.int32))
+            score = float(np.dot(profile, profile))
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+        return best_angle
+    
+    def _estimate_skew_angle(
+        self,
+        gray: np.ndarray,
+        max_angle: float,
+        coarse_step: float = 1.0,
+        fine_step: float = 0.05
+    ) -> Tuple[float, Dict[str, Any]]:
+        """
+        Оценивает угол наклона строк текста от грубого к точному
+        
+        Угол сначала ищется во всем диапазоне с крупным шагом на грубом
+        уровне пирамиды, затем уточняется в узком окне вокруг найденного
+        значения на более детальном уровне.
+        
+        Args:
+            gray: Одноканальное изображение
+            max_angle: Максимальный учитываемый угол наклона в градусах
+            coarse_step: Шаг грубого поиска в градусах
+            fine_step: Шаг уточнения в градусах
+            
+        Returns:
+            Кортеж (угол в градусах, сведения об уровнях и времени оценки)
+        """
+        levels = self._build_pyramid(gray, DESKEW_COARSE_SIZE)
+        coarse = levels[-1]
+        # Самый детальный уровень, не превышающий DESKEW_REFINE_SIZE
+        fine = next(level for level in levels if max(level.shape) <= DESKEW_REFINE_SIZE)
+        
+        started = time.perf_counter()
+        coarse_angle = self._search_skew_angle(
+            coarse, np.arange(-max_angle, max_angle + coarse_step / 2, coarse_step)
+        )
+        coarse_ms = (time.perf_counter() - started) * 1000.0
+        
+        started = time.perf_counter()
+        angle = self._search_skew_angle(
+            fine, np.arange(coarse_angle - coarse_step, coarse_angle + coarse_step + fine_step / 2, fine_step)
+        )
+        fine_ms = (time.perf_counter() - started) * 1000.0
+        
+        return angle, {
+            "coarse_angle": coarse_angle,
+            "coarse_level": f"{coarse.shape[1]}x{coarse.shape[0]}",
+            "coarse_ms": coarse_ms,
+            "fine_level": f"{fine.shape[1]}x{fine.shape[0]}",
+            "fine_ms": fine_ms
+        }
+    
+    def _rotate(self, image: np.ndarray, angle: float) -> np.ndarray:
+        """Поворачивает изображение вокруг центра с сохранением размера"""
+        height, width = image.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, 1.0)
+        return self._own(cv2.warpAffine(
+            image, matrix, (width, height),
+            flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+        ))
+    
+    def align_image(self, image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
         """
         Выравнивание изображения (deskew)
         
+        Угол наклона оценивается по профилю проекции на пирамиде изображений
+        (грубый поиск на уменьшенной копии, уточнение в узком окне на более
+        детальном уровне), затем изображение в полном разрешении
+        поворачивается одним аффинным преобразованием.
+        
         Args:
             image: Входное изображение
+            params: Параметры этапа (max_angle, min_angle, coarse_step, fine_step)
             
         Returns:
-            Выровненное изображение (пока возвращает исходное)
+            Выровненное изображение
         """
         self._log_step("Выполняется выравнивание изображения...")
+        params = params or {}
         
-        # TODO: Здесь будет настоящая обработка
-        # - Определение угла наклона документа
-        # - Поворот изображения для выравнивания
-        # - Использование алгоритмов Hough Transform или Radon Transform
+        gray = self._as_gray(image)
+        angle, estimate = self._estimate_skew_angle(
+            gray,
+            float(params.get("max_angle", 15.0)),
+            float(params.get("coarse_step", 1.0)),
+            float(params.get("fine_step", 0.05))
+        )
+        self.processing_log.append(
+            f"  Оценка угла: {estimate['coarse_angle']:.2f}° на {estimate['coarse_level']} "
+            f"({estimate['coarse_ms']:.1f} мс), уточнение {angle:.2f}° на {estimate['fine_level']} "
+            f"({estimate['fine_ms']:.1f} мс)"
+        )
         
-        time.sleep(0.5)  # Имитация времени обработки
-        return image
+        if abs(angle) < float(params.get("min_angle", 0.1)):
+            self.processing_log.append("  Наклон не обнаружен, поворот не требуется")
+            return gray
+        
+        started = time.perf_counter()
+        rotated = self._rotate(gray, angle)
+        self.processing_log.append(
+            f"  Угол наклона: {angle:.2f}°, поворот {gray.shape[1]}x{gray.shape[0]} "
+            f"за {(time.perf_counter() - started) * 1000.0:.1f} мс"
+        )
+        return rotated
     
-    def enhance_contrast(self, image: Any) -> Any:
+    def enhance_contrast(self, image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
         """
         Коррекция контрастности изображения
         
         Args:
             image: Входное изображение
+            params: Параметры этапа (method: clahe | stretch | gamma;
+                clip_limit, tile_size (число ячеек) или cell_size (размер
+                ячейки в пикселях) для CLAHE; low_percentile,
+                high_percentile, gamma для поэлементных методов)
             
         Returns:
             Изображение с улучшенной контрастностью
         """
         self._log_step("Повышаем контрастность изображения...")
         
-        # TODO: Здесь будет настоящая обработка
-        # - Применение CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        # - Гамма-коррекция
-        # - Адаптивная коррекция яркости
+        if self.is_pointwise("enhance_contrast", params):
+            return self._apply_pointwise(image, ["enhance_contrast"], {"enhance_contrast": params})
         
-        time.sleep(0.3)
-        return image
+        params = params or {}
+        gray = self._as_gray(image)
+        clip_limit = float(params.get("clip_limit", 2.0))
+        if params.get("cell_size"):
+            # Ячейки ровно cell_size от левого верхнего угла: изображение
+            # дополняется отражением до кратного размера (как в OpenCV, но без
+            # изменения размера ячейки), поэтому сетка ячеек тайла, начатого
+            # с кратной cell_size координаты, совпадает с сеткой всей страницы
+            cell_size = int(params["cell_size"])
+            height, width = gray.shape
+            pad_bottom, pad_right = -height % cell_size, -width % cell_size
+            padded = cv2.copyMakeBorder(gray, 0, pad_bottom, 0, pad_right, cv2.BORDER_REFLECT_101)
+            clahe = cv2.createCLAHE(
+                clipLimit=clip_limit,
+                tileGridSize=(padded.shape[1] // cell_size, padded.shape[0] // cell_size)
+            )
+            if not (pad_bottom or pad_right):
+                return self._own(clahe.apply(gray, dst=self._output_buffer(gray)))
+            return self._own(np.ascontiguousarray(clahe.apply(padded)[:height, :width]))
+        tile_size = int(params.get("tile_size", 8))
+        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_size, tile_size))
+        return self._own(clahe.apply(gray, dst=self._output_buffer(gray)))
     
-    def remove_noise(self, image: Any) -> Any:
+    def remove_noise(self, image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
         """
         Удаление шума с изображения
         
         Args:
             image: Входное изображение
+            params: Параметры этапа (method: median | bilateral; kernel_size
+                для медианного фильтра; diameter, sigma_color, sigma_space
+                для билатерального)
             
         Returns:
             Очищенное от шума изображение
         """
         self._log_step("Удаляем шум с изображения...")
+        params = params or {}
+        gray = self._as_gray(image)
         
-        # TODO: Здесь будет настоящая обработка
-        # - Применение медианного фильтра
-        # - Гауссовское размытие для удаления шума
-        # - Адаптивные фильтры для сохранения деталей
+        if params.get("method", "median") == "bilateral":
+            # Билатеральный фильтр не работает на месте - нужен отдельный буфер
+            return self._own(cv2.bilateralFilter(
+                gray,
+                int(params.get("diameter", 5)),
+                float(params.get("sigma_color", 50.0)),
+                float(params.get("sigma_space", 50.0))
+            ))
         
-        time.sleep(0.4)
-        return image
+        kernel_size = int(params.get("kernel_size", 3)) | 1  # Только нечетный размер
+        return self._own(cv2.medianBlur(gray, kernel_size, dst=self._output_buffer(gray)))
+    
+    def _local_mean_std(
+        self,
+        gray: np.ndarray,
+        window: int,
+        precision: str = "float64"
+    ) -> Iterator[Tuple[int, int, np.ndarray, np.ndarray]]:
+        """
+        Локальные среднее и стандартное отклонение по окну через интегральные изображения
+        
+        Для полосы строк один раз строятся таблицы сумм и сумм квадратов
+        (summed-area tables), после чего сумма по любому окну получается
+        четырьмя обращениями - стоимость на пиксель не зависит от размера
+        окна. Страница обрабатывается полосами по BINARIZE_STRIPE_ROWS строк:
+        таблицы занимают память только на полосу, а их значения не растут
+        с размером страницы, что позволяет считать в одинарной точности.
+        
+        Args:
+            gray: Одноканальное изображение uint8
+            window: Размер окна (нечетный)
+            precision: Точность вычислений: float64 или float32
+            
+        Yields:
+            (начальная строка, конечная строка, среднее, стандартное отклонение) для каждой полосы
+        """
+        half = window // 2
+        area = float(window * window)
+        height = gray.shape[0]
+        padded = cv2.copyMakeBorder(gray, half, half, half, half, cv2.BORDER_REFLECT)
+        
+        for top in range(0, height, BINARIZE_STRIPE_ROWS):
+            bottom = min(top + BINARIZE_STRIPE_ROWS, height)
+            block = padded[top:bottom + 2 * half]
+            
+            if precision == "float32":
+                # Центрирование по среднему полосы уменьшает величину сумм
+                # и потерю точности при вычитании в float32
+                block = block.astype(np.float32)
+                offset = float(block.mean())
+                block -= offset
+                sums, squares = cv2.integral2(block, sdepth=cv2.CV_32F, sqdepth=cv2.CV_32F)
+            else:
+                offset = 0.0
+                sums, squares = cv2.integral2(block, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            
+            # Операции на месте: без временных массивов размера полосы
+            mean = sums[window:, window:] - sums[:-window, window:]
+            mean -= sums[window:, :-window]
+            mean += sums[:-window, :-window]
+            mean *= 1.0 / area
+            
+            variance = squares[window:, window:] - squares[:-window, window:]
+            variance -= squares[window:, :-window]
+            variance += squares[:-window, :-window]
+            variance *= 1.0 / area
+            variance -= mean * mean
+            np.maximum(variance, 0.0, out=variance)
+            std = np.sqrt(variance, out=variance)
+            
+            mean += offset
+            yield top, bottom, mean, std
+    
+    def _local_threshold(self, gray: np.ndarray, params: Dict[str, Any]) -> np.ndarray:
+        """
+        Локальная бинаризация Саувола или Ниблэка
+        
+        Саувола: T = m * (1 + k * (s / R - 1)), Ниблэк: T = m + k * s,
+        где m и s - среднее и стандартное отклонение в окне.
+        
+        Args:
+            gray: Одноканальное изображение uint8
+            params: Параметры этапа (method, window, k, dynamic_range, precision)
+            
+        Returns:
+            Бинаризованное изображение
+        """
+        method = self._step_method("binarize_image", params)
+        window = int(params.get("window", 31)) | 1
+        precision = params.get("precision", "float64")
+        if precision not in ("float32", "float64"):
+            raise ValueError(f"Неизвестная точность вычислений: {precision}")
+        
+        if method == "niblack":
+            k = float(params.get("k", -0.2))
+        else:
+            k = float(params.get("k", 0.2))
+            dynamic_range = float(params.get("dynamic_range", 128.0))
+        
+        binary = np.empty_like(gray)
+        for top, bottom, mean, std in self._local_mean_std(gray, window, precision):
+            # Порог считается на месте в буфере стандартного отклонения
+            threshold = std
+            if method == "niblack":
+                threshold *= k
+                threshold += mean
+            else:
+                threshold *= k / dynamic_range
+                threshold += 1.0 - k
+                threshold *= mean
+            np.greater(gray[top:bottom], threshold, out=binary[top:bottom], casting="unsafe")
+        binary *= 255
+        return binary
     
-    def binarize_image(self, image: Any) -> Any:
+    def binarize_image(self, image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
         """
         Бинаризация изображения (черно-белое)
         
         Args:
             image: Входное изображение
+            params: Параметры этапа (method: sauvola | niblack | otsu | threshold;
+                window, k, precision для локальных методов, dynamic_range
+                для Саувола; threshold для фиксированного порога)
             
         Returns:
             Бинаризованное изображение
         """
         self._log_step("Выполняется бинаризация изображения...")
         
-        # TODO: Здесь будет настоящая обработка
-        # - Адаптивная пороговая обработка (Otsu, Sauvola)
-        # - Морфологические операции
-        # - Удаление артефактов сканирования
+        if self.is_pointwise("binarize_image", params):
+            return self._apply_pointwise(image, ["binarize_image"], {"binarize_image": params})
         
-        time.sleep(0.2)
-        return image
+        return self._own(self._local_threshold(self._as_gray(image), params or {}))
     
-    def correct_perspective(self, image: Any) -> Any:
+    def _find_document_corners(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Ищет четырехугольник границ документа на уменьшенной копии
+        
+        Returns:
+            Углы (4x2, float32) в координатах исходного изображения или None
+        """
+        scale = min(1.0, 1000.0 / max(gray.shape))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+        
+        blurred = cv2.GaussianBlur(small, (5, 5), 0)
+        edges = cv2.Canny(blurred, 50, 150)
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        min_area = 0.3 * small.shape[0] * small.shape[1]
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+            if cv2.contourArea(contour) < min_area:
+                break
+            approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(approx) == 4 and cv2.isContourConvex(approx):
+                return approx.reshape(4, 2).astype(np.float32) / scale
+        return None
+    
+    def correct_perspective(self, image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
         """
         Коррекция перспективы документа
         
+        Границы листа ищутся на уменьшенной копии, затем гомография
+        применяется к изображению в полном разрешении с обрезкой по листу.
+        
         Args:
             image: Входное изображение
+            params: Параметры этапа (не используются)
             
         Returns:
             Изображение с исправленной перспективой
         """
         self._log_step("Корректируем перспективу документа...")
         
-        # TODO: Здесь будет настоящая обработка
-        # - Определение границ документа
-        # - Применение гомографии для исправления перспективы
-        # - Обрезка по границам документа
+        gray = self._as_gray(image)
+        corners = self._find_document_corners(gray)
+        if corners is None:
+            self.processing_log.append("  Границы документа не найдены, коррекция не требуется")
+            return gray
         
-        time.sleep(0.6)
-        return image
+        warped = self._warp_to_corners(gray, corners)
+        self.processing_log.append(f"  Документ выровнен по границам: {warped.shape[1]}x{warped.shape[0]}")
+        return self._own(warped)
+    
+    def _warp_to_corners(self, gray: np.ndarray, corners: np.ndarray) -> np.ndarray:
+        """
+        Переносит четырехугольник листа в прямоугольник гомографией
+        
+        Args:
+            gray: Одноканальное изображение
+            corners: Углы листа (4x2) в координатах изображения
+            
+        Returns:
+            Изображение листа без окружающего фона
+        """
+        # Упорядочиваем углы: левый верхний, правый верхний, правый нижний, левый нижний
+        sums = corners.sum(axis=1)
+        diffs = np.diff(corners, axis=1).ravel()
+        ordered = np.array([
+            corners[np.argmin(sums)],
+            corners[np.argmin(diffs)],
+            corners[np.argmax(sums)],
+            corners[np.argmax(diffs)]
+        ], dtype=np.float32)
+        
+        top_left, top_right, bottom_right, bottom_left = ordered
+        width = int(round(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left))))
+        height = int(round(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right))))
+        target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+        
+        homography = cv2.getPerspectiveTransform(ordered, target)
+        return cv2.warpPerspective(
+            gray, homography, (width, height),
+            flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+        )
     
-    def enhance_resolution(self, image: Any) -> Any:
+    def enhance_resolution(self, image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
         """
         Улучшение разрешения изображения
         
+        Бикубическое увеличение с мягкой нерезкой маской для четкости штрихов.
+        
         Args:
             image: Входное изображение
+            params: Параметры этапа (scale, sharpen, max_megapixels)
             
         Returns:
             Изображение с улучшенным разрешением
         """
         self._log_step("Улучшаем разрешение изображения...")
+        params = params or {}
+        gray = self._as_gray(image)
         
-        # TODO: Здесь будет настоящая обработка
-        # - Применение супер-разрешения (ESRGAN, Real-ESRGAN)
-        # - Интерполяция высокого качества
-        # - Увеличение DPI для лучшего качества текста
+        scale = float(params.get("scale", 2.0))
+        max_megapixels = float(params.get("max_megapixels", 100.0))
+        target_megapixels = gray.shape[0] * gray.shape[1] * scale * scale / 1e6
+        if scale <= 1.0 or target_megapixels > max_megapixels:
+            self.processing_log.append("  Увеличение пропущено (масштаб или размер вне допустимых значений)")
+            return gray
         
-        time.sleep(0.8)
-        return image
+        upscaled = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        amount = float(params.get("sharpen", 0.5))
+        if amount > 0:
+            blurred = cv2.GaussianBlur(upscaled, (0, 0), 1.0)
+            cv2.addWeighted(upscaled, 1.0 + amount, blurred, -amount, 0, dst=upscaled)
+        return self._own(upscaled)
     
-    def remove_background(self, image: Any) -> Any:
+    def remove_background(self, image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
         """
-        Удаление фона документа
+        Удаление фона документа (выравнивание освещенности)
+        
+        Фон оценивается морфологическим закрытием на уменьшенной копии
+        (текст темнее фона и исчезает), затем изображение делится на фон.
         
         Args:
             image: Входное изображение
+            params: Параметры этапа (kernel_size - размер ядра в пикселях
+                исходного изображения, downscale)
             
         Returns:
-            Изображение с удаленным фоном
+            Изображение с выровненным фоном
         """
         self._log_step("Удаляем фон документа...")
+        params = params or {}
+        gray = self._as_gray(image)
         
-        # TODO: Здесь будет настоящая обработка
-        # - Сегментация фона и содержимого
-        # - Применение алгоритмов GrabCut или Watershed
-        # - Создание маски для изоляции текста
+        downscale = max(int(params.get("downscale", 4)), 1)
+        kernel_size = max(int(params.get("kernel_size", 61)) // downscale, 3) | 1
+        height, width = gray.shape
         
-        time.sleep(0.4)
-        return image
+        small = cv2.resize(gray, (max(width // downscale, 1), max(height // downscale, 1)), interpolation=cv2.INTER_AREA)
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+        background = cv2.morphologyEx(small, cv2.MORPH_CLOSE, kernel)
+        background = cv2.medianBlur(background, 5)
+        background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+        
+        # Деление на фон: равномерный фон становится белым
+        return self._own(cv2.divide(gray, background, dst=self._output_buffer(gray), scale=255))
+    
+    def _record_timing(self, steps: List[str], image: np.ndarray, seconds: float) -> None:
+        """
+        Записывает время выполнения этапа и сверяет его с бюджетом
+        
+        Args:
+            steps: Этапы, выполненные за замеренный проход
+            image: Входное изображение прохода
+            seconds: Затраченное время в секундах
+        """
+        megapixels = image.shape[0] * image.shape[1] / 1e6
+        budget_ms = sum(STEP_TIME_BUDGETS_MS_PER_MP.get(step, 0.0) for step in steps) * max(megapixels, 0.01)
+        elapsed_ms = seconds * 1000.0
+        within_budget = elapsed_ms <= budget_ms
+        
+        self.step_timings.append({
+            "steps": list(steps),
+            "megapixels": round(megapixels, 3),
+            "elapsed_ms": round(elapsed_ms, 2),
+            "budget_ms": round(budget_ms, 2),
+            "within_budget": within_budget
+        })
+        if not within_budget:
+            logger.warning(
+                f"Этап {'+'.join(steps)} превысил бюджет времени: "
+                f"{elapsed_ms:.1f} мс при бюджете {budget_ms:.1f} мс ({megapixels:.2f} Мп)"
+            )
+    
+    def _run_step(self, step: str, image: np.ndarray, params: Optional[Dict[str, Any]]) -> np.ndarray:
+        return getattr(self, step)(image, params)
     
-    def process_document(self, image: Any, steps: List[str] = None) -> Any:
+    def process_document(
+        self,
+        image: np.ndarray,
+        steps: List[str] = None,
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
         """
         Полная обработка документа с указанными этапами
         
+        Этапы выполняются по плану: соседние поэлементные этапы
+        объединяются в один проход, промежуточные буферы процессора
+        переиспользуются между этапами. Время каждого прохода сверяется
+        с бюджетом STEP_TIME_BUDGETS_MS_PER_MP.
+        
         Args:
             image: Входное изображение
             steps: Список этапов обработки
+            parameters: Параметры этапов {название этапа: {параметр: значение}}
             
         Returns:
             Обработанное изображение
@@ -190,76 +1236,805 @@ class ImageProcessor:
                 'enhance_resolution'
             ]
         
+        parameters = parameters or {}
+        unknown_steps = [step for step in steps if not hasattr(self, step)]
+        for step in unknown_steps:
+            print(f"Предупреждение: Неизвестный этап '{step}'")
+        steps = [step for step in steps if step not in unknown_steps]
+        
         self.total_steps = len(steps)
         self.reset_log()
+        self._owned_buffers = {}
+        self.step_timings = []
+        self.quality_report = None
+        self.execution_plan = self.plan_steps(steps, parameters)
         
         print(f"Начинаем обработку документа ({self.total_steps} этапов)...")
         
+        processed_image = self._execute_plan(image, parameters)
+        
+        print("Обработка завершена!")
+        return processed_image
+    
+    def _execute_plan(self, image: np.ndarray, parameters: Dict[str, Any]) -> np.ndarray:
+        """
+        Выполняет текущий план обработки над изображением
+        
+        Args:
+            image: Входное изображение
+            parameters: Параметры этапов
+            
+        Returns:
+            Обработанное изображение
+        """
         processed_image = image
         
-        for step in steps:
-            if hasattr(self, step):
-                method = getattr(self, step)
-                processed_image = method(processed_image)
+        for group in self.execution_plan:
+            if group["kind"] == "fused":
+                for step in group["steps"]:
+                    self._log_step(f"Этап '{step}' выполняется в объединенном поэлементном проходе")
+                started = time.perf_counter()
+                result = self._apply_pointwise(processed_image, group["steps"], parameters)
+                self._record_timing(group["steps"], processed_image, time.perf_counter() - started)
+                processed_image = result
             else:
-                print(f"Предупреждение: Неизвестный этап '{step}'")
+                for step in group["steps"]:
+                    started = time.perf_counter()
+                    result = self._run_step(step, processed_image, parameters.get(step))
+                    self._record_timing([step], processed_image, time.perf_counter() - started)
+                    processed_image = result
         
-        print("Обработка завершена!")
+        # Результат передается вызывающему коду - буферы больше не переиспользуем
+        self._owned_buffers = {}
+        return processed_image
+    
+    def _content_patch(self, small: np.ndarray, shape: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        """
+        Выбирает фрагмент страницы с наибольшей плотностью штрихов текста
+        
+        Args:
+            small: Уменьшенная копия страницы
+            shape: Размер страницы в полном разрешении (высота, ширина)
+            
+        Returns:
+            Границы фрагмента (top, bottom, left, right) в полном разрешении
+        """
+        height, width = shape
+        patch_height, patch_width = min(QUALITY_PATCH_SIZE, height), min(QUALITY_PATCH_SIZE, width)
+        scale = small.shape[0] / float(height)
+        
+        # Доля краевых пикселей в окне размером с фрагмент: у текста она
+        # высокая, у одиночной границы листа - низкая
+        edges = cv2.Canny(small, 50, 150)
+        window = (max(int(patch_width * scale), 1), max(int(patch_height * scale), 1))
+        density = cv2.boxFilter(edges, cv2.CV_32F, window)
+        row, col = np.unravel_index(int(np.argmax(density)), density.shape)
+        
+        top = min(max(int(row / scale) - patch_height // 2, 0), height - patch_height)
+        left = min(max(int(col / scale) - patch_width // 2, 0), width - patch_width)
+        return top, top + patch_height, left, left + patch_width
+    
+    def measure_quality(self, small: np.ndarray, patch: np.ndarray, shape: Tuple[int, int]) -> Dict[str, Any]:
+        """
+        Измеряет метрики качества страницы
+        
+        Геометрия, контраст и фон оцениваются на уменьшенной копии,
+        шум и резкость - на фрагменте в полном разрешении (уменьшение
+        усредняет шум и скрывает размытие).
+        
+        Args:
+            small: Уменьшенная копия страницы
+            patch: Фрагмент страницы в полном разрешении
+            shape: Размер страницы в полном разрешении (высота, ширина)
+            
+        Returns:
+            Словарь метрик качества
+        """
+        metrics: Dict[str, Any] = {
+            "analysis_size": f"{small.shape[1]}x{small.shape[0]}",
+            "source_size": f"{shape[1]}x{shape[0]}"
+        }
+        
+        # Границы листа: доля кадра и отклонение углов от прямоугольника
+        height, width = small.shape
+        corners = self._find_document_corners(small)
+        if corners is None:
+            metrics["page_coverage"] = None
+            metrics["corner_deviation"] = None
+        else:
+            x, y, w, h = cv2.boundingRect(corners)
+            box = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.float32)
+            deviation = max(float(np.min(np.linalg.norm(box - corner, axis=1))) for corner in corners)
+            metrics["page_coverage"] = round(float(cv2.contourArea(corners)) / float(height * width), 3)
+            metrics["corner_deviation"] = round(deviation / math.hypot(w, h), 4)
+            # Остальное оценивается по листу без окружающего фона съемки
+            if (metrics["page_coverage"] < QUALITY_THRESHOLDS["page_coverage"]
+                    or metrics["corner_deviation"] > QUALITY_THRESHOLDS["corner_deviation"]):
+                small = self._warp_to_corners(small, corners)
+                height, width = small.shape
+        
+        # Неравномерность фона: закрытие на еще более грубой копии убирает
+        # текст, остается освещенность
+        factor = max(max(height, width) // 256, 1)
+        coarse = cv2.resize(small, (max(width // factor, 1), max(height // factor, 1)), interpolation=cv2.INTER_AREA)
+        kernel_size = max(max(coarse.shape) // 16, 3) | 1
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+        background = cv2.medianBlur(cv2.morphologyEx(coarse, cv2.MORPH_CLOSE, kernel), 5)
+        background_hist = cv2.calcHist([background], [0], None, [256], [0, 256]).ravel()
+        metrics["background_unevenness"] = float(
+            _percentile_level(background_hist, 95.0) - _percentile_level(background_hist, 5.0)
+        )
+        
+        # Остальные метрики яркости считаются по странице в том виде, в каком
+        # ее получат следующие этапы: с выровненным фоном, если он неравномерный
+        if metrics["background_unevenness"] > QUALITY_THRESHOLDS["background_unevenness"]:
+            background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+            small = cv2.divide(small, background, scale=255)
+        
+        # Наклон строк
+        angle, _ = self._estimate_skew_angle(small, 15.0, 1.0, 0.1)
+        metrics["skew_angle"] = round(angle, 2)
+        
+        # Гистограмма: динамический диапазон и разделимость классов по Оцу
+        hist = cv2.calcHist([small], [0], None, [256], [0, 256]).ravel().astype(np.float64)
+        metrics["dynamic_range"] = float(_percentile_level(hist, 99.0) - _percentile_level(hist, 1.0))
+        threshold = _otsu_threshold(hist)
+        metrics["otsu_threshold"] = threshold
+        levels = np.arange(256, dtype=np.float64)
+        total = hist.sum()
+        total_var = float(np.dot(hist, (levels - np.dot(hist, levels) / total) ** 2) / total)
+        weight_bg = float(hist[:threshold + 1].sum() / total)
+        weight_fg = 1.0 - weight_bg
+        if total_var > 0 and 0.0 < weight_bg < 1.0:
+            mean_bg = float(np.dot(hist[:threshold + 1], levels[:threshold + 1]) / (weight_bg * total))
+            mean_fg = float(np.dot(hist[threshold + 1:], levels[threshold + 1:]) / (weight_fg * total))
+            metrics["separability"] = round(weight_bg * weight_fg * (mean_bg - mean_fg) ** 2 / total_var, 3)
+        else:
+            metrics["separability"] = 0.0
+        
+        # Шум: оценка Иммеркера по медиане отклика (устойчива к краям штрихов)
+        response = cv2.filter2D(patch.astype(np.float32), -1, np.array(
+            [[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32
+        ))[1:-1, 1:-1]
+        metrics["noise_sigma"] = round(float(np.median(np.abs(response))) / (0.6745 * 6.0), 2)
+        
+        # Импульсный шум: пиксели намного ярче или темнее всех восьми соседей
+        ring = np.ones((3, 3), np.uint8)
+        ring[1, 1] = 0
+        brighter = cv2.subtract(patch, cv2.dilate(patch, ring)) > 60
+        darker = cv2.subtract(cv2.erode(patch, ring), patch) > 60
+        metrics["impulse_ratio"] = round(float(np.count_nonzero(brighter | darker)) / patch.size, 5)
+        
+        # Резкость: крутизна перепадов яркости на краях штрихов относительно
+        # контраста фрагмента (для гауссова размытия примерно 0.8 / sigma)
+        patch_hist = cv2.calcHist([patch], [0], None, [256], [0, 256]).ravel()
+        patch_range = _percentile_level(patch_hist, 99.0) - _percentile_level(patch_hist, 1.0)
+        gradient = cv2.magnitude(
+            cv2.Sobel(patch, cv2.CV_32F, 1, 0, ksize=3),
+            cv2.Sobel(patch, cv2.CV_32F, 0, 1, ksize=3)
+        )
+        edge_values = gradient[gradient > 0.4 * patch_range]
+        if patch_range < 40 or edge_values.size < 100:
+            metrics["sharpness"] = None
+        else:
+            metrics["sharpness"] = round(float(np.percentile(edge_values, 90)) / (4.0 * patch_range), 3)
+        
+        # Доля полутонов: у бинарной страницы почти все пиксели у краев шкалы
+        midtones = cv2.inRange(patch, 48, 207)
+        metrics["midtone_ratio"] = round(float(np.count_nonzero(midtones)) / midtones.size, 4)
+        return metrics
+    
+    def analyze_quality(self, image: np.ndarray) -> Dict[str, Any]:
+        """
+        Анализирует качество изображения страницы
+        
+        Args:
+            image: Изображение страницы
+            
+        Returns:
+            Словарь метрик качества (с временем анализа analysis_ms)
+        """
+        started = time.perf_counter()
+        gray = self._as_gray(image)
+        # Целый коэффициент уменьшения: INTER_AREA сводится к усреднению блоков
+        factor = max(int(math.ceil(max(gray.shape) / float(QUALITY_ANALYSIS_SIZE))), 1)
+        small = gray if factor == 1 else cv2.resize(
+            gray, (max(gray.shape[1] // factor, 1), max(gray.shape[0] // factor, 1)), interpolation=cv2.INTER_AREA
+        )
+        top, bottom, left, right = self._content_patch(small, gray.shape)
+        metrics = self.measure_quality(small, gray[top:bottom, left:right], gray.shape)
+        metrics["analysis_ms"] = round((time.perf_counter() - started) * 1000.0, 2)
+        return metrics
+    
+    def analyze_source_quality(self, source: "TiledImageSource") -> Dict[str, Any]:
+        """
+        Анализирует качество очень большого изображения без загрузки целиком
+        
+        Уменьшенная копия собирается из полос, фрагмент для шума и
+        резкости читается отдельно.
+        
+        Args:
+            source: Источник изображения для тайловой обработки
+            
+        Returns:
+            Словарь метрик качества (с временем анализа analysis_ms)
+        """
+        started = time.perf_counter()
+        height, width = source.shape
+        factor = max(int(math.ceil(max(height, width) / float(QUALITY_ANALYSIS_SIZE))), 1)
+        small_width = max(width // factor, 1)
+        stripe_rows = factor * max(BINARIZE_STRIPE_ROWS // factor, 1)
+        stripes = []
+        for top in range(0, height, stripe_rows):
+            bottom = min(top + stripe_rows, height)
+            rows = (bottom - top) // factor
+            if rows == 0:
+                break
+            stripe = source.read(top, top + rows * factor, 0, width)
+            stripes.append(cv2.resize(stripe, (small_width, rows), interpolation=cv2.INTER_AREA))
+        small = np.vstack(stripes)
+        top, bottom, left, right = self._content_patch(small, (height, width))
+        metrics = self.measure_quality(small, source.read(top, bottom, left, right), (height, width))
+        metrics["analysis_ms"] = round((time.perf_counter() - started) * 1000.0, 2)
+        return metrics
+    
+    def select_steps(
+        self,
+        metrics: Dict[str, Any],
+        parameters: Optional[Dict[str, Any]] = None,
+        tiled: bool = False
+    ) -> Tuple[List[str], Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Выбирает минимальный набор этапов по метрикам качества
+        
+        Этап включается, только если соответствующая метрика выходит за
+        порог QUALITY_THRESHOLDS. Для бинаризации четко двухуровневой
+        страницы с ровным фоном выбирается глобальный порог Оцу (поэлементный
+        проход) вместо локального; явно заданный метод не меняется. В тайловом
+        режиме гистограмма всей страницы недоступна, поэтому порог Оцу
+        берется по уменьшенной копии и задается фиксированным.
+        
+        Args:
+            metrics: Метрики качества (analyze_quality)
+            parameters: Параметры этапов из запроса
+            tiled: Этапы выбираются для тайловой обработки
+            
+        Returns:
+            Кортеж (этапы, параметры этапов, решения по каждому этапу)
+        """
+        parameters = {step: dict(params or {}) for step, params in (parameters or {}).items()}
+        limits = QUALITY_THRESHOLDS
+        decisions: Dict[str, Dict[str, Any]] = {}
+        
+        def decide(step: str, apply: bool, reason: str, **values: Any) -> None:
+            decisions[step] = {"step": step, "apply": apply, "reason": reason, **values}
+        
+        coverage, deviation = metrics.get("page_coverage"), metrics.get("corner_deviation")
+        if coverage is None:
+            decide("correct_perspective", False, "границы листа не найдены")
+        elif coverage < limits["page_coverage"] or deviation > limits["corner_deviation"]:
+            decide("correct_perspective", True, "лист занимает часть кадра или искажен перспективой",
+                   page_coverage=coverage, corner_deviation=deviation)
+        else:
+            decide("correct_perspective", False, "лист совпадает с кадром",
+                   page_coverage=coverage, corner_deviation=deviation)
+        
+        skew = abs(metrics["skew_angle"])
+        decide("align_image", skew > limits["skew_angle"],
+               "наклон строк" if skew > limits["skew_angle"] else "наклон в пределах допуска",
+               skew_angle=metrics["skew_angle"], threshold=limits["skew_angle"])
+        
+        uneven = metrics["background_unevenness"] > limits["background_unevenness"]
+        decide("remove_background", uneven,
+               "неравномерный фон" if uneven else "фон равномерный",
+               background_unevenness=metrics["background_unevenness"],
+               threshold=limits["background_unevenness"])
+        
+        # Бинаризация: уже бинарная страница, глобальный порог или локальный
+        binarize_params = parameters.get("binarize_image", {})
+        global_threshold = False
+        if metrics["midtone_ratio"] < limits["midtone_ratio"]:
+            decide("binarize_image", False, "страница уже бинарная",
+                   midtone_ratio=metrics["midtone_ratio"], threshold=limits["midtone_ratio"])
+        elif "method" in binarize_params:
+            decide("binarize_image", True, "метод задан в параметрах", method=binarize_params["method"])
+        elif metrics["separability"] >= limits["separability"]:
+            global_threshold = True
+            if tiled:
+                binarize_params.update(method="threshold", threshold=metrics["otsu_threshold"])
+            else:
+                binarize_params["method"] = "otsu"
+            parameters["binarize_image"] = binarize_params
+            decide("binarize_image", True, "гистограмма двухуровневая, достаточно глобального порога",
+                   method=binarize_params["method"], separability=metrics["separability"],
+                   threshold=limits["separability"])
+        else:
+            decide("binarize_image", True, "нужен локальный порог",
+                   method=self._step_method("binarize_image", binarize_params),
+                   separability=metrics["separability"], threshold=limits["separability"])
+        
+        low_contrast = metrics["dynamic_range"] < limits["dynamic_range"]
+        if low_contrast and global_threshold:
+            decide("enhance_contrast", False, "глобальный порог не зависит от контраста",
+                   dynamic_range=metrics["dynamic_range"], threshold=limits["dynamic_range"])
+        else:
+            decide("enhance_contrast", low_contrast,
+                   "низкий контраст" if low_contrast else "контраст достаточный",
+                   dynamic_range=metrics["dynamic_range"], threshold=limits["dynamic_range"])
+        
+        noisy = (metrics["noise_sigma"] > limits["noise_sigma"]
+                 or metrics["impulse_ratio"] > limits["impulse_ratio"])
+        decide("remove_noise", noisy, "шум на странице" if noisy else "шум в пределах допуска",
+               noise_sigma=metrics["noise_sigma"], impulse_ratio=metrics["impulse_ratio"],
+               threshold=limits["noise_sigma"])
+        
+        sharpness = metrics.get("sharpness")
+        blurred = sharpness is not None and sharpness < limits["sharpness"]
+        decide("enhance_resolution", blurred,
+               "размытые штрихи" if blurred else "штрихи резкие или текст не найден",
+               sharpness=sharpness, threshold=limits["sharpness"])
+        
+        steps = [step for step in ADAPTIVE_STEP_ORDER if decisions[step]["apply"]]
+        return steps, parameters, [decisions[step] for step in ADAPTIVE_STEP_ORDER]
+    
+    def process_adaptive(self, image: np.ndarray, parameters: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """
+        Обработка документа минимальным набором этапов по качеству страницы
+        
+        Args:
+            image: Входное изображение
+            parameters: Параметры этапов
+            
+        Returns:
+            Обработанное изображение (выбранные этапы и решения - get_quality_report)
+        """
+        metrics = self.analyze_quality(image)
+        steps, parameters, decisions = self.select_steps(metrics, parameters)
+        processed_image = self.process_document(image, steps, parameters)
+        self._record_quality(metrics, steps, decisions)
         return processed_image
     
+    def _record_quality(self, metrics: Dict[str, Any], steps: List[str], decisions: List[Dict[str, Any]]) -> None:
+        """Сохраняет отчет анализа качества и добавляет решения в начало лога"""
+        self.quality_report = {
+            "analyzer_version": QUALITY_ANALYZER_VERSION,
+            "metrics": metrics,
+            "selected_steps": list(steps),
+            "decisions": decisions
+        }
+        skipped = [decision["step"] for decision in decisions if not decision["apply"]]
+        self.processing_log[:0] = [
+            f"Анализ качества за {metrics['analysis_ms']:.1f} мс: "
+            f"этапы {', '.join(steps) or 'не требуются'}"
+            + (f"; пропущены: {', '.join(skipped)}" if skipped else "")
+        ]
+    
+    def is_tileable(self, step: str, params: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Проверяет, может ли этап выполняться независимо по тайлам
+        
+        Args:
+            step: Название этапа
+            params: Параметры этапа
+            
+        Returns:
+            True, если результату этапа достаточно окрестности пикселя
+        """
+        if step in GLOBAL_STEPS:
+            return False
+        return not (self.is_pointwise(step, params) and self._step_method(step, params) in HISTOGRAM_METHODS)
+    
+    def _step_halo(self, step: str, params: Dict[str, Any]) -> int:
+        """Радиус окрестности этапа в пикселях его входного изображения"""
+        method = self._step_method(step, params)
+        if step == "remove_noise":
+            if method == "bilateral":
+                return int(params.get("diameter", 5)) // 2 + 1
+            return int(params.get("kernel_size", 3)) // 2 + 1
+        if step == "binarize_image" and not self.is_pointwise(step, params):
+            return int(params.get("window", 31)) // 2 + 1
+        if step == "enhance_contrast" and not self.is_pointwise(step, params):
+            # Значение пикселя интерполируется между его ячейкой и соседней:
+            # обе должны целиком попасть в окно тайла
+            return 2 * int(params["cell_size"])
+        if step == "remove_background":
+            return int(params.get("kernel_size", 61)) + 5 * int(params.get("downscale", 4))
+        if step == "enhance_resolution":
+            return 4
+        return 0
+    
+    def _tile_parameters(self, steps: List[str], parameters: Dict[str, Any], shape: Tuple[int, int]) -> Dict[str, Any]:
+        """
+        Приводит параметры этапов к виду, не зависящему от размера тайла
+        
+        CLAHE задается размером ячейки в пикселях (число ячеек зависело бы
+        от размера тайла, ячейка не больше TILED_CLAHE_MAX_CELL), ограничение
+        размера увеличения проверяется по всему изображению. Совпадение
+        результата тайлов с обработкой всей страницы с теми же параметрами
+        обеспечивает process_tiled: окна тайлов начинаются с координат,
+        кратных ячейке CLAHE, поэтому границы ячеек тайлов и страницы совпадают.
+        """
+        tile_parameters = {step: dict(parameters.get(step) or {}) for step in steps}
+        height, width = shape
+        scale = 1.0
+        for step in steps:
+            params = tile_parameters[step]
+            if step == "enhance_contrast" and not self.is_pointwise(step, params) and not params.get("cell_size"):
+                tile_size = int(params.get("tile_size", 8))
+                cell_size = -(-int(max(height, width) * scale) // tile_size)
+                params["cell_size"] = min(max(cell_size, 8), TILED_CLAHE_MAX_CELL)
+            if step == "enhance_resolution":
+                step_scale = float(params.get("scale", 2.0))
+                target_megapixels = height * width * (scale * step_scale) ** 2 / 1e6
+                if step_scale <= 1.0 or target_megapixels > float(params.get("max_megapixels", 100.0)):
+                    params["scale"] = 1.0
+                else:
+                    params["max_megapixels"] = float("inf")
+                    scale *= step_scale
+        return tile_parameters
+    
+    def _tile_halo(self, steps: List[str], tile_parameters: Dict[str, Any], max_halo: int) -> int:
+        """
+        Суммарное поле тайла в пикселях исходника
+        
+        Если поле больше max_halo, уменьшается ячейка CLAHE - единственный
+        этап, окрестность которого выбирается, а не задана параметрами;
+        остальные поля не уменьшаются.
+        
+        Args:
+            steps: Этапы тайловой обработки
+            tile_parameters: Параметры этапов (ячейка CLAHE изменяется на месте)
+            max_halo: Предельное поле в пикселях исходника
+            
+        Returns:
+            Поле в пикселях исходника
+        """
+        def measure() -> Tuple[float, Optional[float]]:
+            total, clahe_scale, scale = 0.0, None, 1.0
+            for step in steps:
+                params = tile_parameters[step]
+                total += self._step_halo(step, params) / scale
+                if step == "enhance_contrast" and params.get("cell_size"):
+                    clahe_scale = scale
+                if step == "enhance_resolution":
+                    scale *= float(params.get("scale", 1.0))
+            return total, clahe_scale
+        
+        halo_source, clahe_scale = measure()
+        if halo_source > max_halo and clahe_scale is not None:
+            params = tile_parameters["enhance_contrast"]
+            cell_size = int(params["cell_size"])
+            excess = int(math.ceil((halo_source - max_halo) * clahe_scale / 2))
+            params["cell_size"] = max(cell_size - excess, 8)
+            halo_source, _ = measure()
+            self.processing_log.append(
+                f"Ячейка CLAHE уменьшена с {cell_size} до {params['cell_size']} px, "
+                f"чтобы поле тайла не превышало {max_halo} px"
+            )
+        return int(math.ceil(halo_source))
+    
+    def process_tiled(
+        self,
+        source_path: str,
+        output_path: str,
+        steps: List[str],
+        parameters: Optional[Dict[str, Any]] = None,
+        memory_limit_mb: Optional[int] = None,
+        adaptive: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Потоковая обработка очень большого изображения тайлами
+        
+        Изображение читается перекрывающимися тайлами: каждый тайл
+        расширяется на суммарный радиус окрестности этапов (halo),
+        обрабатывается теми же методами, что и целая страница, и без
+        полей записывается в отображенный в память выходной файл. Размер
+        тайла выбирается так, чтобы рабочая память не превышала лимит
+        независимо от размера изображения. Этапы, которым нужна вся
+        страница (геометрия листа, гистограмма страницы), пропускаются.
+        
+        Args:
+            source_path: Путь к исходному изображению
+            output_path: Путь для сохранения результата
+            steps: Список этапов обработки
+            parameters: Параметры этапов
+            memory_limit_mb: Лимит рабочей памяти (по умолчанию TILED_MEMORY_LIMIT_MB)
+            adaptive: Выбрать этапы по качеству изображения (steps игнорируется)
+            
+        Returns:
+            Сведения о тайловой обработке (размеры, тайлы, пропущенные этапы)
+        """
+        parameters = parameters or {}
+        memory_limit_bytes = (memory_limit_mb or TILED_MEMORY_LIMIT_MB) * 1024 * 1024
+        with TiledImageSource(source_path, memory_limit_bytes=memory_limit_bytes) as source:
+            quality = None
+            if adaptive:
+                metrics = self.analyze_source_quality(source)
+                steps, parameters, decisions = self.select_steps(metrics, parameters, tiled=True)
+                quality = (metrics, steps, decisions)
+            
+            steps = [step for step in steps if hasattr(self, step)]
+            skipped_steps = [step for step in steps if not self.is_tileable(step, parameters.get(step))]
+            tiled_steps = [step for step in steps if step not in skipped_steps]
+            
+            self.reset_log()
+            self.total_steps = len(tiled_steps)
+            self.step_timings = []
+            self.quality_report = None
+            self.execution_plan = self.plan_steps(tiled_steps, parameters)
+            for step in skipped_steps:
+                self.processing_log.append(f"Этап '{step}' пропущен: требует всего изображения целиком")
+            
+            height, width = source.shape
+            tile_parameters = self._tile_parameters(tiled_steps, parameters, (height, width))
+            
+            # Итоговый масштаб и сторона окна тайла (тайл с полями) в пределах лимита памяти
+            scale = 1.0
+            for step in tiled_steps:
+                if step == "enhance_resolution":
+                    scale *= float(tile_parameters[step].get("scale", 1.0))
+            bytes_per_pixel = TILE_WORKING_BYTES_PER_PIXEL * max(scale, 1.0) ** 2
+            window_side = int(math.sqrt(memory_limit_bytes / bytes_per_pixel))
+            
+            halo = self._tile_halo(tiled_steps, tile_parameters, int(window_side * TILED_MAX_HALO_FRACTION))
+            # Окна тайлов выравниваются по сетке ячеек CLAHE (до ячейки с каждой стороны)
+            align = 1
+            if "enhance_contrast" in tiled_steps and tile_parameters["enhance_contrast"].get("cell_size"):
+                align = int(tile_parameters["enhance_contrast"]["cell_size"])
+            tile_side = window_side - 2 * (halo + align - 1)
+            if tile_side < max(halo, 64):
+                message = (
+                    f"Лимит памяти {memory_limit_bytes // (1024 * 1024)} MB слишком мал "
+                    f"для этапов {tiled_steps}: тайл {tile_side} px меньше поля {halo} px"
+                )
+                logger.error(message)
+                raise ValueError(message)
+            
+            output_shape = (int(round(height * scale)), int(round(width * scale)))
+            os.makedirs(TILED_SCRATCH_DIR, exist_ok=True)
+            scratch_path = os.path.join(TILED_SCRATCH_DIR, f"output_{uuid.uuid4().hex}.npy")
+            output = np.lib.format.open_memmap(scratch_path, mode="w+", dtype=np.uint8, shape=output_shape)
+            
+            tile_processor = ImageProcessor()
+            timings: Dict[Tuple[str, ...], float] = {}
+            tiles = 0
+            logger.info(f"Тайловая обработка {width}x{height}: тайл {tile_side}px, поле {halo}px")
+            
+            try:
+                for top in range(0, height, tile_side):
+                    bottom = min(top + tile_side, height)
+                    for left in range(0, width, tile_side):
+                        right = min(left + tile_side, width)
+                        y0 = max(top - halo, 0) // align * align
+                        y1 = min(-(-(bottom + halo) // align) * align, height)
+                        x0 = max(left - halo, 0) // align * align
+                        x1 = min(-(-(right + halo) // align) * align, width)
+                        
+                        tile = source.read(y0, y1, x0, x1)
+                        tile_processor.reset_log()
+                        tile_processor.total_steps = len(tiled_steps)
+                        tile_processor.step_timings = []
+                        tile_processor._owned_buffers = {}
+                        tile_processor.execution_plan = self.execution_plan
+                        result = tile_processor._execute_plan(tile, tile_parameters)
+                        
+                        # Отрезаем поле и пишем тайл на его место в результате
+                        out_top, out_bottom = int(round(top * scale)), int(round(bottom * scale))
+                        out_left, out_right = int(round(left * scale)), int(round(right * scale))
+                        crop_top = out_top - int(round(y0 * scale))
+                        crop_left = out_left - int(round(x0 * scale))
+                        output[out_top:out_bottom, out_left:out_right] = result[
+                            crop_top:crop_top + out_bottom - out_top,
+                            crop_left:crop_left + out_right - out_left
+                        ]
+                        
+                        for timing in tile_processor.step_timings:
+                            key = tuple(timing["steps"])
+                            timings[key] = timings.get(key, 0.0) + timing["elapsed_ms"]
+                        tiles += 1
+                        del tile, result
+                
+                output.flush()
+                save_image(output, output_path)
+            finally:
+                del output
+                if os.path.exists(scratch_path):
+                    os.remove(scratch_path)
+            
+            source_mode = source.mode
+        
+        megapixels = height * width / 1e6
+        for key, elapsed_ms in timings.items():
+            budget_ms = sum(STEP_TIME_BUDGETS_MS_PER_MP.get(step, 0.0) for step in key) * megapixels
+            self.step_timings.append({
+                "steps": list(key),
+                "megapixels": round(megapixels, 3),
+                "elapsed_ms": round(elapsed_ms, 2),
+                "budget_ms": round(budget_ms, 2),
+                "within_budget": elapsed_ms <= budget_ms
+            })
+        self.processing_log.append(
+            f"Тайловая обработка: {tiles} тайлов {tile_side}px (поле {halo}px), "
+            f"этапы {', '.join(tiled_steps)}, чтение: {source_mode}"
+        )
+        if quality is not None:
+            self._record_quality(*quality)
+        
+        return {
+            "mode": "tiled",
+            "source_shape": [height, width],
+            "output_shape": list(output_shape),
+            "tile_size": tile_side,
+            "halo": halo,
+            "tiles": tiles,
+            "memory_limit_mb": memory_limit_bytes // (1024 * 1024),
+            "source_read": source_mode,
+            "processed_steps": tiled_steps,
+            "skipped_steps": skipped_steps,
+            "quality": self.quality_report
+        }
+    
+    def get_execution_plan(self) -> List[Dict[str, Any]]:
+        """Возвращает план выполнения последней обработки"""
+        return [dict(group, steps=list(group["steps"])) for group in self.execution_plan]
+    
+    def get_step_timings(self) -> List[Dict[str, Any]]:
+        """Возвращает время выполнения этапов последней обработки"""
+        return [dict(timing, steps=list(timing["steps"])) for timing in self.step_timings]
+    
+    def get_quality_report(self) -> Optional[Dict[str, Any]]:
+        """Возвращает отчет анализа качества последней адаптивной обработки"""
+        return self.quality_report
+    
     def get_processing_log(self) -> List[str]:
         """Возвращает лог обработки"""
         return self.processing_log.copy()
 
 
+def preprocess_page(
+    page: np.ndarray,
+    output_path: str,
+    steps: Optional[List[str]] = None,
+    parameters: Optional[Dict[str, Any]] = None,
+    adaptive: bool = False
+) -> Dict[str, Any]:
+    """
+    Предобработка страницы документа с сохранением результата
+    
+    Args:
+        page: Изображение страницы
+        output_path: Путь для сохранения обработанной страницы (черно-белый
+            результат сохраняется в TIFF Group 4 с заменой расширения)
+        steps: Список этапов (не используется при adaptive)
+        parameters: Параметры этапов
+        adaptive: Выбрать этапы по качеству страницы
+        
+    Returns:
+        Сведения об обработке (файл, размер, этапы, лог, время этапов)
+    """
+    processor = ImageProcessor()
+    if adaptive:
+        processed_page = processor.process_adaptive(page, parameters)
+    else:
+        processed_page = processor.process_document(page, steps, parameters)
+    output_path = processed_image_path(processed_page, output_path)
+    save_image(processed_page, output_path)
+    height, width = processed_page.shape[:2]
+    del processed_page
+    
+    quality = processor.get_quality_report()
+    return {
+        "processed_file": output_path,
+        "size": {"width": width, "height": height},
+        "processing_steps": quality["selected_steps"] if adaptive else steps,
+        "quality": quality,
+        "processing_log": processor.get_processing_log(),
+        "step_timings": processor.get_step_timings()
+    }
+
+
+def process_shared_page(
+    descriptor: SharedImageDescriptor,
+    output_path: str,
+    steps: Optional[List[str]] = None,
+    parameters: Optional[Dict[str, Any]] = None,
+    adaptive: bool = False
+) -> Dict[str, Any]:
+    """
+    Предобработка страницы из общего буфера (выполняется в процессе-обработчике)
+    
+    Страница читается из общей памяти без копирования и сериализации,
+    в ответ передаются только сведения об обработке.
+    
+    Args:
+        descriptor: Дескриптор общего буфера со страницей
+        output_path: Путь для сохранения обработанной страницы
+        steps: Список этапов
+        parameters: Параметры этапов
+        adaptive: Выбрать этапы по качеству страницы
+        
+    Returns:
+        Сведения об обработке (как preprocess_page)
+    """
+    with attach_shared_image(descriptor) as page:
+        return preprocess_page(page, output_path, steps, parameters, adaptive)
+
+
 # Функции для обратной совместимости
-def align_image(image: Any) -> Any:
+def align_image(image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
     """Выравнивание изображения (deskew)"""
     processor = ImageProcessor()
     processor.total_steps = 1
-    return processor.align_image(image)
+    return processor.align_image(image, params)
 
 
-def enhance_contrast(image: Any) -> Any:
+def enhance_contrast(image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
     """Коррекция контрастности изображения"""
     processor = ImageProcessor()
     processor.total_steps = 1
-    return processor.enhance_contrast(image)
+    return processor.enhance_contrast(image, params)
 
 
-def remove_noise(image: Any) -> Any:
+def remove_noise(image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
     """Удаление шума с изображения"""
     processor = ImageProcessor()
     processor.total_steps = 1
-    return processor.remove_noise(image)
+    return processor.remove_noise(image, params)
 
 
-def binarize_image(image: Any) -> Any:
+def binarize_image(image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
     """Бинаризация изображения"""
     processor = ImageProcessor()
     processor.total_steps = 1
-    return processor.binarize_image(image)
+    return processor.binarize_image(image, params)
 
 
-def correct_perspective(image: Any) -> Any:
+def correct_perspective(image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
     """Коррекция перспективы документа"""
     processor = ImageProcessor()
     processor.total_steps = 1
-    return processor.correct_perspective(image)
+    return processor.correct_perspective(image, params)
 
 
-def enhance_resolution(image: Any) -> Any:
+def enhance_resolution(image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
     """Улучшение разрешения изображения"""
     processor = ImageProcessor()
     processor.total_steps = 1
-    return processor.enhance_resolution(image)
+    return processor.enhance_resolution(image, params)
 
 
-def remove_background(image: Any) -> Any:
+def remove_background(image: np.ndarray, params: Optional[Dict[str, Any]] = None) -> np.ndarray:
     """Удаление фона документа"""
     processor = ImageProcessor()
     processor.total_steps = 1
-    return processor.remove_background(image)
+    return processor.remove_background(image, params)
+
+
+def sample_text(language: str = "ru", model_type: str = "printed") -> str:
+    """
+    Пример распознанного текста заглушки OCR
+
+    Args:
+        language: Язык текста (ru, en, etc.)
+        model_type: Тип модели (printed, handwritten, mixed)
+
+    Returns:
+        Строка примера текста
+    """
+    if language == "ru":
+        if model_type == "printed":
+            return "Пример распознанного печатного текста на русском языке. Документ содержит важную информацию для архива."
+        elif model_type == "handwritten":
+            return "Пример распознанного рукописного текста на русском языке. Почерк может быть неразборчивым."
+        else:  # mixed
+            return "Пример смешанного текста: печатный и рукописный. Дата: 15.03.2024, Подпись: И.И. Иванов"
+    else:  # en
+        if model_type == "printed":
+            return "Example of recognized printed text in English. Document contains important archive information."
+        elif model_type == "handwritten":
+            return "Example of recognized handwritten text in English. Handwriting may be unclear."
+        else:  # mixed
+            return "Example of mixed text: printed and handwritten. Date: 03/15/2024, Signature: J. Smith"
 
 
 def recognize_text(image: Any, language: str = "ru", model_type: str = "printed") -> str:
@@ -288,37 +2063,20 @@ def recognize_text(image: Any, language: str = "ru", model_type: str = "printed"
     time.sleep(1.5)
     
     # Примеры распознанного текста в зависимости от параметров
-    if language == "ru":
-        if model_type == "printed":
-            result = "Пример распознанного печатного текста на русском языке. Документ содержит важную информацию для архива."
-        elif model_type == "handwritten":
-            result = "Пример распознанного рукописного текста на русском языке. Почерк может быть неразборчивым."
-        else:  # mixed
-            result = "Пример смешанного текста: печатный и рукописный. Дата: 15.03.2024, Подпись: И.И. Иванов"
-    else:  # en
-        if model_type == "printed":
-            result = "Example of recognized printed text in English. Document contains important archive information."
-        elif model_type == "handwritten":
-            result = "Example of recognized handwritten text in English. Handwriting may be unclear."
-        else:  # mixed
-            result = "Example of mixed text: printed and handwritten. Date: 03/15/2024, Signature: J. Smith"
+    result = sample_text(language, model_type)
     
     print(f"Распознавание завершено. Найдено {len(result)} символов.")
     return result
 
 
 if __name__ == "__main__":
-    # Создаем заглушку изображения
-    class MockImage:
-        def __init__(self, name: str):
-            self.name = name
-        
-        def __str__(self):
-            return f"MockImage({self.name})"
-    
-    # Загружаем "изображение"
-    image = MockImage('doc1.jpg')
-    print("До обработки:", image)
+    # Синтетическая страница: строки "текста" на неравномерно освещенном фоне
+    height, width = 1600, 1200
+    gradient = np.linspace(170, 235, width, dtype=np.float32)
+    image = np.tile(gradient, (height, 1)).astype(np.uint8)
+    for y in range(150, height - 150, 60):
+        cv2.putText(image, "Archive document line", (100, y), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 40, 3)
+    print("До обработки:", image.shape, image.dtype)
     
     # Создаем процессор
     processor = ImageProcessor()
@@ -329,10 +2087,13 @@ if __name__ == "__main__":
         ['correct_perspective', 'align_image', 'enhance_contrast', 'remove_noise']
     )
     
-    print("После обработки:", processed_image)
+    print("После обработки:", processed_image.shape, processed_image.dtype)
     print("\nЛог обработки:")
     for log_entry in processor.get_processing_log():
         print(f"  {log_entry}")
+    print("\nВремя этапов:")
+    for timing in processor.get_step_timings():
+        print(f"  {'+'.join(timing['steps'])}: {timing['elapsed_ms']} мс (бюджет {timing['budget_ms']} мс)")
     
     # Пример использования функции распознавания текста
     print("\n" + "="*50)
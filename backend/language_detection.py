@@ -0,0 +1,130 @@
+"""
+Модуль определения языка и письменности текста
+Легкий классификатор по алфавиту, диакритике и служебным словам для выбора модели OCR
+"""
+
+import os
+import re
+import logging
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Значение language, при котором язык определяется автоматически
+AUTO_LANGUAGE = "auto"
+
+# Версия классификатора: входит в ключ кеша OCR при language="auto"
+LANGUAGE_DETECTOR_VERSION = "1"
+
+# Язык, если по тексту определить не удалось (слишком мало букв)
+LANGUAGE_FALLBACK = os.getenv("LANGUAGE_FALLBACK", "ru")
+# Минимум букв для решения
+LANGUAGE_MIN_LETTERS = int(os.getenv("LANGUAGE_MIN_LETTERS", "12"))
+
+# Письменность языков (кириллица - только русский, включая дореформенные буквы)
+LANGUAGE_SCRIPTS = {
+    "ru": "cyrillic",
+    "en": "latin",
+    "de": "latin",
+    "fr": "latin",
+    "es": "latin",
+    "it": "latin"
+}
+
+# Буквы, характерные для языка (вес - за каждое вхождение)
+SIGNATURE_LETTERS = {
+    "de": ("äöüß", 3.0),
+    "fr": ("éèêëçàâîïôûùœ", 2.0),
+    "es": ("ñáíóú¿¡", 3.0),
+    "it": ("àèéìòù", 1.5)
+}
+
+# Частые служебные слова (вес - за каждое вхождение)
+STOPWORDS = {
+    "en": {"the", "and", "of", "to", "in", "is", "for", "that", "with", "was", "on", "by", "as", "this", "from"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "mit", "von", "den", "zu", "ein", "eine", "auf", "des", "im"},
+    "fr": {"le", "la", "les", "et", "des", "du", "un", "une", "est", "pour", "dans", "que", "qui", "au", "sur"},
+    "es": {"el", "la", "los", "las", "y", "de", "del", "en", "que", "por", "con", "una", "es", "para", "se"},
+    "it": {"il", "lo", "la", "gli", "le", "e", "di", "del", "della", "che", "per", "con", "un", "una", "sono"}
+}
+STOPWORD_WEIGHT = 2.0
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def _script_of(char: str) -> Optional[str]:
+    if not char.isalpha():
+        return None
+    code = ord(char)
+    if 0x0400 <= code <= 0x052F:
+        return "cyrillic"
+    if code <= 0x024F:
+        return "latin"
+    return None
+
+
+def detect_language(text: str, fallback: str = LANGUAGE_FALLBACK) -> Dict[str, Any]:
+    """
+    Определяет письменность и язык текста
+
+    Сначала письменность по долям кириллических и латинских букв; для
+    латиницы язык выбирается по характерным буквам и служебным словам.
+
+    Args:
+        text: Текст (например, распознанные строки-образцы страницы)
+        fallback: Язык, если данных для решения недостаточно
+
+    Returns:
+        Словарь: language, script, confidence (0.0-1.0), scores по языкам,
+        letters и detected (False, если выбран язык по умолчанию)
+    """
+    scripts = Counter(script for script in map(_script_of, text) if script is not None)
+    letters = sum(scripts.values())
+    if letters < LANGUAGE_MIN_LETTERS:
+        return {
+            "language": fallback,
+            "script": LANGUAGE_SCRIPTS.get(fallback),
+            "confidence": 0.0,
+            "scores": {},
+            "letters": letters,
+            "detected": False
+        }
+
+    script, count = scripts.most_common(1)[0]
+    script_share = count / letters
+    if script == "cyrillic":
+        return {
+            "language": "ru",
+            "script": script,
+            "confidence": round(script_share, 4),
+            "scores": {"ru": round(script_share, 4)},
+            "letters": letters,
+            "detected": True
+        }
+
+    lowered = text.lower()
+    words = Counter(WORD_PATTERN.findall(lowered))
+    scores = {language: 0.0 for language, language_script in LANGUAGE_SCRIPTS.items() if language_script == "latin"}
+    for language, stopwords in STOPWORDS.items():
+        scores[language] += STOPWORD_WEIGHT * sum(words[word] for word in stopwords)
+    for language, (signature, weight) in SIGNATURE_LETTERS.items():
+        scores[language] += weight * sum(lowered.count(char) for char in signature)
+
+    total = sum(scores.values())
+    if total == 0:
+        # Латиница без признаков языка: английский как наиболее нейтральный
+        best, share = "en", 0.0
+    else:
+        best = max(scores, key=scores.get)
+        share = scores[best] / total
+    return {
+        "language": best,
+        "script": script,
+        "confidence": round(share * script_share, 4),
+        "scores": {language: round(score / total, 4) if total else 0.0 for language, score in scores.items()},
+        "letters": letters,
+        "detected": True
+    }
@@ -0,0 +1,255 @@
+"""
+Модуль сегментации страницы
+Находит блоки текста, строки и слова с их рамками для построчного распознавания
+"""
+
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Версия алгоритма сегментации: входит в ключ кеша OCR
+LAYOUT_VERSION = "2"
+
+# Локальный порог маски чернил: окно (пиксели) и насколько пиксель темнее среднего по окну
+INK_LOCAL_BLOCK = 51
+INK_LOCAL_OFFSET = 15
+# Минимальная высота компоненты, которая может быть символом (пиксели)
+MIN_CHAR_HEIGHT = 4
+# Пороги относительно характерной высоты символа (медианы высот компонент)
+LINE_JOIN_RATIO = 1.5      # горизонтальный разрыв, который еще склеивает символы строки
+LINE_BRIDGE_RATIO = 0.2    # вертикальный допуск (точки над буквами, диакритика)
+WORD_GAP_RATIO = 0.3       # разрыв между буквами, начиная с которого он считается пробелом
+BLOCK_GAP_RATIO = 1.5      # вертикальный разрыв между строками блока (в высотах строки)
+LINE_PADDING_RATIO = 0.3   # поля вокруг строки при вырезании для OCR
+
+
+def _bbox(x: int, y: int, width: int, height: int) -> Dict[str, int]:
+    return {"x": int(x), "y": int(y), "width": int(width), "height": int(height)}
+
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """
+    Маска чернил: глобальный порог Оцу, дополненный локальным порогом
+
+    Локальный порог сохраняет бледные строки (выцветшие чернила, карандаш),
+    которые глобальный порог относит к фону.
+
+    Args:
+        gray: Изображение в оттенках серого
+
+    Returns:
+        Маска uint8 (255 - текст)
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Светлый текст на темном фоне: чернилами считается меньшинство пикселей
+    if cv2.countNonZero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+        gray = cv2.bitwise_not(gray)
+    if min(gray.shape) > INK_LOCAL_BLOCK:
+        local = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, INK_LOCAL_BLOCK, INK_LOCAL_OFFSET
+        )
+        binary = cv2.bitwise_or(binary, local)
+    return binary
+
+
+def estimate_char_height(heights: np.ndarray) -> Optional[float]:
+    """
+    Характерная высота символа: медиана высот связных компонент
+
+    Args:
+        heights: Высоты связных компонент маски чернил
+
+    Returns:
+        Высота в пикселях или None, если символов нет
+    """
+    chars = heights[heights >= MIN_CHAR_HEIGHT]
+    return float(np.median(chars)) if chars.size else None
+
+
+def segment_words(line_mask: np.ndarray, char_height: float) -> List[Dict[str, int]]:
+    """
+    Делит строку на слова по вертикальным просветам
+
+    Args:
+        line_mask: Маска чернил строки (255 - текст)
+        char_height: Характерная высота символа в пикселях
+
+    Returns:
+        Рамки слов в координатах строки, слева направо
+    """
+    columns = np.flatnonzero(line_mask.any(axis=0))
+    if columns.size == 0:
+        return []
+    min_gap = max(2, int(round(char_height * WORD_GAP_RATIO)))
+    # Границы слов - там, где между соседними столбцами с чернилами разрыв не меньше min_gap
+    breaks = np.flatnonzero(np.diff(columns) > min_gap)
+    starts = np.concatenate(([columns[0]], columns[breaks + 1]))
+    ends = np.concatenate((columns[breaks], [columns[-1]]))
+
+    words = []
+    for start, end in zip(starts, ends):
+        rows = np.flatnonzero(line_mask[:, start:end + 1].any(axis=1))
+        words.append(_bbox(start, rows[0], end - start + 1, rows[-1] - rows[0] + 1))
+    return words
+
+
+def _order_blocks(lines: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Группирует строки в блоки (абзацы, колонки) и упорядочивает их для чтения
+
+    Строки одного блока перекрываются по горизонтали и разделены небольшим
+    вертикальным промежутком. Блоки, перекрывающиеся по вертикали (колонки),
+    читаются слева направо, остальные - сверху вниз.
+    """
+    parent = list(range(len(lines)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    max_gap = float(np.median([line["bbox"]["height"] for line in lines])) * BLOCK_GAP_RATIO if lines else 0.0
+    for i, a in enumerate(lines):
+        ax0, ax1 = a["bbox"]["x"], a["bbox"]["x"] + a["bbox"]["width"]
+        ay1 = a["bbox"]["y"] + a["bbox"]["height"]
+        for j in range(i + 1, len(lines)):
+            b = lines[j]
+            if b["bbox"]["y"] - ay1 > max_gap:
+                break
+            bx0, bx1 = b["bbox"]["x"], b["bbox"]["x"] + b["bbox"]["width"]
+            if min(ax1, bx1) > max(ax0, bx0):
+                parent[find(j)] = find(i)
+
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for i, line in enumerate(lines):
+        groups.setdefault(find(i), []).append(line)
+    blocks = list(groups.values())
+
+    def extent(block: List[Dict[str, Any]]):
+        return (
+            min(line["bbox"]["y"] for line in block),
+            max(line["bbox"]["y"] + line["bbox"]["height"] for line in block),
+            min(line["bbox"]["x"] for line in block)
+        )
+
+    # Ряды блоков: блоки, перекрывающиеся по вертикали, стоят в одном ряду
+    blocks.sort(key=lambda block: extent(block)[0])
+    ordered: List[List[Dict[str, Any]]] = []
+    row: List[List[Dict[str, Any]]] = []
+    row_bottom = -1
+    for block in blocks:
+        top, bottom, _left = extent(block)
+        if row and top >= row_bottom:
+            ordered.extend(sorted(row, key=lambda item: extent(item)[2]))
+            row = []
+        row.append(block)
+        row_bottom = max(row_bottom, bottom) if len(row) > 1 else bottom
+    ordered.extend(sorted(row, key=lambda item: extent(item)[2]))
+    return ordered
+
+
+def segment_page(image: np.ndarray) -> Dict[str, Any]:
+    """
+    Сегментация страницы на блоки, строки и слова
+
+    Символы выделяются как связные компоненты бинаризованного изображения;
+    высоты компонент дают характерную высоту символа, от которой зависят
+    все остальные пороги, поэтому результат не зависит от разрешения скана.
+
+    Args:
+        image: Изображение страницы (оттенки серого или BGR)
+
+    Returns:
+        Словарь со строками (рамка, блок, рамки слов) в порядке чтения,
+        характерной высотой символа и временем сегментации
+    """
+    started = time.perf_counter()
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    mask = ink_mask(gray)
+    height, width = mask.shape
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    char_height = estimate_char_height(heights)
+    if char_height is None:
+        return {"lines": [], "char_height": None, "segmentation_ms": round((time.perf_counter() - started) * 1000.0, 2)}
+
+    # Рамки, линейки и крупная графика не участвуют в построении строк
+    keep = (heights <= char_height * 4) & ~((heights < char_height * 0.4) & (widths > char_height * 3))
+    lookup = np.zeros(count, dtype=np.uint8)
+    lookup[1:][keep] = 255
+    text_mask = lookup[labels]
+
+    kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT,
+        (max(3, int(round(char_height * LINE_JOIN_RATIO))), max(1, int(round(char_height * LINE_BRIDGE_RATIO))))
+    )
+    joined = cv2.dilate(text_mask, kernel)
+    line_count, line_labels, line_stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+
+    lines = []
+    for index in range(1, line_count):
+        x, y, w, h = line_stats[index, :4]
+        roi = np.where(line_labels[y:y + h, x:x + w] == index, text_mask[y:y + h, x:x + w], 0)
+        rows = np.flatnonzero(roi.any(axis=1))
+        columns = np.flatnonzero(roi.any(axis=0))
+        if rows.size == 0 or rows[-1] - rows[0] + 1 < char_height * 0.6:
+            continue  # шум и одиночные знаки препинания
+        top, left = rows[0], columns[0]
+        roi = roi[top:rows[-1] + 1, left:columns[-1] + 1]
+        words = [
+            _bbox(x + left + word["x"], y + top + word["y"], word["width"], word["height"])
+            for word in segment_words(roi, char_height)
+        ]
+        lines.append({
+            "bbox": _bbox(x + left, y + top, roi.shape[1], roi.shape[0]),
+            "words": words
+        })
+
+    lines.sort(key=lambda line: (line["bbox"]["y"], line["bbox"]["x"]))
+    ordered = []
+    for block_number, block in enumerate(_order_blocks(lines)):
+        for line in sorted(block, key=lambda item: (item["bbox"]["y"], item["bbox"]["x"])):
+            line["block"] = block_number
+            ordered.append(line)
+
+    segmentation_ms = (time.perf_counter() - started) * 1000.0
+    logger.info(
+        f"Сегментация {width}x{height}: {len(ordered)} строк, "
+        f"высота символа {char_height:.0f} пикс., {segmentation_ms:.0f} мс"
+    )
+    return {
+        "lines": ordered,
+        "char_height": char_height,
+        "segmentation_ms": round(segmentation_ms, 2)
+    }
+
+
+def crop_line(image: np.ndarray, bbox: Dict[str, int], char_height: Optional[float]) -> np.ndarray:
+    """
+    Вырезает строку с полями для распознавания
+
+    Args:
+        image: Изображение страницы
+        bbox: Рамка строки
+        char_height: Характерная высота символа
+
+    Returns:
+        Фрагмент изображения (вид на исходный массив, без копирования)
+    """
+    padding = int(round((char_height or 0) * LINE_PADDING_RATIO))
+    x0 = max(bbox["x"] - padding, 0)
+    y0 = max(bbox["y"] - padding, 0)
+    x1 = min(bbox["x"] + bbox["width"] + padding, image.shape[1])
+    y1 = min(bbox["y"] + bbox["height"] + padding, image.shape[0])
+    return image[y0:y1, x0:x1]
@@ -7,6 +7,7 @@ from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 import logging
 import os
 import sys
@@ -22,6 +23,11 @@ from attributes import router as attributes_router
 from report import router as report_router
 from stats import router as stats_router
 from placeholders import router as placeholders_router
+from hot_folder import router as hot_folder_router, start_watcher, stop_watcher
+from documents import router as documents_router, shutdown_page_process_pool
+from preview import router as preview_router
+from ocr_engines import ocr_engines
+from ocr_correction import POST_CORRECTION_DEFAULT, get_corrector
 
 # Импортируем модуль авторизации
 from auth_backend import app as auth_app, verify_token, get_current_user_from_token
@@ -94,10 +100,29 @@ app.include_router(attributes_router)
 app.include_router(report_router)
 app.include_router(stats_router)
 app.include_router(placeholders_router)
+app.include_router(hot_folder_router)
+app.include_router(documents_router)
+app.include_router(preview_router)
 
 # Подключаем роутеры авторизации
 app.include_router(auth_app.router)
 
+# Запуск и остановка фоновых служб
+@app.on_event("startup")
+async def start_background_services():
+    """Запуск наблюдения за горячей папкой сканеров, прогрев OCR движков и загрузка словарей исправления"""
+    start_watcher()
+    await run_in_threadpool(ocr_engines.preload)
+    if POST_CORRECTION_DEFAULT:
+        await run_in_threadpool(get_corrector)
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    """Остановка наблюдения за горячей папкой сканеров, пула процессов страниц и OCR движков"""
+    stop_watcher()
+    shutdown_page_process_pool()
+    ocr_engines.close()
+
 # Middleware для логирования запросов
 @app.middleware("http")
 async def log_requests(request, call_next):
@@ -156,6 +181,9 @@ async def root():
                 "attributes - Извлечение атрибутов",
                 "report - Генерация отчётов",
                 "stats - Статистика",
+                "hot-folder - Автоматический приём файлов со сканеров",
+                "documents - Постраничная обработка многостраничных документов",
+                "preview - Миниатюры и тайлы для просмотра",
                 "auth - Авторизация"
             ],
             "timestamp": datetime.now().isoformat()
@@ -180,6 +208,9 @@ async def health_check():
             "attributes": "ok",
             "report": "ok",
             "stats": "ok",
+            "hot_folder": "ok",
+            "documents": "ok",
+            "preview": "ok",
             "auth": "ok"
         }
         
@@ -246,7 +277,9 @@ async def get_api_info():
                         "GET /preprocess/steps - Список этапов обработки",
                         "POST /preprocess/process - Полная обработка изображения",
                         "POST /preprocess/step/{step_name} - Выполнение одного этапа",
-                        "GET /preprocess/status/{file_id} - Статус обработки"
+                        "GET /preprocess/status/{file_id} - Статус обработки",
+                        "GET /preprocess/cache - Статистика кеша предобработки",
+                        "DELETE /preprocess/cache - Очистка кеша предобработки"
                     ]
                 },
                 "ocr": {
@@ -255,7 +288,9 @@ async def get_api_info():
                         "GET /ocr/languages - Поддерживаемые языки",
                         "GET /ocr/model-types - Типы моделей OCR",
                         "POST /ocr/recognize - Распознавание текста",
-                        "GET /ocr/result/{file_id} - Результат распознавания"
+                        "GET /ocr/result/{file_id} - Результат распознавания",
+                        "GET /ocr/cache - Статистика кеша OCR",
+                        "DELETE /ocr/cache - Очистка кеша OCR"
                     ]
                 },
                 "attributes": {
@@ -285,6 +320,27 @@ async def get_api_info():
                         "GET /stats/ocr - Статистика OCR"
                     ]
                 },
+                "hot_folder": {
+                    "description": "Автоматический приём файлов из папки сканирующих станций",
+                    "endpoints": [
+                        "GET /hot-folder/status - Состояние наблюдателя и очереди"
+                    ]
+                },
+                "documents": {
+                    "description": "Постраничная обработка многостраничных TIFF и PDF",
+                    "endpoints": [
+                        "GET /documents/{file_id}/pages - Страницы документа",
+                        "POST /documents/process - Постраничная предобработка и распознавание"
+                    ]
+                },
+                "preview": {
+                    "description": "Миниатюры и тайлы DeepZoom с кешем на диске",
+                    "endpoints": [
+                        "GET /preview/{file_id} - Миниатюра (size, source)",
+                        "GET /preview/{file_id}/dzi - Дескриптор DeepZoom",
+                        "GET /preview/{file_id}/tiles/{level}/{col}_{row}.jpg - Тайл DeepZoom"
+                    ]
+                },
                 "auth": {
                     "description": "Авторизация и аутентификация пользователей",
                     "endpoints": [
@@ -4,16 +4,34 @@
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import os
 import logging
 import time
+import numpy as np
 from datetime import datetime
 
-# Импортируем функции OCR из модуля
-from image_processing import recognize_text
+# Движки OCR: реестр пулов загруженных моделей по (язык, тип модели)
+from ocr_engines import ocr_engines, recognize_page, recognize_region, SUPPORTED_LANGUAGES, MODEL_TYPES, OCR_ENGINE_VERSION
+from layout import LAYOUT_VERSION
+from language_detection import AUTO_LANGUAGE, LANGUAGE_DETECTOR_VERSION, detect_language
+from handwriting_detection import AUTO_MODEL_TYPE, CLASSIFIER_VERSION, get_classifier_stats
+from ocr_correction import POST_CORRECTION_DEFAULT, correct_page, get_corrector
+from content_hash import get_file_hash
+from result_cache import DiskLRUCache, MemoryLRUCache, TieredCache, make_cache_key
+from request_coalescing import processing_flights
+from documents import (
+    extract_pdf_text_layers, load_pdf_page, PDF_RENDER_DPI, PDF_TEXT_MIN_CHARS,
+    PDF_TEXT_MIN_VALID_RATIO, PDF_TEXT_MIN_LETTER_RATIO, TEXT_LAYER_VERSION
+)
+from image_processing import find_processed_file, load_image
+from structured_results import (
+    RESULT_FORMATS, RESULT_MEDIA_TYPES, STRUCTURED_RESULTS_DIR, StructuredResult, find_structured_results, serialize_result,
+    structured_result_path, text_statistics
+)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -25,10 +43,31 @@ router = APIRouter(prefix="/ocr", tags=["ocr"])
 # Модели данных
 class OCRRequest(BaseModel):
     file_id: str
-    language: Optional[str] = "ru"
-    model_type: Optional[str] = "printed"
+    language: Optional[str] = AUTO_LANGUAGE  # "auto" - язык определяется по странице
+    model_type: Optional[str] = AUTO_MODEL_TYPE  # "auto" - модель выбирается по типу текста каждой строки
     confidence_threshold: Optional[float] = 0.7
+    fallback_model_type: Optional[str] = None  # Модель для повторного распознавания строк ниже порога уверенности
     preprocess: Optional[bool] = True
+    post_correction: Optional[bool] = POST_CORRECTION_DEFAULT  # Исправление ошибок OCR по словарям (строки на русском)
+    bypass_cache: Optional[bool] = False  # Принудительное повторное распознавание
+    use_text_layer: Optional[bool] = True  # Брать текст из текстового слоя PDF вместо OCR
+
+class OCRRegion(BaseModel):
+    x: int
+    y: int
+    width: int
+    height: int
+
+class RegionOCRRequest(BaseModel):
+    file_id: str
+    regions: List[OCRRegion]  # Области в пикселях изображения, которое распознается (source_file ответа)
+    language: Optional[str] = AUTO_LANGUAGE  # "auto" - язык определяется по каждой области
+    model_type: Optional[str] = AUTO_MODEL_TYPE
+    page: Optional[int] = 1  # Страница PDF
+    confidence_threshold: Optional[float] = 0.7
+    fallback_model_type: Optional[str] = None
+    post_correction: Optional[bool] = POST_CORRECTION_DEFAULT
+    bypass_cache: Optional[bool] = False
 
 class OCRResponse(BaseModel):
     status: str
@@ -41,22 +80,159 @@ class TextBlock(BaseModel):
     bbox: Optional[Dict[str, int]] = None
     language: str
 
-# Поддерживаемые языки
-SUPPORTED_LANGUAGES = {
-    "ru": "Русский",
-    "en": "Английский",
-    "de": "Немецкий",
-    "fr": "Французский",
-    "es": "Испанский",
-    "it": "Итальянский"
-}
-
-# Типы моделей
-MODEL_TYPES = {
-    "printed": "Печатный текст",
-    "handwritten": "Рукописный текст",
-    "mixed": "Смешанный текст"
-}
+# Кеш результатов OCR: (хеш изображения, язык, тип модели, версия движка) -> результат
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join("cache", "ocr"))
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_MB", "256")) * 1024 * 1024
+OCR_CACHE_MEMORY_ENTRIES = int(os.getenv("OCR_CACHE_MEMORY_ENTRIES", "1024"))
+ocr_cache = TieredCache(
+    MemoryLRUCache(OCR_CACHE_MEMORY_ENTRIES, name="ocr-memory"),
+    DiskLRUCache(OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES, name="ocr-disk")
+)
+
+# Декодированные страницы для повторного распознавания (например, областей):
+# хеш файла -> изображение в оттенках серого
+OCR_IMAGE_CACHE_ENTRIES = int(os.getenv("OCR_IMAGE_CACHE_ENTRIES", "16"))
+OCR_IMAGE_CACHE_MAX_BYTES = int(os.getenv("OCR_IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024
+decoded_images = MemoryLRUCache(OCR_IMAGE_CACHE_ENTRIES, name="ocr-images", max_bytes=OCR_IMAGE_CACHE_MAX_BYTES)
+
+# Предельное число областей в одном запросе
+OCR_MAX_REGIONS = int(os.getenv("OCR_MAX_REGIONS", "32"))
+
+def _find_file(file_id: str) -> Optional[str]:
+    """
+    Ищет файл для распознавания: сначала последний обработанный, затем исходный
+    
+    Args:
+        file_id: ID файла
+        
+    Returns:
+        Путь к файлу или None
+    """
+    # Сначала ищем последний результат предобработки
+    processed_path = find_processed_file(file_id)
+    if processed_path is not None:
+        return processed_path
+    
+    # Если не найден, ищем в исходных файлах
+    upload_dir = "uploads"
+    if os.path.exists(upload_dir):
+        for filename in os.listdir(upload_dir):
+            if filename.startswith(file_id):
+                return os.path.join(upload_dir, filename)
+    return None
+
+def _load_page_image(file_path: str, image_hash: str, page: int = 1) -> np.ndarray:
+    """
+    Декодирует страницу через кеш декодированных изображений
+    
+    Args:
+        file_path: Путь к изображению или PDF
+        image_hash: Хеш содержимого файла
+        page: Номер страницы PDF (с 1)
+        
+    Returns:
+        Изображение страницы в оттенках серого (только для чтения)
+    """
+    is_pdf = file_path.lower().endswith(".pdf")
+    key = make_cache_key(image_hash, page if is_pdf else 1)
+    image = decoded_images.get(key)
+    if image is None:
+        image = load_pdf_page(file_path, page) if is_pdf else load_image(file_path)
+        # Изображение разделяется между запросами
+        image.flags.writeable = False
+        decoded_images.put(key, image)
+    return image
+
+def _structured_pages(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Страницы StructuredResult из сохраненного результата (многостраничного - по page_sizes)"""
+    if not result.get("page_sizes"):
+        return [_structured_page(result)]
+    return [
+        {**size, "text_blocks": [block for block in result["text_blocks"] if block.get("page") == size["page"]]}
+        for size in result["page_sizes"]
+    ]
+
+def _structured_page(page_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Одностраничный результат recognize_page в виде страницы StructuredResult"""
+    layout = page_result.get("layout") or {}
+    return {
+        "page": 1,
+        "width": layout.get("width"),
+        "height": layout.get("height"),
+        "text_blocks": page_result["text_blocks"]
+    }
+
+def _save_structured_result(file_id: str, timestamp: int, recognized_text: str,
+                            pages: List[Dict[str, Any]], **meta: Any) -> Tuple[StructuredResult, str]:
+    """
+    Сохраняет структурированный результат рядом с текстовым
+
+    Args:
+        file_id: ID файла
+        timestamp: Время распознавания (совпадает с именем .txt)
+        recognized_text: Распознанный текст
+        pages: Страницы с размерами и блоками строк
+        **meta: Сведения о распознавании
+
+    Returns:
+        (результат, путь к файлу)
+    """
+    structured = StructuredResult.build(
+        recognized_text, pages, file_id=file_id, recognized_at=datetime.now().isoformat(), **meta
+    )
+    return structured, structured.save(structured_result_path(file_id, timestamp))
+
+def _restore_cached_result(cached: Dict[str, Any], cache_key: str, file_id: str,
+                           file_path: str, model_type: str) -> Dict[str, Any]:
+    """
+    Обеспечивает файлы результата из кеша для запрошенного file_id
+
+    Ключ кеша зависит от содержимого, поэтому запись может принадлежать
+    другому file_id с тем же содержимым. GET /ocr/result/{file_id} ищет
+    файлы по имени ocr_result_<file_id>_*, поэтому для чужой записи
+    текстовый и структурированный результаты записываются заново под
+    запрошенным file_id, и запись кеша переключается на новые файлы.
+    Удаленные файлы своей записи восстанавливаются на прежнем месте.
+
+    Args:
+        cached: Запись кеша OCR
+        cache_key: Ключ записи
+        file_id: ID файла запроса
+        file_path: Путь к распознаваемому файлу
+        model_type: Тип модели запроса
+
+    Returns:
+        Запись кеша с путями к файлам результата этого file_id
+    """
+    result_path = cached["result_file"]
+    structured_path = cached.get("structured_file")
+    own = os.path.basename(result_path).startswith(f"ocr_result_{file_id}_")
+    if not own:
+        timestamp = int(time.time())
+        result_path = os.path.join("ocr_results", f"ocr_result_{file_id}_{timestamp}.txt")
+        structured_path = structured_result_path(file_id, timestamp)
+
+    if not os.path.exists(result_path):
+        # Файл результата удален или принадлежит другому file_id - записываем текст из кеша
+        os.makedirs("ocr_results", exist_ok=True)
+        with open(result_path, "w", encoding="utf-8") as f:
+            f.write(cached["recognized_text"])
+    if structured_path and not os.path.exists(structured_path):
+        StructuredResult.build(
+            cached["recognized_text"], _structured_pages(cached),
+            file_id=file_id,
+            source_file=file_path,
+            engine_version=cached["engine_version"],
+            language=cached["language"],
+            model_type=model_type,
+            confidence_scores=cached["confidence_scores"],
+            recognized_at=cached["recognized_at"]
+        ).save(structured_path)
+
+    if not own:
+        cached = {**cached, "result_file": result_path, "structured_file": structured_path}
+        ocr_cache.put(cache_key, cached)
+    return cached
 
 @router.get("/languages")
 async def get_supported_languages() -> JSONResponse:
@@ -69,7 +245,7 @@ async def get_supported_languages() -> JSONResponse:
     try:
         logger.info("Получение списка поддерживаемых языков")
         
-        languages = []
+        languages = [{"code": AUTO_LANGUAGE, "name": "Автоопределение"}]
         for lang_code, lang_name in SUPPORTED_LANGUAGES.items():
             languages.append({
                 "code": lang_code,
@@ -82,7 +258,7 @@ async def get_supported_languages() -> JSONResponse:
                 "status": "success",
                 "data": {
                     "languages": languages,
-                    "total_languages": len(languages)
+                    "total_languages": len(SUPPORTED_LANGUAGES)
                 }
             }
         )
@@ -105,7 +281,7 @@ async def get_model_types() -> JSONResponse:
     try:
         logger.info("Получение списка типов моделей")
         
-        model_types = []
+        model_types = [{"code": AUTO_MODEL_TYPE, "name": "Автовыбор по строкам"}]
         for type_code, type_name in MODEL_TYPES.items():
             model_types.append({
                 "code": type_code,
@@ -118,7 +294,7 @@ async def get_model_types() -> JSONResponse:
                 "status": "success",
                 "data": {
                     "model_types": model_types,
-                    "total_types": len(model_types)
+                    "total_types": len(MODEL_TYPES)
                 }
             }
         )
@@ -130,28 +306,223 @@ async def get_model_types() -> JSONResponse:
             detail=f"Ошибка при получении типов моделей: {str(e)}"
         )
 
-@router.post("/recognize")
-async def recognize_text_from_image(request: OCRRequest) -> JSONResponse:
+def _request_parameters(request: OCRRequest) -> Dict[str, Any]:
+    """Параметры запроса распознавания для ответа"""
+    return {
+        "language": request.language,
+        "model_type": request.model_type,
+        "confidence_threshold": request.confidence_threshold,
+        "fallback_model_type": request.fallback_model_type,
+        "preprocess": request.preprocess,
+        "post_correction": request.post_correction
+    }
+
+def _recognize_pdf_text_layer(request: OCRRequest, file_path: str, image_hash: str) -> Optional[Dict[str, Any]]:
     """
-    Распознавание текста на изображении
+    Быстрый путь для PDF с текстовым слоем
+    
+    Страницы, текстовый слой которых прошел проверку качества, не
+    рендерятся и не распознаются; OCR выполняется только для остальных.
+    Результат кешируется по содержимому PDF, версии и порогам проверки
+    текстового слоя и параметрам OCR страниц без слоя.
     
     Args:
         request: Запрос на распознавание текста
+        file_path: Путь к PDF
+        image_hash: Хеш содержимого PDF
         
     Returns:
-        JSON с результатами распознавания
+        Содержимое JSON-ответа или None, если пригодного слоя нет ни на одной странице
+    """
+    two_tier = (request.fallback_model_type, request.confidence_threshold) if request.fallback_model_type else None
+    cache_key = make_cache_key(
+        image_hash, "text_layer", TEXT_LAYER_VERSION, PDF_RENDER_DPI,
+        PDF_TEXT_MIN_CHARS, PDF_TEXT_MIN_VALID_RATIO, PDF_TEXT_MIN_LETTER_RATIO,
+        request.language, request.model_type, two_tier,
+        LANGUAGE_DETECTOR_VERSION if request.language == AUTO_LANGUAGE else None,
+        CLASSIFIER_VERSION if request.model_type == AUTO_MODEL_TYPE else None,
+        get_corrector().version if request.post_correction else None,
+        OCR_ENGINE_VERSION, LAYOUT_VERSION
+    )
+    if not request.bypass_cache:
+        lookup_start = time.perf_counter()
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            cached = _restore_cached_result(cached, cache_key, request.file_id, file_path, request.model_type)
+            lookup_time = time.perf_counter() - lookup_start
+            logger.info(f"Текст PDF из текстового слоя взят из кеша за {lookup_time * 1e6:.0f} мкс")
+            return {
+                "status": "success",
+                "message": "Текст извлечен из текстового слоя PDF (результат из кеша)",
+                "data": {
+                    **cached,
+                    "file_id": request.file_id,
+                    "source_file": file_path,
+                    "parameters": _request_parameters(request),
+                    "processing_time": lookup_time,
+                    "cache": {
+                        "hit": True,
+                        "key": cache_key
+                    }
+                }
+            }
+    
+    start_time = time.time()
+    layers = extract_pdf_text_layers(file_path)
+    if not any(layer["quality"]["usable"] for layer in layers):
+        return None
+    
+    pages_text = []
+    raw_pages_text = []
+    text_blocks = []
+    text_sources = []
+    page_confidences = []
+    structured_pages = []
+    corrections = []
+    for page_number, layer in enumerate(layers, start=1):
+        if layer["quality"]["usable"]:
+            source = "text_layer"
+            page_text = layer["text"]
+            raw_page_text = page_text
+            page_language = request.language
+            if page_language == AUTO_LANGUAGE:
+                page_language = detect_language(page_text)["language"]
+            page_blocks = [
+                dict(block, language=page_language, page=page_number)
+                for block in layer["text_blocks"]
+            ]
+            page_size = (layer["width"], layer["height"])
+        else:
+            source = "ocr"
+            page_result = recognize_page(
+                load_pdf_page(file_path, page_number),
+                language=request.language,
+                model_type=request.model_type,
+                fallback_model_type=request.fallback_model_type,
+                confidence_threshold=request.confidence_threshold
+            )
+            if request.post_correction:
+                corrections.extend(
+                    dict(correction, page=page_number)
+                    for correction in correct_page(page_result)["corrections"]
+                )
+            page_text = page_result["recognized_text"]
+            raw_page_text = page_result.get("raw_text", page_text)
+            page_language = page_result["language"]
+            page_confidences.append(page_result["confidence_scores"]["overall"])
+            page_blocks = [dict(block, page=page_number) for block in page_result["text_blocks"]]
+            page_size = (page_result["layout"]["width"], page_result["layout"]["height"])
+        text_blocks.extend(page_blocks)
+        structured_pages.append({
+            "page": page_number,
+            "width": page_size[0],
+            "height": page_size[1],
+            "text_blocks": page_blocks
+        })
+        pages_text.append(page_text)
+        raw_pages_text.append(raw_page_text)
+        text_sources.append({
+            "page": page_number,
+            "source": source,
+            "quality": layer["quality"],
+            "language": page_language
+        })
+    
+    recognized_text = "\n\n".join(pages_text)
+    processing_time = time.time() - start_time
+    ocr_pages = len(page_confidences)
+    # Язык документа - язык большинства страниц
+    page_languages = [text_source["language"] for text_source in text_sources]
+    document_language = max(page_languages, key=page_languages.count)
+    overall_confidence = round((len(layers) - ocr_pages + sum(page_confidences)) / len(layers), 4)
+    
+    confidence_scores = {
+        "overall": overall_confidence,
+        "characters": overall_confidence,
+        "words": overall_confidence
+    }
+    
+    timestamp = int(time.time())
+    os.makedirs("ocr_results", exist_ok=True)
+    result_path = os.path.join("ocr_results", f"ocr_result_{request.file_id}_{timestamp}.txt")
+    with open(result_path, "w", encoding="utf-8") as f:
+        f.write(recognized_text)
+    structured, structured_path = _save_structured_result(
+        request.file_id, timestamp, recognized_text, structured_pages,
+        source_file=file_path,
+        engine_version=OCR_ENGINE_VERSION,
+        language=document_language,
+        model_type=request.model_type,
+        confidence_scores=confidence_scores
+    )
+    
+    logger.info(
+        f"Текст PDF взят из текстового слоя: {len(layers) - ocr_pages} из {len(layers)} страниц "
+        f"за {processing_time:.2f} секунд"
+    )
+    
+    result_data = {
+        "recognized_text": recognized_text,
+        "raw_text": "\n\n".join(raw_pages_text),
+        "text_blocks": text_blocks,
+        "page_sizes": [
+            {"page": page["page"], "width": page["width"], "height": page["height"]}
+            for page in structured_pages
+        ],
+        "statistics": structured.statistics,
+        "confidence_scores": confidence_scores,
+        "text_sources": text_sources,
+        "language": document_language,
+        "post_correction": {
+            "applied": bool(request.post_correction and ocr_pages),
+            "corrected_words": len(corrections),
+            "corrections": corrections
+        },
+        "ocr_skipped_pages": len(layers) - ocr_pages,
+        "result_file": result_path,
+        "structured_file": structured_path,
+        "engine_version": OCR_ENGINE_VERSION,
+        "recognized_at": structured.meta["recognized_at"]
+    }
+    ocr_cache.put(cache_key, result_data)
+    
+    return {
+        "status": "success",
+        "message": "Текст извлечен из текстового слоя PDF",
+        "data": {
+            **result_data,
+            "file_id": request.file_id,
+            "source_file": file_path,
+            "parameters": _request_parameters(request),
+            "processing_time": processing_time,
+            "cache": {
+                "hit": False,
+                "key": cache_key
+            }
+        }
+    }
+
+def _recognize_file(request: OCRRequest) -> Dict[str, Any]:
+    """
+    Выполняет распознавание текста (блокирующая часть запроса)
+    
+    Args:
+        request: Запрос на распознавание текста
+        
+    Returns:
+        Содержимое JSON-ответа с результатами распознавания
     """
     try:
         logger.info(f"Начинаем распознавание текста для файла: {request.file_id}")
         
         # Валидация параметров
-        if request.language not in SUPPORTED_LANGUAGES:
+        if request.language not in SUPPORTED_LANGUAGES and request.language != AUTO_LANGUAGE:
             raise HTTPException(
                 status_code=400,
                 detail=f"Неподдерживаемый язык: {request.language}"
             )
         
-        if request.model_type not in MODEL_TYPES:
+        if request.model_type not in MODEL_TYPES and request.model_type != AUTO_MODEL_TYPE:
             raise HTTPException(
                 status_code=400,
                 detail=f"Неподдерживаемый тип модели: {request.model_type}"
@@ -163,25 +534,14 @@ async def recognize_text_from_image(request: OCRRequest) -> JSONResponse:
                 detail="Порог уверенности должен быть от 0.0 до 1.0"
             )
         
-        # Поиск файла
-        file_path = None
-        
-        # Сначала ищем в обработанных файлах
-        processed_dir = "processed"
-        if os.path.exists(processed_dir):
-            for filename in os.listdir(processed_dir):
-                if request.file_id in filename:
-                    file_path = os.path.join(processed_dir, filename)
-                    break
+        if request.fallback_model_type is not None and request.fallback_model_type not in MODEL_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неподдерживаемый тип модели: {request.fallback_model_type}"
+            )
         
-        # Если не найден, ищем в исходных файлах
-        if not file_path:
-            upload_dir = "uploads"
-            if os.path.exists(upload_dir):
-                for filename in os.listdir(upload_dir):
-                    if filename.startswith(request.file_id):
-                        file_path = os.path.join(upload_dir, filename)
-                        break
+        # Поиск файла
+        file_path = _find_file(request.file_id)
         
         if not file_path or not os.path.exists(file_path):
             raise HTTPException(
@@ -189,43 +549,76 @@ async def recognize_text_from_image(request: OCRRequest) -> JSONResponse:
                 detail="Файл не найден"
             )
         
+        image_hash = get_file_hash(file_path)
+        
+        # Быстрый путь: PDF с текстовым слоем распознается без OCR
+        if request.use_text_layer and file_path.lower().endswith(".pdf"):
+            text_layer_result = _recognize_pdf_text_layer(request, file_path, image_hash)
+            if text_layer_result is not None:
+                return text_layer_result
+        
+        # Проверяем кеш распознавания
+        # Порог влияет на результат только в двухуровневом режиме
+        two_tier = (request.fallback_model_type, request.confidence_threshold) if request.fallback_model_type else None
+        detector = LANGUAGE_DETECTOR_VERSION if request.language == AUTO_LANGUAGE else None
+        classifier = CLASSIFIER_VERSION if request.model_type == AUTO_MODEL_TYPE else None
+        correction = get_corrector().version if request.post_correction else None
+        cache_key = make_cache_key(
+            image_hash, request.language, request.model_type, two_tier, detector, classifier, correction,
+            OCR_ENGINE_VERSION, LAYOUT_VERSION
+        )
+        
+        if not request.bypass_cache:
+            lookup_start = time.perf_counter()
+            cached = ocr_cache.get(cache_key)
+            if cached is not None:
+                cached = _restore_cached_result(cached, cache_key, request.file_id, file_path, request.model_type)
+                lookup_time = time.perf_counter() - lookup_start
+                
+                logger.info(f"Результат OCR взят из кеша за {lookup_time * 1e6:.0f} мкс")
+                
+                return {
+                    "status": "success",
+                    "message": "Распознавание текста завершено успешно (результат из кеша)",
+                    "data": {
+                        **cached,
+                        "file_id": request.file_id,
+                        "source_file": file_path,
+                        "parameters": _request_parameters(request),
+                        "processing_time": lookup_time,
+                        "cache": {
+                            "hit": True,
+                            "key": cache_key
+                        }
+                    }
+                }
+        
         # Выполняем распознавание текста
         start_time = time.time()
         
-        # В реальной реализации здесь будет вызов OCR библиотеки
-        # Пока используем заглушку из существующего модуля
-        recognized_text = recognize_text(
-            file_path, 
+        # Сегментация на строки и слова, строки распознаются параллельно экземплярами из пула
+        page_result = recognize_page(
+            _load_page_image(file_path, image_hash),
             language=request.language, 
-            model_type=request.model_type
+            model_type=request.model_type,
+            fallback_model_type=request.fallback_model_type,
+            confidence_threshold=request.confidence_threshold
         )
+        # Исправление ошибок распознавания до сохранения результата и извлечения атрибутов
+        post_correction = correct_page(page_result) if request.post_correction else None
+        recognized_text = page_result["recognized_text"]
         
         processing_time = time.time() - start_time
         
-        # Анализируем результат
-        text_length = len(recognized_text)
-        word_count = len(recognized_text.split())
-        
-        # В реальной реализации здесь будет анализ уверенности
-        # Пока используем заглушку
-        confidence_scores = {
-            "overall": 0.85,
-            "characters": 0.90,
-            "words": 0.80
-        }
+        # Уверенность движка по строкам, взвешенная длиной строк
+        confidence_scores = page_result["confidence_scores"]
         
-        # Создаем блоки текста (в реальной реализации будет разбивка по строкам/словам)
-        text_blocks = [
-            {
-                "text": recognized_text,
-                "confidence": confidence_scores["overall"],
-                "bbox": {"x": 0, "y": 0, "width": 800, "height": 600},
-                "language": request.language
-            }
-        ]
+        # Блоки текста - строки страницы с рамками строк и слов
+        text_blocks = page_result["text_blocks"]
         
         # Сохраняем результат распознавания
-        result_filename = f"ocr_result_{request.file_id}_{int(time.time())}.txt"
+        timestamp = int(time.time())
+        result_filename = f"ocr_result_{request.file_id}_{timestamp}.txt"
         result_path = os.path.join("ocr_results", result_filename)
         
         # Создаем директорию для результатов OCR
@@ -235,37 +628,54 @@ async def recognize_text_from_image(request: OCRRequest) -> JSONResponse:
         with open(result_path, "w", encoding="utf-8") as f:
             f.write(recognized_text)
         
+        # Структурированный результат: блоки, строки и слова с рамками, уверенность и статистика
+        structured, structured_path = _save_structured_result(
+            request.file_id, timestamp, recognized_text, [_structured_page(page_result)],
+            source_file=file_path,
+            engine_version=OCR_ENGINE_VERSION,
+            language=page_result["language"],
+            model_type=request.model_type,
+            confidence_scores=confidence_scores
+        )
+        
         logger.info(f"Распознавание завершено за {processing_time:.2f} секунд")
         
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "success",
-                "message": "Распознавание текста завершено успешно",
-                "data": {
-                    "file_id": request.file_id,
-                    "source_file": file_path,
-                    "recognized_text": recognized_text,
-                    "text_blocks": text_blocks,
-                    "statistics": {
-                        "text_length": text_length,
-                        "word_count": word_count,
-                        "character_count": len(recognized_text.replace(" ", "")),
-                        "line_count": len(recognized_text.split("\n"))
-                    },
-                    "confidence_scores": confidence_scores,
-                    "parameters": {
-                        "language": request.language,
-                        "model_type": request.model_type,
-                        "confidence_threshold": request.confidence_threshold,
-                        "preprocess": request.preprocess
-                    },
-                    "result_file": result_path,
-                    "processing_time": processing_time,
-                    "recognized_at": datetime.now().isoformat()
+        result_data = {
+            "recognized_text": recognized_text,
+            "raw_text": page_result.get("raw_text", recognized_text),
+            "text_blocks": text_blocks,
+            "statistics": structured.statistics,
+            "confidence_scores": confidence_scores,
+            "layout": page_result["layout"],
+            "two_tier": page_result["two_tier"],
+            "model_selection": page_result["model_selection"],
+            "language": page_result["language"],
+            "language_detection": page_result["language_detection"],
+            "post_correction": post_correction,
+            "result_file": result_path,
+            "structured_file": structured_path,
+            "engine_version": OCR_ENGINE_VERSION,
+            "recognized_at": structured.meta["recognized_at"]
+        }
+        
+        # Сохраняем результат в кеш (при bypass_cache запись обновляется)
+        ocr_cache.put(cache_key, result_data)
+        
+        return {
+            "status": "success",
+            "message": "Распознавание текста завершено успешно",
+            "data": {
+                **result_data,
+                "file_id": request.file_id,
+                "source_file": file_path,
+                "parameters": _request_parameters(request),
+                "processing_time": processing_time,
+                "cache": {
+                    "hit": False,
+                    "key": cache_key
                 }
             }
-        )
+        }
         
     except HTTPException:
         raise
@@ -276,39 +686,220 @@ async def recognize_text_from_image(request: OCRRequest) -> JSONResponse:
             detail=f"Ошибка при распознавании текста: {str(e)}"
         )
 
+@router.post("/recognize")
+async def recognize_text_from_image(request: OCRRequest) -> JSONResponse:
+    """
+    Распознавание текста на изображении
+    
+    Одновременные одинаковые запросы (тот же файл и параметры)
+    выполняются один раз и получают общий результат.
+    
+    Args:
+        request: Запрос на распознавание текста
+        
+    Returns:
+        JSON с результатами распознавания
+    """
+    flight_key = make_cache_key("ocr", request.model_dump())
+    content, _coalesced = await processing_flights.do(
+        flight_key,
+        "ocr",
+        lambda: run_in_threadpool(_recognize_file, request)
+    )
+    return JSONResponse(status_code=200, content=content)
+
+def _recognize_regions(request: RegionOCRRequest) -> Dict[str, Any]:
+    """
+    Распознает выбранные области страницы (блокирующая часть запроса)
+    
+    Args:
+        request: Запрос на распознавание областей
+        
+    Returns:
+        Содержимое JSON-ответа с результатами по областям
+    """
+    try:
+        if request.language not in SUPPORTED_LANGUAGES and request.language != AUTO_LANGUAGE:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый язык: {request.language}")
+        if request.model_type not in MODEL_TYPES and request.model_type != AUTO_MODEL_TYPE:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый тип модели: {request.model_type}")
+        if request.fallback_model_type is not None and request.fallback_model_type not in MODEL_TYPES:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый тип модели: {request.fallback_model_type}")
+        if not 0.0 <= request.confidence_threshold <= 1.0:
+            raise HTTPException(status_code=400, detail="Порог уверенности должен быть от 0.0 до 1.0")
+        if not request.regions:
+            raise HTTPException(status_code=400, detail="Не указаны области для распознавания")
+        if len(request.regions) > OCR_MAX_REGIONS:
+            raise HTTPException(status_code=400, detail=f"Не более {OCR_MAX_REGIONS} областей в одном запросе")
+        if any(region.width <= 0 or region.height <= 0 for region in request.regions):
+            raise HTTPException(status_code=400, detail="Ширина и высота области должны быть положительными")
+        
+        file_path = _find_file(request.file_id)
+        if not file_path or not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="Файл не найден")
+        
+        start_time = time.time()
+        image_hash = get_file_hash(file_path)
+        two_tier = (request.fallback_model_type, request.confidence_threshold) if request.fallback_model_type else None
+        detector = LANGUAGE_DETECTOR_VERSION if request.language == AUTO_LANGUAGE else None
+        classifier = CLASSIFIER_VERSION if request.model_type == AUTO_MODEL_TYPE else None
+        correction = get_corrector().version if request.post_correction else None
+        try:
+            image = _load_page_image(file_path, image_hash, request.page or 1)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        regions = []
+        for region in request.regions:
+            bbox = region.model_dump()
+            cache_key = make_cache_key(
+                image_hash, request.page or 1, bbox, request.language, request.model_type, two_tier, detector,
+                classifier, correction, OCR_ENGINE_VERSION, LAYOUT_VERSION
+            )
+            cached = None if request.bypass_cache else ocr_cache.get(cache_key)
+            if cached is not None:
+                regions.append({**cached, "cache": {"hit": True, "key": cache_key}})
+                continue
+            try:
+                result = recognize_region(
+                    image, bbox,
+                    language=request.language,
+                    model_type=request.model_type,
+                    fallback_model_type=request.fallback_model_type,
+                    confidence_threshold=request.confidence_threshold
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            result["post_correction"] = correct_page(result) if request.post_correction else None
+            ocr_cache.put(cache_key, result)
+            regions.append({**result, "cache": {"hit": False, "key": cache_key}})
+        
+        processing_time = time.time() - start_time
+        logger.info(
+            f"Распознано областей: {len(regions)} для файла {request.file_id} за {processing_time:.2f} секунд"
+        )
+        
+        return {
+            "status": "success",
+            "message": "Распознавание областей завершено успешно",
+            "data": {
+                "regions": regions,
+                "recognized_text": "\n\n".join(region["recognized_text"] for region in regions),
+                "file_id": request.file_id,
+                "source_file": file_path,
+                "image_size": {"width": image.shape[1], "height": image.shape[0]},
+                "engine_version": OCR_ENGINE_VERSION,
+                "parameters": {
+                    "language": request.language,
+                    "model_type": request.model_type,
+                    "page": request.page,
+                    "confidence_threshold": request.confidence_threshold,
+                    "fallback_model_type": request.fallback_model_type,
+                    "post_correction": request.post_correction
+                },
+                "processing_time": processing_time
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при распознавании областей: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при распознавании областей: {str(e)}"
+        )
+
+@router.post("/recognize/region")
+async def recognize_text_from_regions(request: RegionOCRRequest) -> JSONResponse:
+    """
+    Распознавание текста в выбранных областях страницы
+    
+    Страница декодируется один раз и хранится в кеше декодированных
+    изображений, поэтому время ответа зависит от размера областей.
+    
+    Args:
+        request: Запрос с ID файла и рамками областей
+        
+    Returns:
+        JSON с текстом, строками и словами по каждой области
+    """
+    flight_key = make_cache_key("ocr-region", request.model_dump())
+    content, _coalesced = await processing_flights.do(
+        flight_key,
+        "ocr",
+        lambda: run_in_threadpool(_recognize_regions, request)
+    )
+    return JSONResponse(status_code=200, content=content)
+
 @router.get("/result/{file_id}")
-async def get_ocr_result(file_id: str) -> JSONResponse:
+async def get_ocr_result(file_id: str, format: Optional[str] = None) -> Response:
     """
     Получение результата распознавания текста
     
+    Статистика берется из структурированного результата, текст не
+    пересчитывается. Для результатов, сохраненных только как .txt,
+    статистика вычисляется по тексту.
+    
     Args:
         file_id: ID файла
+        format: Формат ответа: None - JSON со сводкой, "json" - блоки,
+            строки и слова с рамками, "text" - текст, "alto" - ALTO XML
         
     Returns:
-        JSON с результатом распознавания
+        JSON с результатом распознавания или результат в запрошенном формате
     """
     try:
         logger.info(f"Получение результата OCR для файла: {file_id}")
         
-        # Поиск файла с результатом OCR
-        ocr_results_dir = "ocr_results"
-        result_file = None
-        
-        if os.path.exists(ocr_results_dir):
-            for filename in os.listdir(ocr_results_dir):
-                if file_id in filename:
-                    result_file = os.path.join(ocr_results_dir, filename)
-                    break
-        
-        if not result_file or not os.path.exists(result_file):
+        if format is not None and format not in RESULT_FORMATS:
             raise HTTPException(
-                status_code=404,
-                detail="Результат распознавания не найден"
+                status_code=400,
+                detail=f"Неподдерживаемый формат результата: {format}"
             )
         
-        # Читаем результат
-        with open(result_file, "r", encoding="utf-8") as f:
-            recognized_text = f.read()
+        structured_files = find_structured_results(file_id)
+        if structured_files:
+            result_file = structured_files[0]
+            structured = await run_in_threadpool(StructuredResult.load, result_file)
+            
+            if format is not None:
+                content = await run_in_threadpool(serialize_result, structured, format)
+                return Response(content=content, media_type=RESULT_MEDIA_TYPES[format])
+            
+            recognized_text = structured.to_text()
+            statistics = structured.statistics
+        else:
+            # Результат без структурированной версии (сохранен до ее появления)
+            ocr_results_dir = "ocr_results"
+            result_file = None
+            
+            if os.path.exists(ocr_results_dir):
+                for filename in os.listdir(ocr_results_dir):
+                    if file_id in filename and filename.endswith(".txt"):
+                        result_file = os.path.join(ocr_results_dir, filename)
+                        break
+            
+            if not result_file or not os.path.exists(result_file):
+                raise HTTPException(
+                    status_code=404,
+                    detail="Результат распознавания не найден"
+                )
+            
+            if format not in (None, "text"):
+                raise HTTPException(
+                    status_code=404,
+                    detail="Структурированный результат распознавания не найден"
+                )
+            
+            # Читаем результат
+            with open(result_file, "r", encoding="utf-8") as f:
+                recognized_text = f.read()
+            
+            if format == "text":
+                return Response(content=recognized_text, media_type=RESULT_MEDIA_TYPES["text"])
+            
+            statistics = text_statistics(recognized_text)
         
         # Получаем информацию о файле
         stat = os.stat(result_file)
@@ -321,12 +912,7 @@ async def get_ocr_result(file_id: str) -> JSONResponse:
                     "file_id": file_id,
                     "result_file": result_file,
                     "recognized_text": recognized_text,
-                    "statistics": {
-                        "text_length": len(recognized_text),
-                        "word_count": len(recognized_text.split()),
-                        "character_count": len(recognized_text.replace(" ", "")),
-                        "line_count": len(recognized_text.split("\n"))
-                    },
+                    "statistics": statistics,
                     "created_time": datetime.fromtimestamp(stat.st_ctime).isoformat(),
                     "file_size": stat.st_size
                 }
@@ -364,11 +950,14 @@ async def list_ocr_results() -> JSONResponse:
                     
                     # Извлекаем file_id из имени файла
                     file_id = filename.replace("ocr_result_", "").split("_")[0]
+                    timestamp = filename[:-len(".txt")].rsplit("_", 1)[-1]
+                    structured_path = structured_result_path(file_id, timestamp)
                     
                     results.append({
                         "file_id": file_id,
                         "filename": filename,
                         "file_path": file_path,
+                        "structured_file": structured_path if os.path.exists(structured_path) else None,
                         "created_time": datetime.fromtimestamp(stat.st_ctime).isoformat(),
                         "file_size": stat.st_size
                     })
@@ -415,16 +1004,21 @@ async def delete_ocr_result(file_id: str) -> JSONResponse:
                     result_file = os.path.join(ocr_results_dir, filename)
                     break
         
-        if not result_file or not os.path.exists(result_file):
+        structured_files = find_structured_results(file_id)
+        
+        if (not result_file or not os.path.exists(result_file)) and not structured_files:
             raise HTTPException(
                 status_code=404,
                 detail="Результат распознавания не найден"
             )
         
-        # Удаляем файл
-        os.remove(result_file)
+        # Удаляем файлы: текст и структурированные версии
+        if result_file and os.path.exists(result_file):
+            os.remove(result_file)
+        for structured_file in structured_files:
+            os.remove(structured_file)
         
-        logger.info(f"Результат OCR удален: {result_file}")
+        logger.info(f"Результат OCR удален: {result_file}, структурированных файлов: {len(structured_files)}")
         
         return JSONResponse(
             status_code=200,
@@ -433,7 +1027,8 @@ async def delete_ocr_result(file_id: str) -> JSONResponse:
                 "message": "Результат распознавания удален",
                 "data": {
                     "file_id": file_id,
-                    "deleted_file": result_file
+                    "deleted_file": result_file,
+                    "deleted_structured_files": structured_files
                 }
             }
         )
@@ -447,6 +1042,57 @@ async def delete_ocr_result(file_id: str) -> JSONResponse:
             detail=f"Ошибка при удалении результата OCR: {str(e)}"
         )
 
+@router.get("/cache")
+async def get_cache_stats() -> JSONResponse:
+    """
+    Получение статистики кеша OCR
+    
+    Returns:
+        JSON со счетчиками уровней кеша в памяти и на диске
+    """
+    return JSONResponse(
+        status_code=200,
+        content={
+            "status": "success",
+            "data": {
+                "engine_version": OCR_ENGINE_VERSION,
+                **ocr_cache.get_stats(),
+                "images": decoded_images.get_stats()
+            }
+        }
+    )
+
+@router.delete("/cache")
+async def clear_cache() -> JSONResponse:
+    """
+    Очистка кеша OCR
+    
+    Returns:
+        JSON с количеством удаленных записей
+    """
+    try:
+        logger.info("Очистка кеша OCR")
+        removed = ocr_cache.clear()
+        decoded_images.clear()
+        
+        return JSONResponse(
+            status_code=200,
+            content={
+                "status": "success",
+                "message": "Кеш OCR очищен",
+                "data": {
+                    "removed_entries": removed
+                }
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка при очистке кеша OCR: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при очистке кеша OCR: {str(e)}"
+        )
+
 @router.get("/health")
 async def health_check() -> JSONResponse:
     """
@@ -463,7 +1109,13 @@ async def health_check() -> JSONResponse:
             "data": {
                 "supported_languages": len(SUPPORTED_LANGUAGES),
                 "model_types": len(MODEL_TYPES),
-                "ocr_results_dir": "ocr_results"
+                "ocr_results_dir": "ocr_results",
+                "structured_results_dir": STRUCTURED_RESULTS_DIR,
+                "cache": ocr_cache.get_stats(),
+                "images": decoded_images.get_stats(),
+                "engines": ocr_engines.get_stats(),
+                "classifier": get_classifier_stats(),
+                "correction": get_corrector().get_stats()
             }
         }
     )
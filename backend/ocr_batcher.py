@@ -0,0 +1,205 @@
+"""
+Модуль межзапросной группировки распознавания (micro-batching)
+Фрагменты строк всех выполняющихся заданий собираются в общие пачки:
+пачка отправляется в движок, когда заполнена или истекло время ожидания
+"""
+
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Конфигурация (через переменные окружения)
+# Строк в одной пачке распознавания; 0 или 1 - группировка отключена (по умолчанию:
+# выигрыш дают только движки с пакетным выводом, построчный движок в пачке теряет
+# распараллеливание строк одного задания по экземплярам пула)
+OCR_BATCH_MAX_SIZE = int(os.getenv("OCR_BATCH_MAX_SIZE", "1"))
+# Предельное ожидание добора пачки после поступления первой строки
+OCR_BATCH_MAX_WAIT_MS = float(os.getenv("OCR_BATCH_MAX_WAIT_MS", "5"))
+
+# Признак остановки потока сборки пачек
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Очередь элементов от всех вызывающих с общими пачками обработки
+
+    Потоки сборки забирают элементы из общей очереди: первый элемент
+    открывает пачку, затем пачка добирается до max_size элементов, но не
+    дольше max_wait_ms. Пачка обрабатывается одним вызовом run_batch,
+    результаты раздаются вызывающим через Future. При ошибке пачки элементы
+    обрабатываются по одному, чтобы ошибка одного элемента не передавалась
+    остальным вызывающим. Несколько потоков сборки
+    обрабатывают пачки параллельно (например, по числу экземпляров движка).
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]], max_size: int = OCR_BATCH_MAX_SIZE,
+                 max_wait_ms: float = OCR_BATCH_MAX_WAIT_MS, workers: int = 1, name: str = "batch"):
+        self.run_batch = run_batch
+        self.max_size = max(int(max_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.workers = max(int(workers), 1)
+        self.name = name
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self.stats = {
+            "batches": 0,
+            "items": 0,
+            "full_batches": 0,
+            "max_batch_size": 0,
+            "errors": 0,
+            "failed_items": 0,
+            "wait_ms": 0.0,
+            "run_ms": 0.0
+        }
+
+    def _start(self) -> None:
+        """Запускает потоки сборки при первой отправке"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Группировка {self.name} остановлена")
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, items: List[Any]) -> List[Future]:
+        """
+        Ставит элементы в общую очередь
+
+        Args:
+            items: Элементы для обработки
+
+        Returns:
+            Future с результатом для каждого элемента в том же порядке
+        """
+        self._start()
+        submitted = time.perf_counter()
+        futures = []
+        for item in items:
+            future: Future = Future()
+            self._queue.put((item, future, submitted))
+            futures.append(future)
+        return futures
+
+    def map(self, items: List[Any]) -> List[Any]:
+        """
+        Обрабатывает элементы в общих пачках и ожидает результаты
+
+        Args:
+            items: Элементы для обработки
+
+        Returns:
+            Результаты в порядке элементов
+        """
+        return [future.result() for future in self.submit(items)]
+
+    def _collect(self) -> Tuple[List[Tuple[Any, Future, float]], bool]:
+        """Собирает пачку: (элементы, признак остановки потока)"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # После срока ожидания забираются только уже поступившие элементы
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _call(self, items: List[Any]) -> List[Any]:
+        """Один вызов run_batch с проверкой числа результатов"""
+        results = self.run_batch(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"Пачка из {len(items)} элементов вернула {len(results)} результатов")
+        return results
+
+    def _run(self, batch: List[Tuple[Any, Future, float]]) -> None:
+        """Обрабатывает пачку и передает результаты вызывающим"""
+        started = time.perf_counter()
+        failed = 0
+        try:
+            results = self._call([item for item, _future, _submitted in batch])
+        except Exception as e:
+            logger.error(f"Ошибка обработки пачки {self.name} ({len(batch)} элементов): {str(e)}")
+            error = True
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                failed = 1
+            else:
+                # Ошибку получает только вызывающий, чей элемент не обрабатывается и отдельно
+                for item, future, _submitted in batch:
+                    try:
+                        future.set_result(self._call([item])[0])
+                    except Exception as item_error:
+                        future.set_exception(item_error)
+                        failed += 1
+        else:
+            for (_item, future, _submitted), result in zip(batch, results):
+                future.set_result(result)
+            error = False
+        finished = time.perf_counter()
+
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["full_batches"] += int(len(batch) >= self.max_size)
+            self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(batch))
+            self.stats["errors"] += int(error)
+            self.stats["failed_items"] += failed
+            self.stats["wait_ms"] += sum(started - submitted for _item, _future, submitted in batch) * 1000.0
+            self.stats["run_ms"] += (finished - started) * 1000.0
+
+    def _work(self) -> None:
+        """Цикл потока сборки: пачка за пачкой до остановки"""
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._run(batch)
+            if stop:
+                return
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Останавливает потоки сборки после обработки уже поставленных элементов"""
+        with self._lock:
+            self._closed = True
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает размеры пачек и время ожидания"""
+        with self._lock:
+            stats = dict(self.stats)
+            running = len(self._threads)
+        batches = stats["batches"]
+        return {
+            "name": self.name,
+            "max_size": self.max_size,
+            "max_wait_ms": round(self.max_wait * 1000.0, 2),
+            "workers": running,
+            "queued": self._queue.qsize(),
+            **{key: round(value, 1) if isinstance(value, float) else value for key, value in stats.items()},
+            "avg_batch_size": round(stats["items"] / batches, 2) if batches else 0.0,
+            "avg_wait_ms": round(stats["wait_ms"] / stats["items"], 2) if stats["items"] else 0.0
+        }
@@ -0,0 +1,480 @@
+"""
+Модуль постобработки результатов OCR
+Исправление типичных ошибок распознавания русского текста по словарям
+(индекс симметричного удаления, как в SymSpell) и замена латинских двойников букв
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Версия алгоритма исправления: входит в ключ кеша OCR вместе с отпечатком словарей
+CORRECTION_VERSION = "2"
+
+# Каталог словарей: все файлы *.txt (слово [частота] в строке, # - комментарий)
+LEXICON_DIR = os.getenv("OCR_LEXICON_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicons"))
+# Исправление по умолчанию: встроенные словари не содержат всех словоформ и
+# исправляют верно распознанные слова, поэтому без OCR_LEXICON_DIR оно выключено
+POST_CORRECTION_DEFAULT = os.getenv(
+    "OCR_POST_CORRECTION", "true" if os.getenv("OCR_LEXICON_DIR") else "false"
+).lower() == "true"
+# Наибольшее расстояние редактирования (для слов короче CORRECTION_SHORT_WORD - 1)
+CORRECTION_MAX_DISTANCE = int(os.getenv("OCR_CORRECTION_MAX_DISTANCE", "2"))
+CORRECTION_SHORT_WORD = 6
+# Слова короче не исправляются (предлоги, союзы, инициалы)
+CORRECTION_MIN_LENGTH = int(os.getenv("OCR_CORRECTION_MIN_LENGTH", "4"))
+# Слова только из кириллицы (без латинских букв и цифр - явных признаков ошибки OCR)
+# исправляются по словарю от этой длины: короткое слово на расстоянии 1 от словарного
+# чаще другое верное слово (дача - доча, гора - года), чем ошибка
+CORRECTION_PLAIN_MIN_LENGTH = int(os.getenv("OCR_CORRECTION_PLAIN_MIN_LENGTH", "8"))
+# Удаления строятся по префиксу слова такой длины (меньше индекс, та же точность для коротких слов)
+CORRECTION_PREFIX_LENGTH = 7
+# Языки строк, к которым применяется исправление (словари русские)
+CORRECTION_LANGUAGES = {"ru"}
+# Размер памяти исправлений отдельных слов
+CORRECTION_MEMO_SIZE = 200000
+
+# Пары символов, которые OCR часто путает: замена внутри пары стоит CONFUSION_COST
+CONFUSION_PAIRS = [
+    "ин", "нп", "пл", "лд", "шщ", "цщ", "её", "ьъ", "ьы", "зэ", "се", "тг", "вз", "бв", "оа", "ко", "ий"
+]
+CONFUSION_COST = 0.5
+
+# Латинские буквы, похожие на кириллические (смешение раскладок и шрифтов)
+HOMOGLYPHS = str.maketrans({
+    "a": "а", "c": "с", "e": "е", "o": "о", "p": "р", "x": "х", "y": "у", "k": "к",
+    "A": "А", "B": "В", "C": "С", "E": "Е", "H": "Н", "K": "К", "M": "М",
+    "O": "О", "P": "Р", "T": "Т", "X": "Х", "Y": "У"
+})
+# Цифры внутри кириллического слова
+DIGIT_HOMOGLYPHS = {"0": "о", "3": "з", "6": "б"}
+
+# Окончания для сопоставления словоформ с основами словаря (от длинных к коротким)
+RUSSIAN_ENDINGS = sorted([
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ых", "их",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ей", "ом", "ем",
+    "ам", "ям", "ах", "ях", "ую", "юю", "ов", "ев", "ым", "им", "ою", "ею", "ью", "ии",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й"
+], key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+CYRILLIC = re.compile(r"[а-яё]+")
+
+_confusions = {(pair[0], pair[1]) for pair in CONFUSION_PAIRS} | {(pair[1], pair[0]) for pair in CONFUSION_PAIRS}
+
+
+def _is_cyrillic(char: str) -> bool:
+    return "Ѐ" <= char <= "ӿ"
+
+
+def _split_ending(word: str) -> Tuple[str, str]:
+    """Делит слово на основу и окончание из RUSSIAN_ENDINGS (основа не короче MIN_STEM_LENGTH)"""
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)], ending
+    return word, ""
+
+
+def _restore_case(template: str, word: str) -> str:
+    if len(template) > 1 and template.isupper():
+        return word.upper()
+    if template[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+def edit_distance(source: str, target: str, limit: float, edit_cost: float = 1.0) -> float:
+    """
+    Расстояние Дамерау-Левенштейна (перестановки соседних символов) с
+    уменьшенной ценой замен из CONFUSION_PAIRS
+
+    Args:
+        source: Слово из текста
+        target: Слово словаря
+        limit: Расчет прекращается, если расстояние заведомо больше
+        edit_cost: Цена вставки, удаления, перестановки и замены вне CONFUSION_PAIRS
+
+    Returns:
+        Расстояние или limit + 1
+    """
+    if abs(len(source) - len(target)) > limit:
+        return limit + 1
+    previous_previous: List[float] = []
+    previous = [j * edit_cost for j in range(len(target) + 1)]
+    for i in range(1, len(source) + 1):
+        current = [i * edit_cost] + [0.0] * len(target)
+        source_char = source[i - 1]
+        row_min = current[0]
+        for j in range(1, len(target) + 1):
+            target_char = target[j - 1]
+            if source_char == target_char:
+                substitution = previous[j - 1]
+            elif (source_char, target_char) in _confusions:
+                substitution = previous[j - 1] + CONFUSION_COST
+            else:
+                substitution = previous[j - 1] + edit_cost
+            value = min(previous[j] + edit_cost, current[j - 1] + edit_cost, substitution)
+            if (i > 1 and j > 1 and source_char == target[j - 2] and source[i - 2] == target_char):
+                value = min(value, previous_previous[j - 2] + edit_cost)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymmetricDeleteIndex:
+    """
+    Индекс симметричного удаления (SymSpell)
+
+    Для каждого слова словаря заранее строятся все варианты с удалением до
+    max_distance символов (по префиксу prefix_length); при поиске удаления
+    строятся для слова из текста, и кандидаты - слова с общими удалениями.
+    Слова хранятся в одном списке, частоты - в массиве uint32, удаление
+    ссылается на номер слова (int) или кортеж номеров, а не на строки.
+    """
+
+    def __init__(self, max_distance: int = CORRECTION_MAX_DISTANCE, prefix_length: int = CORRECTION_PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words: List[str] = []
+        self.counts = array("I")
+        self.index: Dict[str, int] = {}
+        self.deletes: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.index
+
+    def add(self, word: str, count: int) -> None:
+        """Добавляет слово (повторное добавление увеличивает частоту)"""
+        number = self.index.get(word)
+        if number is not None:
+            self.counts[number] = min(self.counts[number] + count, 0xFFFFFFFF)
+            return
+        number = len(self.words)
+        self.index[word] = number
+        self.words.append(word)
+        self.counts.append(min(count, 0xFFFFFFFF))
+        for delete in self._edits(word[:self.prefix_length]):
+            entry = self.deletes.get(delete)
+            if entry is None:
+                self.deletes[delete] = number
+            elif isinstance(entry, int):
+                self.deletes[delete] = (entry, number)
+            else:
+                self.deletes[delete] = entry + (number,)
+
+    def _edits(self, word: str) -> set:
+        edits = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            frontier = {
+                candidate[:index] + candidate[index + 1:]
+                for candidate in frontier if len(candidate) > 1
+                for index in range(len(candidate))
+            }
+            edits |= frontier
+        return edits
+
+    def lookup(self, word: str, max_distance: float, edit_cost: float = 1.0) -> List[Tuple[str, float, int]]:
+        """
+        Находит слова словаря на расстоянии не больше max_distance
+
+        Args:
+            word: Слово (в нижнем регистре)
+            max_distance: Наибольшее расстояние
+            edit_cost: Цена правок вне CONFUSION_PAIRS (см. edit_distance)
+
+        Returns:
+            Кандидаты (слово, расстояние, частота), от лучших к худшим
+        """
+        found: Dict[int, float] = {}
+        for delete in self._edits(word[:self.prefix_length]):
+            entry = self.deletes.get(delete)
+            if entry is None:
+                continue
+            for number in (entry,) if isinstance(entry, int) else entry:
+                if number in found:
+                    continue
+                found[number] = edit_distance(word, self.words[number], max_distance, edit_cost)
+        candidates = [
+            (self.words[number], distance, self.counts[number])
+            for number, distance in found.items() if distance <= max_distance
+        ]
+        candidates.sort(key=lambda item: (item[1], -item[2]))
+        return candidates
+
+
+def read_lexicon(path: str) -> Iterable[Tuple[str, int]]:
+    """
+    Читает словарь: строки "слово [частота]"
+
+    Слова без частоты получают вес по месту в файле (файлы упорядочены по
+    убыванию частоты).
+
+    Args:
+        path: Путь к файлу
+
+    Yields:
+        (слово в нижнем регистре, частота)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.split() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    for rank, parts in enumerate(lines):
+        count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else len(lines) - rank
+        yield parts[0].lower().replace("ё", "е"), count
+
+
+class PostCorrector:
+    """
+    Исправление слов распознанного текста
+
+    Порядок: замена латинских букв и цифр, похожих на кириллические, затем
+    поиск ближайшего слова словаря (для слов только из кириллицы - не короче
+    CORRECTION_PLAIN_MIN_LENGTH). Слово, найденное в словаре или
+    совпадающее с ним по основе (другая словоформа), не меняется. Слова с
+    заглавной буквы (фамилии, названия) исправляются только заменами из
+    CONFUSION_PAIRS, чтобы редкие фамилии не превращались в словарные.
+    Неоднозначные исправления не выполняются.
+    """
+
+    def __init__(self, lexicon_dir: str = LEXICON_DIR):
+        started = time.perf_counter()
+        self.words = SymmetricDeleteIndex()
+        self.stems = SymmetricDeleteIndex()
+        digest = hashlib.sha256(CORRECTION_VERSION.encode("ascii"))
+        files = sorted(name for name in os.listdir(lexicon_dir) if name.endswith(".txt")) if os.path.isdir(lexicon_dir) else []
+        for name in files:
+            path = os.path.join(lexicon_dir, name)
+            with open(path, "rb") as f:
+                digest.update(f.read())
+            for word, count in read_lexicon(path):
+                self.words.add(word, count)
+                stem, _ending = _split_ending(word)
+                self.stems.add(stem, count)
+        self.version = f"{CORRECTION_VERSION}-{digest.hexdigest()[:12]}"
+        self.lexicons = files
+        self._memo: Dict[str, Optional[Tuple[str, str, float]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "tokens": 0,
+            "corrected": 0,
+            "homoglyph": 0,
+            "lexicon": 0,
+            "ambiguous": 0,
+            "correction_ms": 0.0
+        }
+        self.build_ms = (time.perf_counter() - started) * 1000.0
+        logger.info(
+            f"Словари исправления OCR: {len(self.words)} слов, {len(self.words.deletes) + len(self.stems.deletes)} "
+            f"удалений, {self.build_ms:.0f} мс"
+        )
+
+    def _known(self, word: str) -> bool:
+        return word in self.words or _split_ending(word)[0] in self.stems
+
+    def _lexicon_candidate(self, word: str, capitalized: bool, min_length: int) -> Optional[Tuple[str, float]]:
+        if len(word) < min_length or not CYRILLIC.fullmatch(word):
+            return None
+        max_distance = float(self.words.max_distance if len(word) >= CORRECTION_SHORT_WORD else 1)
+        # Слова с заглавной буквы - только замены похожих символов: прочие правки дороже предела
+        edit_cost = max_distance + 1 if capitalized else 1.0
+
+        options = self.words.lookup(word, max_distance, edit_cost)
+        stem, ending = _split_ending(word)
+        if ending:
+            options += [
+                (candidate + ending, distance, count)
+                for candidate, distance, count in self.stems.lookup(stem, max_distance, edit_cost)
+            ]
+        if not options:
+            return None
+        options.sort(key=lambda item: (item[1], -item[2]))
+        best = options[0]
+        rivals = [option for option in options[1:] if option[0] != best[0] and option[1] == best[1]]
+        if rivals and rivals[0][2] * 2 > best[2]:
+            with self._lock:
+                self.stats["ambiguous"] += 1
+            return None
+        return best[0], best[1]
+
+    def correct_token(self, token: str) -> Optional[Tuple[str, str, float]]:
+        """
+        Исправляет одно слово
+
+        Args:
+            token: Слово из текста (буквы и цифры)
+
+        Returns:
+            (исправленное слово, способ "homoglyph" или "lexicon", расстояние)
+            или None, если слово не меняется
+        """
+        if token in self._memo:
+            return self._memo[token]
+
+        result = None
+        fixed = token
+        cyrillic = sum(1 for char in token if _is_cyrillic(char))
+        if cyrillic and cyrillic < len(token) and cyrillic * 2 >= sum(1 for char in token if char.isalpha()):
+            fixed = token.translate(HOMOGLYPHS)
+            fixed = "".join(
+                DIGIT_HOMOGLYPHS.get(char, char) if 0 < index < len(fixed) - 1 and char in DIGIT_HOMOGLYPHS else char
+                for index, char in enumerate(fixed)
+            )
+            if fixed != token and all(_is_cyrillic(char) for char in fixed):
+                result = (fixed, "homoglyph", 0.0)
+            else:
+                fixed = token
+
+        lowered = fixed.lower().replace("ё", "е")
+        if CYRILLIC.fullmatch(lowered) and not self._known(lowered):
+            capitalized = fixed[:1].isupper() and not fixed.isupper()
+            # Слово без замененных латинских букв и цифр исправляется только длинное
+            min_length = CORRECTION_MIN_LENGTH if result is not None else CORRECTION_PLAIN_MIN_LENGTH
+            candidate = self._lexicon_candidate(lowered, capitalized, min_length)
+            if candidate is not None:
+                result = (_restore_case(fixed, candidate[0]), "lexicon", candidate[1])
+
+        if len(self._memo) >= CORRECTION_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[token] = result
+        return result
+
+    def correct_text(self, text: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Исправляет текст
+
+        Args:
+            text: Распознанный текст (строка или страница)
+
+        Returns:
+            (исправленный текст, журнал исправлений: позиция, исходное и
+            исправленное слово, способ, расстояние)
+        """
+        started = time.perf_counter()
+        # Слова выделяются и сравниваются с памятью исправлений целиком на стороне re и dict;
+        # по тексту в Python проходит только поиск исправляемых слов
+        tokens = TOKEN_PATTERN.findall(text)
+        fixes = {}
+        for token in set(tokens):
+            fixed = self.correct_token(token)
+            if fixed is not None:
+                fixes[token] = fixed
+
+        corrections: List[Dict[str, Any]] = []
+        if fixes:
+            pattern = re.compile(
+                r"(?<![^\W_])(?:" + "|".join(map(re.escape, sorted(fixes, key=len, reverse=True))) + r")(?![^\W_])"
+            )
+            parts: List[str] = []
+            position = 0
+            for match in pattern.finditer(text):
+                fixed = fixes[match.group()]
+                parts.append(text[position:match.start()])
+                parts.append(fixed[0])
+                position = match.end()
+                corrections.append({
+                    "start": match.start(),
+                    "original": match.group(),
+                    "corrected": fixed[0],
+                    "method": fixed[1],
+                    "distance": fixed[2]
+                })
+            parts.append(text[position:])
+            text = "".join(parts)
+
+        with self._lock:
+            self.stats["tokens"] += len(tokens)
+            self.stats["corrected"] += len(corrections)
+            for correction in corrections:
+                self.stats[correction["method"]] += 1
+            self.stats["correction_ms"] += (time.perf_counter() - started) * 1000.0
+        return text, corrections
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает сведения о словарях и счетчики исправлений"""
+        with self._lock:
+            stats = dict(self.stats)
+        seconds = stats["correction_ms"] / 1000.0
+        return {
+            "version": self.version,
+            "lexicons": self.lexicons,
+            "words": len(self.words),
+            "deletes": len(self.words.deletes) + len(self.stems.deletes),
+            "build_ms": round(self.build_ms, 1),
+            "memo_entries": len(self._memo),
+            **stats,
+            "correction_ms": round(stats["correction_ms"], 1),
+            "tokens_per_second": round(stats["tokens"] / seconds) if seconds else None
+        }
+
+
+_corrector: Optional[PostCorrector] = None
+_corrector_lock = threading.Lock()
+
+
+def get_corrector() -> PostCorrector:
+    """Возвращает общий экземпляр исправления (словари загружаются при первом обращении)"""
+    global _corrector
+    with _corrector_lock:
+        if _corrector is None:
+            _corrector = PostCorrector()
+        return _corrector
+
+
+def correct_page(page_result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Исправляет результат recognize_page на месте
+
+    Текст строк, текст слов и общий текст страницы заменяются исправленными;
+    исходный текст строки и страницы сохраняется в raw_text. Исправление зависит только
+    от слова, поэтому текст страницы и строк исправляется согласованно.
+
+    Args:
+        page_result: Результат recognize_page
+
+    Returns:
+        Сводка: число слов и исправлений, журнал исправлений по строкам, время
+    """
+    started = time.perf_counter()
+    if page_result.get("language") not in CORRECTION_LANGUAGES:
+        return {"applied": False, "language": page_result.get("language"), "corrections": []}
+
+    corrector = get_corrector()
+    corrections = []
+    for block in page_result["text_blocks"]:
+        text, line_corrections = corrector.correct_text(block["text"])
+        if not line_corrections:
+            continue
+        block["raw_text"] = block["text"]
+        block["text"] = text
+        tokens = text.split()
+        if len(tokens) == len(block.get("words") or []) and all(word["text"] is not None for word in block["words"]):
+            for word, token in zip(block["words"], tokens):
+                word["text"] = token
+        corrections.extend(dict(correction, line=block.get("line")) for correction in line_corrections)
+
+    page_result["raw_text"] = page_result["recognized_text"]
+    page_result["recognized_text"] = corrector.correct_text(page_result["recognized_text"])[0]
+    return {
+        "applied": True,
+        "language": page_result["language"],
+        "version": corrector.version,
+        "corrected_words": len(corrections),
+        "corrections": corrections,
+        "correction_ms": round((time.perf_counter() - started) * 1000.0, 2)
+    }
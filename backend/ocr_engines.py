@@ -0,0 +1,919 @@
+"""
+Модуль движков распознавания текста (OCR)
+Реестр движков по (язык, тип модели) с пулами заранее загруженных экземпляров
+"""
+
+import os
+import math
+import threading
+import time
+import zlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from image_processing import load_image, recognize_text, sample_text, OCR_ENGINE_VERSION as STUB_ENGINE_VERSION
+from layout import crop_line, estimate_char_height, ink_mask, segment_page, segment_words
+from language_detection import AUTO_LANGUAGE, LANGUAGE_FALLBACK, detect_language
+from handwriting_detection import AUTO_MODEL_TYPE, classify_line
+from ocr_batcher import OCR_BATCH_MAX_SIZE, OCR_BATCH_MAX_WAIT_MS, MicroBatcher
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Поддерживаемые языки
+SUPPORTED_LANGUAGES = {
+    "ru": "Русский",
+    "en": "Английский",
+    "de": "Немецкий",
+    "fr": "Французский",
+    "es": "Испанский",
+    "it": "Итальянский"
+}
+
+# Типы моделей
+MODEL_TYPES = {
+    "printed": "Печатный текст",
+    "handwritten": "Рукописный текст",
+    "mixed": "Смешанный текст"
+}
+
+# Многоязычная модель для пробного распознавания строк при определении языка
+PROBE_LANGUAGE = "multi"
+
+# Конфигурация (через переменные окружения)
+OCR_ENGINE = os.getenv("OCR_ENGINE", "stub")
+# Экземпляров движка на (язык, тип модели) в процессе: один экземпляр
+# распознает одно изображение за раз
+OCR_ENGINE_POOL_SIZE = int(os.getenv("OCR_ENGINE_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+# Модели, загружаемые при запуске сервера: "ru:printed,en:printed", "all" или пусто
+OCR_ENGINE_PRELOAD = os.getenv("OCR_ENGINE_PRELOAD", "")
+OCR_ENGINE_ACQUIRE_TIMEOUT = float(os.getenv("OCR_ENGINE_ACQUIRE_TIMEOUT", "120"))
+# Построчное распознавание без межзапросной группировки (OCR_BATCH_MAX_SIZE <= 1):
+# потоки на все страницы процесса и строк в одной пачке
+# (пачка распознается одним экземпляром движка без повторного захвата из пула)
+OCR_LINE_WORKERS = int(os.getenv("OCR_LINE_WORKERS", str(OCR_ENGINE_POOL_SIZE)))
+OCR_LINE_BATCH_SIZE = int(os.getenv("OCR_LINE_BATCH_SIZE", "16"))
+# Строк-образцов для определения языка страницы (самые длинные строки)
+OCR_LANGUAGE_SAMPLE_LINES = int(os.getenv("OCR_LANGUAGE_SAMPLE_LINES", "6"))
+
+
+class OCREngine:
+    """
+    Базовый класс движка OCR
+
+    Экземпляр создается для пары (язык, тип модели), модель загружается
+    один раз в load() и переиспользуется для всех последующих вызовов.
+    Экземпляр не потокобезопасен - одновременный доступ исключает пул.
+    """
+
+    name = "base"
+    version = "0"
+    # Типы моделей, для которых у движка есть модель (None - все типы)
+    model_types: Optional[Tuple[str, ...]] = None
+
+    def __init__(self, language: str, model_type: str):
+        self.language = language
+        self.model_type = model_type
+
+    def load(self) -> None:
+        """Загружает модель (дорогая операция, выполняется один раз)"""
+
+    def recognize(self, image: Union[str, np.ndarray]) -> str:
+        """
+        Распознает текст на изображении
+
+        Args:
+            image: Путь к файлу или изображение в оттенках серого
+
+        Returns:
+            Распознанный текст
+        """
+        raise NotImplementedError
+
+    def recognize_line(self, image: np.ndarray) -> Tuple[str, float]:
+        """
+        Распознает одну строку текста
+
+        Args:
+            image: Фрагмент страницы со строкой (оттенки серого)
+
+        Returns:
+            Кортеж (текст, уверенность от 0.0 до 1.0)
+        """
+        raise NotImplementedError
+
+    def recognize_lines(self, images: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """
+        Распознает пачку строк за один вызов
+
+        Движки с пакетным выводом (нейросетевые модели) переопределяют метод,
+        чтобы распознать всю пачку одним проходом модели; по умолчанию строки
+        распознаются по одной.
+
+        Args:
+            images: Фрагменты страницы со строками (оттенки серого)
+
+        Returns:
+            Кортежи (текст, уверенность) в порядке строк
+        """
+        return [self.recognize_line(image) for image in images]
+
+    def close(self) -> None:
+        """Освобождает ресурсы модели"""
+
+    @staticmethod
+    def _as_array(image: Union[str, np.ndarray]) -> np.ndarray:
+        return load_image(image) if isinstance(image, str) else image
+
+
+class StubOCREngine(OCREngine):
+    """Заглушка: имитирует распознавание (image_processing.recognize_text)"""
+
+    name = "stub"
+    version = STUB_ENGINE_VERSION.split("-", 1)[-1]
+
+    def recognize(self, image: Union[str, np.ndarray]) -> str:
+        return recognize_text(image, language=self.language, model_type=self.model_type)
+
+    def recognize_line(self, image: np.ndarray) -> Tuple[str, float]:
+        # Слова примера по числу слов строки; уверенность - по контрасту текста и фона
+        mask = ink_mask(image)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        char_height = estimate_char_height(stats[1:, cv2.CC_STAT_HEIGHT])
+        if char_height is None:
+            return "", 0.0
+        # У заглушки нет многоязычной модели: пробное распознавание возвращает текст языка по умолчанию
+        language = LANGUAGE_FALLBACK if self.language == PROBE_LANGUAGE else self.language
+        words = sample_text(language, self.model_type).split()
+        count = len(segment_words(mask, char_height))
+        offset = zlib.crc32(image.tobytes()) % len(words)
+        text = " ".join(words[(offset + i) % len(words)] for i in range(count))
+        contrast = (float(image[mask == 0].mean()) - float(image[mask > 0].mean())) / 200.0
+        return text, round(0.5 + 0.49 * min(max(contrast, 0.0), 1.0), 4)
+
+
+class TesseractOCREngine(OCREngine):
+    """
+    Tesseract через tesserocr: модель языка загружается в экземпляр
+    PyTessBaseAPI один раз и остается в памяти между вызовами
+    """
+
+    name = "tesseract"
+    version = "5"
+    model_types = ("printed", "mixed")
+
+    # Коды языков traineddata Tesseract
+    LANGUAGE_CODES = {
+        "ru": "rus",
+        "en": "eng",
+        "de": "deu",
+        "fr": "fra",
+        "es": "spa",
+        "it": "ita",
+        PROBE_LANGUAGE: "rus+eng+deu+fra+spa+ita"
+    }
+
+    def __init__(self, language: str, model_type: str):
+        super().__init__(language, model_type)
+        self._api = None
+
+    def load(self) -> None:
+        try:
+            import tesserocr
+        except ImportError:
+            raise ValueError("Для движка tesseract требуется пакет tesserocr")
+        if self.model_type == "handwritten":
+            raise ValueError("Движок tesseract не поддерживает рукописный текст")
+        self._api = tesserocr.PyTessBaseAPI(lang=self.LANGUAGE_CODES[self.language])
+
+    def recognize(self, image: Union[str, np.ndarray]) -> str:
+        from PIL import Image
+        from tesserocr import PSM
+
+        self._api.SetPageSegMode(PSM.AUTO)
+        self._api.SetImage(Image.fromarray(self._as_array(image)))
+        return self._api.GetUTF8Text().strip()
+
+    def recognize_line(self, image: np.ndarray) -> Tuple[str, float]:
+        from PIL import Image
+        from tesserocr import PSM
+
+        self._api.SetPageSegMode(PSM.SINGLE_LINE)
+        self._api.SetImage(Image.fromarray(image))
+        text = self._api.GetUTF8Text().strip()
+        return text, max(self._api.MeanTextConf(), 0) / 100.0
+
+    def close(self) -> None:
+        if self._api is not None:
+            self._api.End()
+            self._api = None
+
+
+# Реестр классов движков: название -> фабрика (язык, тип модели) -> экземпляр
+ENGINE_FACTORIES: Dict[str, Callable[[str, str], OCREngine]] = {
+    "stub": StubOCREngine,
+    "tesseract": TesseractOCREngine,
+}
+
+
+def register_engine(name: str, factory: Callable[[str, str], OCREngine]) -> None:
+    """
+    Регистрирует движок OCR
+
+    Args:
+        name: Название движка (значение OCR_ENGINE)
+        factory: Фабрика экземпляров по (язык, тип модели)
+    """
+    ENGINE_FACTORIES[name] = factory
+
+
+class EnginePool:
+    """
+    Пул загруженных экземпляров движка для одной пары (язык, тип модели)
+
+    Экземпляры создаются по требованию до size штук и не выгружаются;
+    при занятости всех экземпляров вызов ожидает освобождения.
+    """
+
+    def __init__(self, factory: Callable[[str, str], OCREngine], language: str, model_type: str, size: int):
+        self.factory = factory
+        self.language = language
+        self.model_type = model_type
+        self.size = max(int(size), 1)
+        self._condition = threading.Condition()
+        self._idle: List[OCREngine] = []
+        self._created = 0
+        self._in_use = 0
+        self._load_ms: List[float] = []
+        self.stats = {
+            "acquisitions": 0,
+            "waits": 0,
+            "wait_ms": 0.0,
+            "busy_ms": 0.0,
+            "load_errors": 0
+        }
+
+    def _create(self) -> OCREngine:
+        """Создает и загружает новый экземпляр (вне блокировки пула)"""
+        started = time.perf_counter()
+        try:
+            engine = self.factory(self.language, self.model_type)
+            engine.load()
+        except Exception:
+            with self._condition:
+                self._created -= 1
+                self.stats["load_errors"] += 1
+                self._condition.notify()
+            raise
+        load_ms = (time.perf_counter() - started) * 1000.0
+        with self._condition:
+            self._load_ms.append(load_ms)
+        logger.info(
+            f"Загружен движок OCR {engine.name} ({self.language}, {self.model_type}) "
+            f"за {load_ms:.0f} мс, экземпляров: {self._created}/{self.size}"
+        )
+        return engine
+
+    def acquire(self, timeout: Optional[float] = None) -> OCREngine:
+        """
+        Получает свободный экземпляр движка
+
+        Args:
+            timeout: Предельное ожидание свободного экземпляра в секундах
+
+        Returns:
+            Загруженный экземпляр движка
+        """
+        timeout = OCR_ENGINE_ACQUIRE_TIMEOUT if timeout is None else timeout
+        started = time.perf_counter()
+        with self._condition:
+            waited = False
+            while not self._idle and self._created >= self.size:
+                waited = True
+                remaining = timeout - (time.perf_counter() - started)
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    if not self._idle and self._created >= self.size:
+                        raise TimeoutError(
+                            f"Нет свободного движка OCR ({self.language}, {self.model_type}) за {timeout:.0f} с"
+                        )
+            self.stats["acquisitions"] += 1
+            if waited:
+                self.stats["waits"] += 1
+                self.stats["wait_ms"] += (time.perf_counter() - started) * 1000.0
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._create()
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+            raise
+
+    def release(self, engine: OCREngine, busy_ms: float = 0.0) -> None:
+        """Возвращает экземпляр в пул"""
+        with self._condition:
+            self._idle.append(engine)
+            self._in_use -= 1
+            self.stats["busy_ms"] += busy_ms
+            self._condition.notify()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[OCREngine]:
+        """Экземпляр движка на время блока with"""
+        engine = self.acquire(timeout)
+        started = time.perf_counter()
+        try:
+            yield engine
+        finally:
+            self.release(engine, (time.perf_counter() - started) * 1000.0)
+
+    def warm_up(self, count: int = 1) -> None:
+        """Заранее загружает до count экземпляров"""
+        engines = []
+        try:
+            for _ in range(min(count, self.size)):
+                with self._condition:
+                    if self._created >= self.size:
+                        break
+                    self._created += 1
+                    self._in_use += 1
+                engines.append(self._create())
+        finally:
+            for engine in engines:
+                self.release(engine)
+
+    def close(self) -> None:
+        """Выгружает свободные экземпляры"""
+        with self._condition:
+            engines, self._idle = self._idle, []
+            self._created -= len(engines)
+        for engine in engines:
+            engine.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает время загрузки и загрузку пула"""
+        with self._condition:
+            return {
+                "language": self.language,
+                "model_type": self.model_type,
+                "size": self.size,
+                "loaded": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "utilization": round(self._in_use / self.size, 4),
+                "load_ms": [round(value, 1) for value in self._load_ms],
+                **{key: round(value, 1) if isinstance(value, float) else value for key, value in self.stats.items()}
+            }
+
+
+class OCREngineRegistry:
+    """
+    Реестр пулов движков OCR по (язык, тип модели)
+
+    Пул создается при первом обращении к паре; модели загружаются лениво
+    при первом распознавании или заранее через preload().
+    """
+
+    def __init__(self, engine_name: str = OCR_ENGINE, pool_size: int = OCR_ENGINE_POOL_SIZE):
+        if engine_name not in ENGINE_FACTORIES:
+            raise ValueError(f"Неизвестный движок OCR: {engine_name}")
+        self.engine_name = engine_name
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._pools: Dict[Tuple[str, str], EnginePool] = {}
+        # Типы моделей без модели у движка, о замене которых уже предупреждали
+        self._substituted: set = set()
+        self._line_executor: Optional[ThreadPoolExecutor] = None
+        # Общие пачки строк всех заданий по (язык, тип модели)
+        self._batchers: Dict[Tuple[str, str], MicroBatcher] = {}
+        # Пропускная способность по типам моделей: строки и время распознавания
+        self._throughput: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def version(self) -> str:
+        """Версия движка: входит в ключ кеша OCR"""
+        factory = ENGINE_FACTORIES[self.engine_name]
+        return f"{getattr(factory, 'name', self.engine_name)}-{getattr(factory, 'version', '0')}"
+
+    @property
+    def batched(self) -> bool:
+        """
+        Распознаются ли строки в общих пачках
+
+        Группировка включается при OCR_BATCH_MAX_SIZE > 1 и только для движка,
+        переопределяющего recognize_lines (пакетный вывод модели): построчному
+        движку общая пачка не дает выигрыша, а строки одного задания в ней
+        распознаются одним экземпляром вместо нескольких.
+        """
+        factory = ENGINE_FACTORIES[self.engine_name]
+        return (
+            OCR_BATCH_MAX_SIZE > 1 and isinstance(factory, type) and issubclass(factory, OCREngine)
+            and factory.recognize_lines is not OCREngine.recognize_lines
+        )
+
+    def resolve_model_type(self, model_type: str) -> str:
+        """
+        Тип модели, которой движок распознает строки запрошенного типа
+
+        Если у движка нет модели этого типа (например, рукописной у
+        tesseract), используется печатная модель с предупреждением в журнале.
+
+        Args:
+            model_type: Запрошенный тип модели
+
+        Returns:
+            Запрошенный тип или "printed"
+        """
+        supported = getattr(ENGINE_FACTORIES[self.engine_name], "model_types", None)
+        if supported is None or model_type in supported or model_type not in MODEL_TYPES:
+            return model_type
+        with self._lock:
+            warn = model_type not in self._substituted
+            self._substituted.add(model_type)
+        if warn:
+            logger.warning(
+                f"У движка OCR {self.engine_name} нет модели типа {model_type}, используется printed"
+            )
+        return "printed"
+
+    def get_pool(self, language: str, model_type: str) -> EnginePool:
+        """
+        Возвращает пул движка для пары (язык, тип модели)
+
+        Raises:
+            ValueError: Если язык или тип модели не поддерживаются
+        """
+        if language not in SUPPORTED_LANGUAGES and language != PROBE_LANGUAGE:
+            raise ValueError(f"Неподдерживаемый язык: {language}")
+        if model_type not in MODEL_TYPES:
+            raise ValueError(f"Неподдерживаемый тип модели: {model_type}")
+        model_type = self.resolve_model_type(model_type)
+        key = (language, model_type)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = EnginePool(ENGINE_FACTORIES[self.engine_name], language, model_type, self.pool_size)
+                self._pools[key] = pool
+            return pool
+
+    def recognize(self, image: Union[str, np.ndarray], language: str = "ru", model_type: str = "printed") -> str:
+        """
+        Распознает текст свободным экземпляром движка
+
+        Args:
+            image: Путь к файлу или изображение
+            language: Язык текста
+            model_type: Тип модели
+
+        Returns:
+            Распознанный текст
+        """
+        with self.get_pool(language, model_type).lease() as engine:
+            return engine.recognize(image)
+
+    def get_line_executor(self) -> ThreadPoolExecutor:
+        """Общий пул потоков построчного распознавания (создается при первом вызове)"""
+        with self._lock:
+            if self._line_executor is None:
+                self._line_executor = ThreadPoolExecutor(
+                    max_workers=max(OCR_LINE_WORKERS, 1),
+                    thread_name_prefix="ocr-line"
+                )
+            return self._line_executor
+
+    def get_batcher(self, language: str, model_type: str) -> MicroBatcher:
+        """
+        Возвращает общую очередь пачек строк для пары (язык, тип модели)
+
+        Потоков сборки столько же, сколько экземпляров в пуле движка:
+        каждая пачка распознается одним экземпляром за один вызов
+        recognize_lines.
+        """
+        pool = self.get_pool(language, model_type)
+        key = (pool.language, pool.model_type)
+
+        def run(batch: List[np.ndarray]) -> List[Tuple[str, float]]:
+            with pool.lease() as engine:
+                return engine.recognize_lines(batch)
+
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    run,
+                    max_size=OCR_BATCH_MAX_SIZE,
+                    max_wait_ms=OCR_BATCH_MAX_WAIT_MS,
+                    workers=pool.size,
+                    name=f"ocr-batch-{pool.language}-{pool.model_type}"
+                )
+                self._batchers[key] = batcher
+            return batcher
+
+    def recognize_lines(self, images: List[np.ndarray], language: str = "ru",
+                        model_type: str = "printed") -> List[Tuple[str, float]]:
+        """
+        Распознает строки пачками параллельно на нескольких экземплярах движка
+
+        Для движка с пакетным выводом при включенной группировке (см. batched)
+        строки ставятся в общую очередь пары (язык, тип модели): строки всех
+        одновременных заданий собираются в пачки до OCR_BATCH_MAX_SIZE строк с
+        ожиданием не дольше OCR_BATCH_MAX_WAIT_MS, каждая пачка распознается
+        одним вызовом движка.
+
+        Иначе строки задания делятся на пачки не больше OCR_LINE_BATCH_SIZE;
+        каждая пачка распознается одним экземпляром из пула, пачки выполняются
+        в общем пуле потоков, так что число одновременных распознаваний
+        ограничено размером пула движков.
+
+        Args:
+            images: Фрагменты страницы со строками
+            language: Язык текста
+            model_type: Тип модели
+
+        Returns:
+            Кортежи (текст, уверенность) в порядке строк
+        """
+        pool = self.get_pool(language, model_type)
+        model_type = pool.model_type
+        if not images:
+            return []
+        started = time.perf_counter()
+        if self.batched:
+            results = self.get_batcher(language, model_type).map(images)
+            self._count_lines(model_type, len(images), started)
+            return results
+
+        batch_size = min(OCR_LINE_BATCH_SIZE, math.ceil(len(images) / min(pool.size, max(OCR_LINE_WORKERS, 1))))
+        batches = [images[start:start + batch_size] for start in range(0, len(images), batch_size)]
+
+        def run(batch: List[np.ndarray]) -> List[Tuple[str, float]]:
+            with pool.lease() as engine:
+                return [engine.recognize_line(image) for image in batch]
+
+        if len(batches) == 1:
+            results = run(batches[0])
+        else:
+            results = []
+            for batch_results in self.get_line_executor().map(run, batches):
+                results.extend(batch_results)
+
+        self._count_lines(model_type, len(images), started)
+        return results
+
+    def _count_lines(self, model_type: str, lines: int, started: float) -> None:
+        """Учитывает распознанные строки в пропускной способности типа модели"""
+        with self._lock:
+            counters = self._throughput.setdefault(model_type, {"lines": 0, "busy_ms": 0.0})
+            counters["lines"] += lines
+            counters["busy_ms"] += (time.perf_counter() - started) * 1000.0
+
+    def recognize_lines_by_model(self, images: List[np.ndarray], language: str,
+                                 model_types: List[str]) -> List[Tuple[str, float]]:
+        """
+        Распознает строки, каждую своей моделью
+
+        Args:
+            images: Фрагменты страницы со строками
+            language: Язык текста
+            model_types: Тип модели для каждой строки
+
+        Returns:
+            Кортежи (текст, уверенность) в порядке строк
+        """
+        results: List[Optional[Tuple[str, float]]] = [None] * len(images)
+        groups: Dict[str, List[int]] = {}
+        for index, model_type in enumerate(model_types):
+            groups.setdefault(model_type, []).append(index)
+        for model_type, indices in groups.items():
+            group_results = self.recognize_lines([images[index] for index in indices], language, model_type)
+            for index, result in zip(indices, group_results):
+                results[index] = result
+        return results
+
+    def classify_lines(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """Определяет тип текста строк в пуле потоков строк"""
+        if len(images) <= 1:
+            return [classify_line(image) for image in images]
+        return list(self.get_line_executor().map(classify_line, images))
+
+    def preload(self, spec: str = OCR_ENGINE_PRELOAD) -> List[Dict[str, Any]]:
+        """
+        Загружает модели заранее (при запуске сервера)
+
+        Args:
+            spec: Пары "язык:тип" через запятую или "all"
+
+        Returns:
+            Статистика загруженных пулов
+        """
+        spec = (spec or "").strip()
+        if not spec:
+            return []
+        if spec == "all":
+            keys = [(language, model_type) for language in SUPPORTED_LANGUAGES for model_type in MODEL_TYPES]
+        else:
+            keys = [tuple(item.strip().split(":", 1)) for item in spec.split(",") if ":" in item]
+
+        loaded = []
+        for language, model_type in keys:
+            try:
+                pool = self.get_pool(language, model_type)
+                pool.warm_up(pool.size)
+                loaded.append(pool.get_stats())
+            except Exception as e:
+                logger.error(f"Не удалось заранее загрузить движок OCR ({language}, {model_type}): {str(e)}")
+        return loaded
+
+    def close(self) -> None:
+        """Выгружает все свободные экземпляры и останавливает пул потоков строк и очереди пачек"""
+        with self._lock:
+            pools = list(self._pools.values())
+            executor, self._line_executor = self._line_executor, None
+            batchers, self._batchers = list(self._batchers.values()), {}
+        for batcher in batchers:
+            batcher.close()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for pool in pools:
+            pool.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает сведения о движке и пулах"""
+        with self._lock:
+            pools = list(self._pools.values())
+            batchers = list(self._batchers.values())
+            throughput = {model_type: dict(counters) for model_type, counters in self._throughput.items()}
+        return {
+            "engine": self.engine_name,
+            "version": self.version,
+            "pool_size": self.pool_size,
+            "line_workers": OCR_LINE_WORKERS,
+            "line_batch_size": OCR_LINE_BATCH_SIZE,
+            "pools": [pool.get_stats() for pool in pools],
+            "batching": {
+                "enabled": self.batched,
+                "max_size": OCR_BATCH_MAX_SIZE,
+                "max_wait_ms": OCR_BATCH_MAX_WAIT_MS,
+                "queues": [batcher.get_stats() for batcher in batchers]
+            },
+            "throughput": {
+                model_type: {
+                    "lines": int(counters["lines"]),
+                    "busy_ms": round(counters["busy_ms"], 1),
+                    "lines_per_second": round(counters["lines"] * 1000.0 / counters["busy_ms"], 2) if counters["busy_ms"] else 0.0
+                }
+                for model_type, counters in throughput.items()
+            }
+        }
+
+
+# Реестр движков процесса сервера
+ocr_engines = OCREngineRegistry()
+
+# Версия движка распознавания: входит в ключ кеша OCR
+OCR_ENGINE_VERSION = ocr_engines.version
+
+
+def recognize(image: Union[str, np.ndarray], language: str = "ru", model_type: str = "printed") -> str:
+    """
+    Распознает текст движком из реестра процесса
+
+    Args:
+        image: Путь к файлу или изображение
+        language: Язык текста
+        model_type: Тип модели
+
+    Returns:
+        Распознанный текст
+    """
+    return ocr_engines.recognize(image, language, model_type)
+
+
+def detect_page_language(crops: List[np.ndarray], word_counts: List[int], line_models: List[str]) -> Dict[str, Any]:
+    """
+    Определяет язык страницы по нескольким строкам до полного распознавания
+
+    Самые длинные строки (по числу слов) распознаются многоязычной моделью,
+    язык определяется по полученному тексту.
+
+    Args:
+        crops: Фрагменты страницы со строками
+        word_counts: Число слов в каждой строке
+        line_models: Тип модели каждой строки
+
+    Returns:
+        Результат detect_language, число строк-образцов и время определения
+    """
+    started = time.perf_counter()
+    sample = sorted(sorted(range(len(crops)), key=lambda index: word_counts[index], reverse=True)[:OCR_LANGUAGE_SAMPLE_LINES])
+    texts = ocr_engines.recognize_lines_by_model(
+        [crops[index] for index in sample],
+        PROBE_LANGUAGE,
+        [line_models[index] for index in sample]
+    )
+    detection = detect_language(" ".join(text for text, _confidence in texts))
+    detection["sample_lines"] = len(sample)
+    detection["detection_ms"] = round((time.perf_counter() - started) * 1000.0, 2)
+    return detection
+
+
+def recognize_page(image: Union[str, np.ndarray], language: str = "ru", model_type: str = "printed",
+                   fallback_model_type: Optional[str] = None, confidence_threshold: float = 0.0) -> Dict[str, Any]:
+    """
+    Распознает страницу построчно: сегментация на строки и слова, затем
+    параллельное распознавание строк движком из реестра процесса
+
+    В двухуровневом режиме (задан fallback_model_type) строки, уверенность
+    которых ниже confidence_threshold, повторно распознаются более тяжелой
+    моделью; для каждой строки остается результат с большей уверенностью.
+
+    Args:
+        image: Путь к файлу или изображение страницы
+        language: Язык текста или "auto" - определить по строкам-образцам страницы
+        model_type: Тип модели первого прохода или "auto" - выбрать по типу текста каждой строки
+        fallback_model_type: Тип модели для повторного распознавания строк
+        confidence_threshold: Порог уверенности строки для повторного распознавания
+
+    Returns:
+        Словарь с текстом, блоками строк (рамки строк и слов, уверенность,
+        модель), оценками уверенности, сведениями о разметке и языком
+    """
+    page = OCREngine._as_array(image)
+    if page.ndim == 3:
+        page = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+    layout = segment_page(page)
+    lines = layout["lines"]
+    crops = [crop_line(page, line["bbox"], layout["char_height"]) for line in lines]
+
+    model_selection = None
+    styles: List[Optional[Dict[str, Any]]] = [None] * len(crops)
+    if model_type == AUTO_MODEL_TYPE:
+        started = time.perf_counter()
+        styles = ocr_engines.classify_lines(crops)
+        classified = [style["model_type"] for style in styles]
+        line_models = [ocr_engines.resolve_model_type(name) for name in classified]
+        block_models: Dict[int, set] = {}
+        for line, line_model in zip(lines, classified):
+            block_models.setdefault(line["block"], set()).add(line_model)
+        model_selection = {
+            "lines": {name: classified.count(name) for name in MODEL_TYPES if name in classified},
+            # Типы строк, для которых у движка нет модели, и модель, которой они распознаны
+            "substitutions": {
+                name: ocr_engines.resolve_model_type(name)
+                for name in set(classified) if ocr_engines.resolve_model_type(name) != name
+            },
+            # Тип области: единый тип ее строк, иначе смешанный
+            "blocks": [
+                {"block": block, "model_type": models.pop() if len(models) == 1 else "mixed"}
+                for block, models in block_models.items()
+            ],
+            "classification_ms": round((time.perf_counter() - started) * 1000.0, 2)
+        }
+    else:
+        line_models = [ocr_engines.resolve_model_type(model_type)] * len(crops)
+
+    language_detection = None
+    if language == AUTO_LANGUAGE:
+        language_detection = detect_page_language(crops, [len(line["words"]) for line in lines], line_models)
+        language = language_detection["language"]
+
+    started = time.perf_counter()
+    results = ocr_engines.recognize_lines_by_model(crops, language, line_models)
+    recognition_ms = (time.perf_counter() - started) * 1000.0
+
+    two_tier = None
+    if fallback_model_type:
+        fallback_model_type = ocr_engines.resolve_model_type(fallback_model_type)
+        started = time.perf_counter()
+        uncertain = [
+            index for index, (_text, confidence) in enumerate(results)
+            if confidence < confidence_threshold and line_models[index] != fallback_model_type
+        ]
+        retried = ocr_engines.recognize_lines(
+            [crops[index] for index in uncertain],
+            language=language,
+            model_type=fallback_model_type
+        )
+        improved = 0
+        for index, result in zip(uncertain, retried):
+            if result[1] > results[index][1]:
+                results[index] = result
+                line_models[index] = fallback_model_type
+                improved += 1
+        two_tier = {
+            "fallback_model_type": fallback_model_type,
+            "confidence_threshold": confidence_threshold,
+            "reocr_lines": len(uncertain),
+            "improved_lines": improved,
+            "reocr_ms": round((time.perf_counter() - started) * 1000.0, 2)
+        }
+
+    text_blocks = []
+    paragraphs: Dict[int, List[str]] = {}
+    for line_number, (line, (text, confidence)) in enumerate(zip(lines, results)):
+        tokens = text.split()
+        # Текст слова известен, только если движок вернул столько же слов, сколько найдено рамок
+        paired = len(tokens) == len(line["words"])
+        text_blocks.append({
+            "text": text,
+            "confidence": round(confidence, 4),
+            "bbox": line["bbox"],
+            "language": language,
+            "model_type": line_models[line_number],
+            "style_score": styles[line_number]["score"] if styles[line_number] else None,
+            "block": line["block"],
+            "line": line_number,
+            "words": [
+                {"text": tokens[index] if paired else None, "bbox": bbox}
+                for index, bbox in enumerate(line["words"])
+            ]
+        })
+        if text:
+            paragraphs.setdefault(line["block"], []).append(text)
+
+    # Уверенность страницы - среднее по строкам, взвешенное числом символов и слов
+    characters = sum(len(block["text"]) for block in text_blocks)
+    words = sum(len(block["text"].split()) for block in text_blocks)
+    by_characters = sum(block["confidence"] * len(block["text"]) for block in text_blocks) / characters if characters else 0.0
+    by_words = sum(block["confidence"] * len(block["text"].split()) for block in text_blocks) / words if words else 0.0
+
+    return {
+        "recognized_text": "\n\n".join("\n".join(texts) for texts in paragraphs.values()),
+        "text_blocks": text_blocks,
+        "confidence_scores": {
+            "overall": round(by_characters, 4),
+            "characters": round(by_characters, 4),
+            "words": round(by_words, 4)
+        },
+        "layout": {
+            "width": int(page.shape[1]),
+            "height": int(page.shape[0]),
+            "blocks": len({line["block"] for line in lines}),
+            "lines": len(lines),
+            "words": sum(len(line["words"]) for line in lines),
+            "char_height": layout["char_height"],
+            "segmentation_ms": layout["segmentation_ms"],
+            "recognition_ms": round(recognition_ms, 2)
+        },
+        "two_tier": two_tier,
+        "model_selection": model_selection,
+        "language": language,
+        "language_detection": language_detection
+    }
+
+
+def recognize_region(image: np.ndarray, region: Dict[str, int], language: str = "ru",
+                     model_type: str = "printed", fallback_model_type: Optional[str] = None,
+                     confidence_threshold: float = 0.0) -> Dict[str, Any]:
+    """
+    Распознает прямоугольную область страницы
+
+    Сегментация и распознавание выполняются только на фрагменте, поэтому
+    время зависит от размера области, а не страницы. Рамки в результате
+    даны в координатах страницы.
+
+    Args:
+        image: Изображение страницы
+        region: Рамка области {"x", "y", "width", "height"} в пикселях
+        language: Язык текста
+        model_type: Тип модели
+        fallback_model_type: Тип модели для повторного распознавания строк
+        confidence_threshold: Порог уверенности строки для повторного распознавания
+
+    Returns:
+        Результат recognize_page для области и рамка области, обрезанная по границам страницы
+
+    Raises:
+        ValueError: Если область не пересекается со страницей
+    """
+    x0 = max(int(region["x"]), 0)
+    y0 = max(int(region["y"]), 0)
+    x1 = min(int(region["x"]) + int(region["width"]), image.shape[1])
+    y1 = min(int(region["y"]) + int(region["height"]), image.shape[0])
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"Область {region} вне изображения {image.shape[1]}x{image.shape[0]}")
+
+    result = recognize_page(
+        image[y0:y1, x0:x1],
+        language=language,
+        model_type=model_type,
+        fallback_model_type=fallback_model_type,
+        confidence_threshold=confidence_threshold
+    )
+
+    def shift(bbox: Dict[str, int]) -> Dict[str, int]:
+        return dict(bbox, x=bbox["x"] + x0, y=bbox["y"] + y0)
+
+    for block in result["text_blocks"]:
+        block["bbox"] = shift(block["bbox"])
+        block["words"] = [dict(word, bbox=shift(word["bbox"])) for word in block["words"]]
+    result["region"] = {"x": x0, "y": y0, "width": x1 - x0, "height": y1 - y0}
+    return result
@@ -5,15 +5,23 @@
 
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import os
+import shutil
 import logging
 import time
 from datetime import datetime
 
 # Импортируем функции предобработки из модуля
-from image_processing import ImageProcessor
+from image_processing import (
+    ImageProcessor, load_image, save_image, get_image_size, processed_image_path,
+    TILED_THRESHOLD_MEGAPIXELS, QUALITY_ANALYZER_VERSION, PREPROCESS_VERSION
+)
+from content_hash import get_file_hash
+from result_cache import DiskLRUCache, make_cache_key
+from request_coalescing import processing_flights
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +35,7 @@ class PreprocessRequest(BaseModel):
     file_id: str
     steps: Optional[List[str]] = None
     parameters: Optional[Dict[str, Any]] = None
+    adaptive: Optional[bool] = True  # Без steps: выбрать этапы по качеству страницы
 
 class PreprocessResponse(BaseModel):
     status: str
@@ -73,6 +82,11 @@ AVAILABLE_STEPS = {
 # Глобальный процессор изображений
 image_processor = ImageProcessor()
 
+# Кеш результатов предобработки: (хеш содержимого, этапы, параметры) -> результат
+PREPROCESS_CACHE_DIR = os.getenv("PREPROCESS_CACHE_DIR", os.path.join("cache", "preprocess"))
+PREPROCESS_CACHE_MAX_BYTES = int(os.getenv("PREPROCESS_CACHE_MAX_MB", "2048")) * 1024 * 1024
+preprocess_cache = DiskLRUCache(PREPROCESS_CACHE_DIR, PREPROCESS_CACHE_MAX_BYTES, name="preprocess")
+
 @router.get("/steps")
 async def get_available_steps() -> JSONResponse:
     """
@@ -110,16 +124,55 @@ async def get_available_steps() -> JSONResponse:
             detail=f"Ошибка при получении списка этапов: {str(e)}"
         )
 
-@router.post("/process")
-async def preprocess_image(request: PreprocessRequest) -> JSONResponse:
+def _restore_cached_result(cached: Dict[str, Any], file_id: str) -> Optional[str]:
     """
-    Предобработка изображения с указанными этапами
+    Возвращает обработанное изображение из кеша как файл запрошенного file_id
+    
+    Ключ кеша зависит от содержимого, поэтому запись может принадлежать
+    другому file_id с тем же содержимым. Поиск результата (OCR, превью)
+    идет по имени processed_<file_id>_*, поэтому для чужой записи создается
+    собственный файл - жесткая ссылка на содержимое кеша или копия.
+    
+    Args:
+        cached: Запись кеша предобработки
+        file_id: Идентификатор файла запроса
+        
+    Returns:
+        Путь к обработанному изображению или None, если содержимое недоступно
+    """
+    cached_path = cached["meta"]["processed_file"]
+    if cached["meta"].get("file_id") == file_id and os.path.exists(cached_path):
+        return cached_path
+    
+    source = cached["payload_path"] or (cached_path if os.path.exists(cached_path) else None)
+    if source is None:
+        return None
+    
+    extension = os.path.splitext(cached_path)[1]
+    os.makedirs("processed", exist_ok=True)
+    # Ссылка на это содержимое, созданная при предыдущем попадании в кеш
+    prefix = f"processed_{file_id}_"
+    for filename in os.listdir("processed"):
+        path = os.path.join("processed", filename)
+        if filename.startswith(prefix) and filename.endswith(extension) and os.path.samefile(path, source):
+            return path
+    
+    processed_path = os.path.join("processed", f"{prefix}{int(time.time())}{extension}")
+    try:
+        os.link(source, processed_path)
+    except OSError:
+        shutil.copyfile(source, processed_path)
+    return processed_path
+
+def _preprocess_file(request: PreprocessRequest) -> Dict[str, Any]:
+    """
+    Выполняет предобработку файла (блокирующая часть запроса)
     
     Args:
         request: Запрос на предобработку
         
     Returns:
-        JSON с результатами обработки
+        Содержимое JSON-ответа с результатами обработки
     """
     try:
         logger.info(f"Начинаем предобработку файла: {request.file_id}")
@@ -140,8 +193,12 @@ async def preprocess_image(request: PreprocessRequest) -> JSONResponse:
                 detail="Файл не найден"
             )
         
-        # Определяем этапы обработки
-        if request.steps is None:
+        # Определяем этапы обработки: без списка этапов они выбираются
+        # анализатором качества (или берется фиксированный набор по умолчанию)
+        adaptive = request.steps is None and request.adaptive
+        if adaptive:
+            steps = ["auto", QUALITY_ANALYZER_VERSION]
+        elif request.steps is None:
             steps = [
                 "correct_perspective",
                 "align_image",
@@ -159,55 +216,127 @@ async def preprocess_image(request: PreprocessRequest) -> JSONResponse:
                 )
             steps = request.steps
         
-        # Создаем заглушку изображения для обработки
-        class MockImage:
-            def __init__(self, path: str):
-                self.path = path
-                self.name = os.path.basename(path)
-            
-            def __str__(self):
-                return f"MockImage({self.name})"
+        # Проверяем кеш: тот же файл с теми же этапами, параметрами и версией алгоритмов
+        content_hash = get_file_hash(file_path)
+        cache_key = make_cache_key(content_hash, steps, request.parameters or {}, PREPROCESS_VERSION)
+        cached = preprocess_cache.get(cache_key)
         
-        # Загружаем "изображение"
-        image = MockImage(file_path)
-        
-        # Выполняем предобработку
-        start_time = time.time()
-        processed_image = image_processor.process_document(image, steps)
-        processing_time = time.time() - start_time
+        processed_path = _restore_cached_result(cached, request.file_id) if cached is not None else None
+        if processed_path is not None:
+            logger.info(f"Результат предобработки взят из кеша: {cache_key}")
+            
+            return {
+                "status": "success",
+                "message": "Предобработка завершена успешно (результат из кеша)",
+                "data": {
+                    "file_id": request.file_id,
+                    "original_file": file_path,
+                    "processed_file": processed_path,
+                    "processing_steps": cached["meta"]["processing_steps"],
+                    "adaptive": adaptive,
+                    "quality": cached["meta"].get("quality"),
+                    "processing_time": 0.0,
+                    "processing_log": cached["meta"]["processing_log"],
+                    "execution_plan": cached["meta"].get("execution_plan", []),
+                    "step_timings": cached["meta"].get("step_timings", []),
+                    "tiling": cached["meta"].get("tiling"),
+                    "parameters": request.parameters or {},
+                    "processed_at": cached["meta"]["processed_at"],
+                    "cache": {
+                        "hit": True,
+                        "key": cache_key
+                    }
+                }
+            }
         
-        # Получаем лог обработки
-        processing_log = image_processor.get_processing_log()
+        # Очень большие сканы (карты, чертежи) обрабатываются тайлами с ограниченной памятью;
+        # файлы, размер которых не читается из заголовка (PDF, редкие TIFF), - целиком
+        image_size = get_image_size(file_path)
+        tiled = image_size is not None and image_size[0] * image_size[1] / 1e6 > TILED_THRESHOLD_MEGAPIXELS
         
-        # Генерируем имя обработанного файла
-        processed_filename = f"processed_{request.file_id}_{int(time.time())}.jpg"
+        # Генерируем имя обработанного файла (черно-белый результат
+        # сохраняется в TIFF Group 4 с заменой расширения)
+        extension = ".tif" if tiled else ".jpg"
+        processed_filename = f"processed_{request.file_id}_{int(time.time())}{extension}"
         processed_path = os.path.join("processed", processed_filename)
-        
-        # Создаем директорию для обработанных файлов
         os.makedirs("processed", exist_ok=True)
         
-        # В реальной реализации здесь будет сохранение обработанного изображения
-        # processed_image.save(processed_path)
+        # Выполняем предобработку (отдельный процессор - запросы выполняются параллельно)
+        processor = ImageProcessor()
+        start_time = time.time()
+        tiling = None
+        try:
+            if tiled:
+                tiling = processor.process_tiled(
+                    file_path, processed_path, steps, request.parameters, adaptive=adaptive
+                )
+            else:
+                image = load_image(file_path)
+                if adaptive:
+                    processed_image = processor.process_adaptive(image, request.parameters)
+                else:
+                    processed_image = processor.process_document(image, steps, request.parameters)
+                processed_path = processed_image_path(processed_image, processed_path)
+                save_image(processed_image, processed_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        processing_time = time.time() - start_time
+        
+        # Получаем лог и план выполнения (с объединенными поэлементными этапами)
+        processing_log = processor.get_processing_log()
+        execution_plan = processor.get_execution_plan()
+        step_timings = processor.get_step_timings()
+        quality = processor.get_quality_report()
+        if adaptive:
+            steps = quality["selected_steps"]
+        
+        processed_at = datetime.now().isoformat()
+        
+        # Сохраняем результат в кеш (изображение - если оно записано на диск)
+        preprocess_cache.put(
+            cache_key,
+            {
+                "file_id": request.file_id,
+                "content_hash": content_hash,
+                "processing_steps": steps,
+                "parameters": request.parameters or {},
+                "processed_file": processed_path,
+                "processing_log": processing_log,
+                "execution_plan": execution_plan,
+                "step_timings": step_timings,
+                "tiling": tiling,
+                "quality": quality,
+                "processing_time": processing_time,
+                "processed_at": processed_at
+            },
+            payload_path=processed_path
+        )
         
         logger.info(f"Предобработка завершена за {processing_time:.2f} секунд")
         
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "success",
-                "message": "Предобработка завершена успешно",
-                "data": {
-                    "file_id": request.file_id,
-                    "original_file": file_path,
-                    "processed_file": processed_path,
-                    "processing_steps": steps,
-                    "processing_time": processing_time,
-                    "processing_log": processing_log,
-                    "parameters": request.parameters or {},
-                    "processed_at": datetime.now().isoformat()
+        return {
+            "status": "success",
+            "message": "Предобработка завершена успешно",
+            "data": {
+                "file_id": request.file_id,
+                "original_file": file_path,
+                "processed_file": processed_path,
+                "processing_steps": steps,
+                "adaptive": adaptive,
+                "quality": quality,
+                "processing_time": processing_time,
+                "processing_log": processing_log,
+                "execution_plan": execution_plan,
+                "step_timings": step_timings,
+                "tiling": tiling,
+                "parameters": request.parameters or {},
+                "processed_at": processed_at,
+                "cache": {
+                    "hit": False,
+                    "key": cache_key
                 }
             }
-        )
+        }
         
     except HTTPException:
         raise
@@ -218,6 +347,30 @@ async def preprocess_image(request: PreprocessRequest) -> JSONResponse:
             detail=f"Ошибка при предобработке: {str(e)}"
         )
 
+@router.post("/process")
+async def preprocess_image(request: PreprocessRequest) -> JSONResponse:
+    """
+    Предобработка изображения с указанными этапами
+    
+    Если этапы не указаны, анализатор качества выбирает минимальный набор
+    этапов для страницы (adaptive=false - фиксированный набор по умолчанию).
+    Одновременные одинаковые запросы (тот же файл, этапы и параметры)
+    выполняются один раз и получают общий результат.
+    
+    Args:
+        request: Запрос на предобработку
+        
+    Returns:
+        JSON с результатами обработки
+    """
+    flight_key = make_cache_key("preprocess", request.model_dump())
+    content, _coalesced = await processing_flights.do(
+        flight_key,
+        "preprocess",
+        lambda: run_in_threadpool(_preprocess_file, request)
+    )
+    return JSONResponse(status_code=200, content=content)
+
 @router.post("/step/{step_name}")
 async def process_single_step(step_name: str, request: PreprocessRequest) -> JSONResponse:
     """
@@ -256,33 +409,39 @@ async def process_single_step(step_name: str, request: PreprocessRequest) -> JSO
                 detail="Файл не найден"
             )
         
-        # Создаем заглушку изображения
-        class MockImage:
-            def __init__(self, path: str):
-                self.path = path
-                self.name = os.path.basename(path)
-            
-            def __str__(self):
-                return f"MockImage({self.name})"
-        
-        image = MockImage(file_path)
-        
-        # Выполняем этап обработки
-        start_time = time.time()
-        
-        if hasattr(image_processor, step_name):
-            method = getattr(image_processor, step_name)
-            processed_image = method(image)
-        else:
+        if not hasattr(image_processor, step_name):
             raise HTTPException(
                 status_code=500,
                 detail=f"Метод обработки '{step_name}' не найден"
             )
         
+        try:
+            image = await run_in_threadpool(load_image, file_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Выполняем этап обработки (отдельный процессор - запросы выполняются параллельно)
+        processor = ImageProcessor()
+        start_time = time.time()
+        processed_image = await run_in_threadpool(
+            processor.process_document,
+            image,
+            [step_name],
+            request.parameters
+        )
         processing_time = time.time() - start_time
         
+        # Сохраняем результат этапа: имя {step}_{file_id}_... не выбирается как
+        # результат предобработки файла (см. find_processed_file)
+        os.makedirs("processed", exist_ok=True)
+        processed_path = processed_image_path(
+            processed_image,
+            os.path.join("processed", f"{step_name}_{request.file_id}_{int(time.time())}.jpg")
+        )
+        await run_in_threadpool(save_image, processed_image, processed_path)
+        
         # Получаем лог обработки
-        processing_log = image_processor.get_processing_log()
+        processing_log = processor.get_processing_log()
         
         logger.info(f"Этап '{step_name}' завершен за {processing_time:.2f} секунд")
         
@@ -295,8 +454,10 @@ async def process_single_step(step_name: str, request: PreprocessRequest) -> JSO
                     "file_id": request.file_id,
                     "step_name": step_name,
                     "step_info": AVAILABLE_STEPS[step_name],
+                    "processed_file": processed_path,
                     "processing_time": processing_time,
                     "processing_log": processing_log,
+                    "step_timings": processor.get_step_timings(),
                     "parameters": request.parameters or {},
                     "processed_at": datetime.now().isoformat()
                 }
@@ -381,6 +542,52 @@ async def get_processing_status(file_id: str) -> JSONResponse:
             detail=f"Ошибка при получении статуса: {str(e)}"
         )
 
+@router.get("/cache")
+async def get_cache_stats() -> JSONResponse:
+    """
+    Получение статистики кеша предобработки
+    
+    Returns:
+        JSON со счетчиками попаданий, промахов и заполненностью кеша
+    """
+    return JSONResponse(
+        status_code=200,
+        content={
+            "status": "success",
+            "data": preprocess_cache.get_stats()
+        }
+    )
+
+@router.delete("/cache")
+async def clear_cache() -> JSONResponse:
+    """
+    Очистка кеша предобработки
+    
+    Returns:
+        JSON с количеством удаленных записей
+    """
+    try:
+        logger.info("Очистка кеша предобработки")
+        removed = preprocess_cache.clear()
+        
+        return JSONResponse(
+            status_code=200,
+            content={
+                "status": "success",
+                "message": "Кеш предобработки очищен",
+                "data": {
+                    "removed_entries": removed
+                }
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка при очистке кеша: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при очистке кеша: {str(e)}"
+        )
+
 @router.get("/health")
 async def health_check() -> JSONResponse:
     """
@@ -396,7 +603,8 @@ async def health_check() -> JSONResponse:
             "message": "Preprocess module is working",
             "data": {
                 "available_steps": len(AVAILABLE_STEPS),
-                "processor_initialized": image_processor is not None
+                "processor_initialized": image_processor is not None,
+                "cache": preprocess_cache.get_stats()
             }
         }
     )
@@ -0,0 +1,591 @@
+"""
+Модуль предпросмотра изображений
+Миниатюры и тайлы DeepZoom с постоянным кешем на диске
+"""
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, FileResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, Iterator, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+import io
+import math
+import os
+import tempfile
+import threading
+import logging
+
+import numpy as np
+from PIL import Image
+
+from content_hash import get_file_hash
+from image_processing import TiledImageSource, find_processed_file
+from result_cache import DiskLRUCache, make_cache_key
+from request_coalescing import processing_flights
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Создаем роутер для маршрутов предпросмотра
+router = APIRouter(prefix="/preview", tags=["preview"])
+
+# Конфигурация (через переменные окружения)
+PREVIEW_CACHE_DIR = os.getenv("PREVIEW_CACHE_DIR", os.path.join("cache", "preview"))
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv("PREVIEW_CACHE_MAX_MB", "1024")) * 1024 * 1024
+PREVIEW_JPEG_QUALITY = int(os.getenv("PREVIEW_JPEG_QUALITY", "80"))
+
+# Открытые источники тайлов (отображенные в память TIFF, декодированные
+# изображения прочих форматов) для последних файлов
+PREVIEW_SOURCE_ENTRIES = int(os.getenv("PREVIEW_SOURCE_ENTRIES", "4"))
+
+# Версия формата предпросмотра: входит в ключи кеша и ETag
+PREVIEW_VERSION = "2"
+
+# Допустимые размеры миниатюр (ограничивают число вариантов в кеше)
+THUMBNAIL_SIZES = (128, 256, 512, 1024)
+DEFAULT_THUMBNAIL_SIZE = 256
+
+# Параметры пирамиды DeepZoom
+DZI_TILE_SIZE = 254
+DZI_OVERLAP = 1
+# Грубые уровни пирамиды строятся из обзорной копии не больше
+# PREVIEW_OVERVIEW_SIZE по большей стороне (один проход по исходнику полосами),
+# детальные - усреднением области исходника в полном разрешении
+PREVIEW_OVERVIEW_SIZE = int(os.getenv("PREVIEW_OVERVIEW_SIZE", "2048"))
+PREVIEW_OVERVIEW_BAND_ROWS = 256
+
+# Предпросмотр не меняется для того же содержимого: клиент может кешировать надолго
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+preview_cache = DiskLRUCache(PREVIEW_CACHE_DIR, PREVIEW_CACHE_MAX_BYTES, name="preview")
+
+
+def _find_source(file_id: str, source: str) -> Optional[str]:
+    """
+    Ищет исходный или последний обработанный файл по ID
+
+    Args:
+        file_id: ID файла
+        source: original или processed
+
+    Returns:
+        Путь к файлу или None
+    """
+    if source == "processed":
+        return find_processed_file(file_id)
+
+    upload_dir = "uploads"
+    if os.path.exists(upload_dir):
+        for filename in os.listdir(upload_dir):
+            if filename.startswith(file_id):
+                return os.path.join(upload_dir, filename)
+    return None
+
+
+def open_preview_image(file_path: str, max_size: Optional[int] = None) -> Image.Image:
+    """
+    Декодирует первую страницу файла для предпросмотра
+
+    JPEG декодируется в режиме черновика (draft): масштабирование
+    выполняется еще при декодировании DCT, поэтому миниатюра большого
+    JPEG не требует декодирования полного разрешения. PDF рендерится
+    сразу в нужном размере.
+
+    Args:
+        file_path: Путь к файлу
+        max_size: Требуемый размер по большей стороне (None - полное разрешение)
+
+    Returns:
+        Изображение PIL в режиме RGB
+    """
+    if file_path.lower().endswith(".pdf"):
+        from documents import _import_pymupdf
+        pymupdf = _import_pymupdf()
+        with pymupdf.open(file_path) as pdf:
+            page = pdf.load_page(0)
+            zoom = 300 / 72.0
+            if max_size:
+                zoom = min(zoom, max_size / max(page.rect.width, page.rect.height))
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), colorspace=pymupdf.csRGB, alpha=False)
+            return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+    image = Image.open(file_path)
+    if max_size and image.format == "JPEG":
+        image.draft("RGB", (max_size, max_size))
+    if image.mode == "I;16" or image.mode == "I":
+        image = image.point(lambda value: value / 256).convert("L")
+    return image.convert("RGB")
+
+
+def _encode_jpeg(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=PREVIEW_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _put_bytes(key: str, meta: Dict[str, Any], data: bytes) -> None:
+    """Сохраняет содержимое в кеш предпросмотра через временный файл"""
+    os.makedirs(PREVIEW_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=PREVIEW_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        preview_cache.put(key, meta, payload_path=tmp_path)
+    finally:
+        os.remove(tmp_path)
+
+
+def _thumbnail_key(content_hash: str, size: int) -> str:
+    return make_cache_key(content_hash, "thumbnail", size, PREVIEW_VERSION)
+
+
+def _tile_key(content_hash: str, level: int, column: int, row: int) -> str:
+    return make_cache_key(content_hash, "tile", level, column, row, DZI_TILE_SIZE, DZI_OVERLAP, PREVIEW_VERSION)
+
+
+def _dzi_key(content_hash: str) -> str:
+    return make_cache_key(content_hash, "dzi", DZI_TILE_SIZE, DZI_OVERLAP, PREVIEW_VERSION)
+
+
+def make_etag(content_hash: str, variant: str) -> str:
+    """
+    Формирует сильный ETag предпросмотра
+
+    Args:
+        content_hash: Хеш содержимого исходного файла
+        variant: Вариант предпросмотра (миниатюра, тайл)
+
+    Returns:
+        Значение заголовка ETag
+    """
+    return f'"{content_hash[:32]}-{variant}-v{PREVIEW_VERSION}"'
+
+
+def generate_thumbnail(file_path: str, content_hash: str, size: int) -> Dict[str, Any]:
+    """
+    Создает миниатюру и сохраняет ее в кеш
+
+    Args:
+        file_path: Путь к исходному файлу
+        content_hash: Хеш содержимого файла
+        size: Размер по большей стороне
+
+    Returns:
+        Запись кеша с путем к миниатюре
+    """
+    image = open_preview_image(file_path, size)
+    image.thumbnail((size, size), Image.LANCZOS)
+    _put_bytes(
+        _thumbnail_key(content_hash, size),
+        {"kind": "thumbnail", "content_hash": content_hash, "size": size, "width": image.width, "height": image.height},
+        _encode_jpeg(image)
+    )
+    return preview_cache.get(_thumbnail_key(content_hash, size))
+
+
+def _block_mean(region: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Уменьшает изображение в factor раз средним по блокам factor x factor
+
+    Неполные блоки у правого и нижнего края усредняются по имеющимся
+    пикселям (размер результата - с округлением вверх, как уровни DZI).
+    """
+    if factor == 1:
+        return region
+    height, width = region.shape[:2]
+    rows = np.add.reduceat(region, np.arange(0, height, factor), axis=0, dtype=np.uint32)
+    sums = np.add.reduceat(rows, np.arange(0, width, factor), axis=1, dtype=np.uint32)
+    row_counts = np.minimum(factor, height - np.arange(0, height, factor))
+    column_counts = np.minimum(factor, width - np.arange(0, width, factor))
+    counts = np.outer(row_counts, column_counts).astype(np.uint32)[:, :, None]
+    return ((sums + counts // 2) // counts).astype(np.uint8)
+
+
+class _SourceEntry:
+    """Открытый источник тайлов, его обзорная копия и число читающих его запросов"""
+
+    def __init__(self, source: TiledImageSource):
+        self.source = source
+        self.readers = 0
+        self.evicted = False
+        height, width = source.shape
+        # Обзорная копия - уровень пирамиды с масштабом overview_factor (степень двойки)
+        self.overview_factor = 1
+        while max(width, height) / self.overview_factor > PREVIEW_OVERVIEW_SIZE:
+            self.overview_factor *= 2
+        self._overview: Optional[np.ndarray] = None
+        self._overview_lock = threading.Lock()
+
+    def overview(self) -> np.ndarray:
+        """
+        Обзорная копия: исходник, уменьшенный в overview_factor раз усреднением
+
+        Строится один раз полосами по PREVIEW_OVERVIEW_BAND_ROWS строк
+        уменьшенной копии, поэтому исходник не загружается целиком.
+        """
+        with self._overview_lock:
+            if self._overview is None:
+                height, width = self.source.shape
+                factor = self.overview_factor
+                band = PREVIEW_OVERVIEW_BAND_ROWS * factor
+                self._overview = np.concatenate([
+                    _block_mean(self.source.read(top, min(top + band, height), 0, width, gray=False), factor)
+                    for top in range(0, height, band)
+                ])
+            return self._overview
+
+
+_sources: "OrderedDict[str, _SourceEntry]" = OrderedDict()
+_sources_lock = threading.Lock()
+
+
+def _open_tile_source(file_path: str) -> TiledImageSource:
+    """
+    Открывает исходник для чтения областей тайлов
+
+    TIFF и .npy читаются по частям без декодирования всего файла (источник
+    тайловой обработки), прочие форматы и PDF декодируются один раз в память.
+    """
+    if file_path.lower().endswith((".tif", ".tiff", ".npy")) and TiledImageSource._tifffile() is not None:
+        return TiledImageSource(file_path)
+    return TiledImageSource.from_array(np.asarray(open_preview_image(file_path)))
+
+
+@contextmanager
+def _lease_source(file_path: str, content_hash: str) -> Iterator[_SourceEntry]:
+    """
+    Выдает открытый источник тайлов файла
+
+    Источники последних PREVIEW_SOURCE_ENTRIES файлов остаются открытыми;
+    вытесненный источник закрывается, когда его перестают читать.
+    """
+    with _sources_lock:
+        entry = _sources.get(content_hash)
+        if entry is not None:
+            _sources.move_to_end(content_hash)
+            entry.readers += 1
+    if entry is None:
+        opened = _SourceEntry(_open_tile_source(file_path))
+        closing = []
+        with _sources_lock:
+            entry = _sources.get(content_hash)
+            if entry is None:
+                entry = _sources[content_hash] = opened
+                while len(_sources) > max(PREVIEW_SOURCE_ENTRIES, 1):
+                    _key, old = _sources.popitem(last=False)
+                    old.evicted = True
+                    if old.readers == 0:
+                        closing.append(old.source)
+            else:
+                _sources.move_to_end(content_hash)
+                closing.append(opened.source)
+            entry.readers += 1
+        for source in closing:
+            source.close()
+    try:
+        yield entry
+    finally:
+        with _sources_lock:
+            entry.readers -= 1
+            close = entry.evicted and entry.readers == 0
+        if close:
+            entry.source.close()
+
+
+def _level_size(meta: Dict[str, Any], level: int) -> Tuple[int, int]:
+    """Размер уровня пирамиды (ширина, высота): уровень max_level - полное разрешение"""
+    scale = 2 ** (meta["max_level"] - level)
+    return int(math.ceil(meta["width"] / scale)), int(math.ceil(meta["height"] / scale))
+
+
+def generate_pyramid(file_path: str, content_hash: str) -> Dict[str, Any]:
+    """
+    Описывает пирамиду тайлов DeepZoom без построения тайлов
+
+    Верхний уровень - полное разрешение, каждый следующий вдвое меньше,
+    до уровня 1x1. Тайлы строятся по запросу (generate_tile), поэтому
+    пирамида больше кеша не вытесняет сама себя.
+
+    Args:
+        file_path: Путь к исходному файлу
+        content_hash: Хеш содержимого файла
+
+    Returns:
+        Метаданные пирамиды (ширина, высота, число уровней)
+    """
+    with _lease_source(file_path, content_hash) as entry:
+        height, width = entry.source.shape
+    max_level = int(math.ceil(math.log2(max(width, height, 1))))
+    meta = {
+        "kind": "dzi",
+        "content_hash": content_hash,
+        "width": width,
+        "height": height,
+        "max_level": max_level
+    }
+    meta["tiles"] = sum(
+        int(math.ceil(level_width / DZI_TILE_SIZE)) * int(math.ceil(level_height / DZI_TILE_SIZE))
+        for level_width, level_height in (_level_size(meta, level) for level in range(max_level + 1))
+    )
+    preview_cache.put(_dzi_key(content_hash), meta)
+    logger.info(f"Пирамида предпросмотра {width}x{height}: {max_level + 1} уровней, {meta['tiles']} тайлов")
+    return meta
+
+
+def generate_tile(file_path: str, content_hash: str, meta: Dict[str, Any],
+                  level: int, column: int, row: int) -> Dict[str, Any]:
+    """
+    Строит один тайл DeepZoom из области исходника и сохраняет его в кеш
+
+    Область уровня пересчитывается в пиксели полного разрешения (или
+    обзорной копии для грубых уровней) и уменьшается усреднением блоков.
+
+    Args:
+        file_path: Путь к исходному файлу
+        content_hash: Хеш содержимого файла
+        meta: Метаданные пирамиды
+        level, column, row: Уровень, столбец и строка тайла
+
+    Returns:
+        Запись кеша с путем к тайлу
+    """
+    scale = 2 ** (meta["max_level"] - level)
+    level_width, level_height = _level_size(meta, level)
+    left = max(column * DZI_TILE_SIZE - DZI_OVERLAP, 0)
+    top = max(row * DZI_TILE_SIZE - DZI_OVERLAP, 0)
+    right = min((column + 1) * DZI_TILE_SIZE + DZI_OVERLAP, level_width)
+    bottom = min((row + 1) * DZI_TILE_SIZE + DZI_OVERLAP, level_height)
+
+    with _lease_source(file_path, content_hash) as entry:
+        if entry.overview_factor > 1 and scale >= entry.overview_factor:
+            factor = scale // entry.overview_factor
+            region = entry.overview()[top * factor:bottom * factor, left * factor:right * factor]
+        else:
+            factor = scale
+            region = entry.source.read(
+                top * scale, min(bottom * scale, meta["height"]),
+                left * scale, min(right * scale, meta["width"]),
+                gray=False
+            )
+    tile = Image.fromarray(_block_mean(region, factor))
+
+    key = _tile_key(content_hash, level, column, row)
+    _put_bytes(
+        key,
+        {"kind": "tile", "content_hash": content_hash, "level": level, "column": column, "row": row},
+        _encode_jpeg(tile)
+    )
+    return preview_cache.get(key)
+
+
+async def _resolve_source(file_id: str, source: str) -> Tuple[str, str]:
+    """Находит файл и вычисляет хеш его содержимого"""
+    if source not in ("original", "processed"):
+        raise HTTPException(status_code=400, detail=f"Неизвестный источник: {source}")
+    file_path = _find_source(file_id, source)
+    if not file_path or not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    content_hash = await run_in_threadpool(get_file_hash, file_path)
+    return file_path, content_hash
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """Проверяет условный запрос If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [value.strip() for value in header.split(",")]
+
+
+def _image_response(request: Request, payload_path: str, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(payload_path, media_type="image/jpeg", headers=headers)
+
+
+def _tile_exists(meta: Dict[str, Any], level: int, column: int, row: int) -> bool:
+    """Проверяет, что тайл входит в пирамиду с данными метаданными"""
+    if not 0 <= level <= meta["max_level"] or column < 0 or row < 0:
+        return False
+    level_width, level_height = _level_size(meta, level)
+    return column < math.ceil(level_width / DZI_TILE_SIZE) and row < math.ceil(level_height / DZI_TILE_SIZE)
+
+
+async def _get_pyramid(file_path: str, content_hash: str) -> Dict[str, Any]:
+    """Возвращает метаданные пирамиды, определяя их при первом обращении"""
+    entry = preview_cache.get(_dzi_key(content_hash))
+    if entry is not None:
+        return entry["meta"]
+    meta, _coalesced = await processing_flights.do(
+        _dzi_key(content_hash),
+        "preview",
+        lambda: run_in_threadpool(generate_pyramid, file_path, content_hash)
+    )
+    return meta
+
+
+@router.get("/health")
+async def health_check() -> JSONResponse:
+    """
+    Проверка состояния модуля предпросмотра
+
+    Returns:
+        JSON со статусом модуля
+    """
+    return JSONResponse(
+        status_code=200,
+        content={
+            "status": "ok",
+            "message": "Preview module is working",
+            "data": {
+                "cache": preview_cache.get_stats()
+            }
+        }
+    )
+
+
+@router.get("/{file_id}")
+@router.get("/{file_id}/thumbnail")
+async def get_thumbnail(
+    request: Request,
+    file_id: str,
+    size: int = DEFAULT_THUMBNAIL_SIZE,
+    source: str = "original"
+) -> Response:
+    """
+    Получение миниатюры документа
+
+    Миниатюра создается один раз и хранится в кеше; повторные запросы
+    с тем же ETag получают 304 без тела.
+
+    Args:
+        file_id: ID файла
+        size: Размер по большей стороне (128, 256, 512, 1024)
+        source: original - исходный файл, processed - последний обработанный
+
+    Returns:
+        JPEG миниатюры
+    """
+    try:
+        if size not in THUMBNAIL_SIZES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Недопустимый размер миниатюры. Разрешены: {', '.join(map(str, THUMBNAIL_SIZES))}"
+            )
+
+        file_path, content_hash = await _resolve_source(file_id, source)
+        etag = make_etag(content_hash, f"thumb{size}")
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        entry = preview_cache.get(_thumbnail_key(content_hash, size))
+        if entry is None or entry["payload_path"] is None:
+            entry, _coalesced = await processing_flights.do(
+                _thumbnail_key(content_hash, size),
+                "preview",
+                lambda: run_in_threadpool(generate_thumbnail, file_path, content_hash, size)
+            )
+
+        return _image_response(request, entry["payload_path"], etag)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при создании миниатюры {file_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при создании миниатюры: {str(e)}"
+        )
+
+
+@router.get("/{file_id}/dzi")
+async def get_dzi_descriptor(request: Request, file_id: str, source: str = "original") -> Response:
+    """
+    Получение дескриптора DeepZoom (DZI) для просмотрщика
+
+    Args:
+        file_id: ID файла
+        source: original или processed
+
+    Returns:
+        XML дескриптор пирамиды тайлов
+    """
+    try:
+        file_path, content_hash = await _resolve_source(file_id, source)
+        etag = make_etag(content_hash, "dzi")
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        meta = await _get_pyramid(file_path, content_hash)
+        descriptor = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="jpg" '
+            f'Overlap="{DZI_OVERLAP}" TileSize="{DZI_TILE_SIZE}">'
+            f'<Size Width="{meta["width"]}" Height="{meta["height"]}"/></Image>'
+        )
+        return Response(content=descriptor, media_type="application/xml", headers=headers)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при построении пирамиды {file_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при построении пирамиды: {str(e)}"
+        )
+
+
+@router.get("/{file_id}/tiles/{level}/{tile_name}")
+async def get_tile(request: Request, file_id: str, level: int, tile_name: str, source: str = "original") -> Response:
+    """
+    Получение тайла DeepZoom
+
+    Args:
+        file_id: ID файла
+        level: Уровень пирамиды
+        tile_name: Имя тайла вида {столбец}_{строка}.jpg
+        source: original или processed
+
+    Returns:
+        JPEG тайла
+    """
+    try:
+        try:
+            column, row = (int(value) for value in tile_name.rsplit(".", 1)[0].split("_"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Некорректное имя тайла: {tile_name}")
+
+        file_path, content_hash = await _resolve_source(file_id, source)
+        etag = make_etag(content_hash, f"tile{level}-{column}-{row}")
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        key = _tile_key(content_hash, level, column, row)
+        entry = preview_cache.get(key)
+        if entry is None:
+            # Тайл строится при первом запросе (или после вытеснения из кеша)
+            meta = await _get_pyramid(file_path, content_hash)
+            if not _tile_exists(meta, level, column, row):
+                raise HTTPException(status_code=404, detail="Тайл не найден")
+            entry, _coalesced = await processing_flights.do(
+                key,
+                "preview",
+                lambda: run_in_threadpool(generate_tile, file_path, content_hash, meta, level, column, row)
+            )
+            if entry is None:
+                raise HTTPException(status_code=404, detail="Тайл не найден")
+
+        return _image_response(request, entry["payload_path"], etag)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при получении тайла {file_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка при получении тайла: {str(e)}"
+        )
@@ -13,6 +13,8 @@ import time
 import json
 from datetime import datetime
 
+from image_processing import find_processed_file
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -273,16 +275,13 @@ async def _collect_file_data(file_id: str, request: ReportRequest) -> Optional[D
                     }
                     break
         
-        # Ищем обработанный файл
-        processed_dir = "processed"
-        if os.path.exists(processed_dir):
-            for filename in os.listdir(processed_dir):
-                if file_id in filename:
-                    file_data["processed_file"] = {
-                        "filename": filename,
-                        "path": os.path.join(processed_dir, filename)
-                    }
-                    break
+        # Ищем последний обработанный файл
+        processed_path = find_processed_file(file_id)
+        if processed_path is not None:
+            file_data["processed_file"] = {
+                "filename": os.path.basename(processed_path),
+                "path": processed_path
+            }
         
         # Ищем результат OCR
         if request.include_ocr_text:
@@ -0,0 +1,89 @@
+"""
+Модуль объединения одинаковых запросов
+Одновременные идентичные запросы выполняются один раз, результат получают все
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from collections import defaultdict
+import asyncio
+import logging
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Объединение одновременных идентичных вызовов (single-flight)
+
+    Первый запрос с данным ключом (ведущий) запускает вычисление отдельной
+    задачей, последующие запросы с тем же ключом (ведомые) ожидают ту же
+    задачу и получают тот же результат или то же исключение. Отмена одного
+    из ожидающих (например, при разрыве соединения) не прерывает вычисление
+    для остальных.
+
+    Объединение действует в пределах одного процесса (event loop).
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, "asyncio.Task[Any]"] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            "executed": 0,
+            "coalesced": 0,
+            "errors": 0
+        })
+
+    async def do(
+        self,
+        key: str,
+        endpoint: str,
+        func: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Выполняет вычисление или присоединяется к уже выполняющемуся
+
+        Args:
+            key: Ключ идентичности запроса (эндпоинт, file_id, параметры)
+            endpoint: Название эндпоинта для метрик
+            func: Фабрика корутины, выполняющей вычисление
+
+        Returns:
+            Кортеж (результат, признак присоединения к чужому вычислению)
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._stats[endpoint]["coalesced"] += 1
+            logger.info(f"Запрос к '{endpoint}' объединен с уже выполняющимся")
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = task
+        self._stats[endpoint]["executed"] += 1
+        task.add_done_callback(lambda done: self._finish(key, endpoint, done))
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: str, endpoint: str, task: "asyncio.Task[Any]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Помечаем исключение как полученное, даже если ожидающих не осталось
+        if not task.cancelled() and task.exception() is not None:
+            self._stats[endpoint]["errors"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает метрики объединения по эндпоинтам"""
+        endpoints = {name: dict(counters) for name, counters in self._stats.items()}
+        total_executed = sum(item["executed"] for item in endpoints.values())
+        total_coalesced = sum(item["coalesced"] for item in endpoints.values())
+        total_requests = total_executed + total_coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "total_executed": total_executed,
+            "total_coalesced": total_coalesced,
+            "coalesced_ratio": round(total_coalesced / total_requests, 4) if total_requests else 0.0,
+            "endpoints": endpoints
+        }
+
+
+# Общий объединитель для тяжелых эндпоинтов обработки
+processing_flights = SingleFlight()
@@ -0,0 +1,389 @@
+"""
+Модуль кеширования результатов обработки
+Кеши в памяти и на диске с вытеснением по давности использования (LRU)
+"""
+
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import logging
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+META_FILENAME = "meta.json"
+PAYLOAD_FILENAME = "payload"
+
+
+def canonicalize_parameters(value: Any) -> Any:
+    """
+    Приводит параметры к каноническому виду для построения ключа
+
+    Словари сортируются по ключам, целые значения с плавающей точкой
+    приводятся к int, значения None в словарях отбрасываются.
+
+    Args:
+        value: Параметры (словарь, список или скаляр)
+
+    Returns:
+        Канонизированные параметры
+    """
+    if isinstance(value, dict):
+        return {
+            str(key): canonicalize_parameters(item)
+            for key, item in sorted(value.items(), key=lambda pair: str(pair[0]))
+            if item is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [canonicalize_parameters(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Строит ключ кеша из набора составляющих
+
+    Args:
+        parts: Составляющие ключа (хеши, списки этапов, параметры)
+
+    Returns:
+        SHA-256 канонического JSON-представления составляющих
+    """
+    canonical = json.dumps(
+        canonicalize_parameters(list(parts)),
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DiskLRUCache:
+    """
+    Дисковый кеш с LRU-вытеснением
+
+    Каждая запись хранится в отдельном каталоге: метаданные в meta.json
+    и необязательный файл с содержимым. Суммарный размер записей
+    ограничен max_bytes, при превышении удаляются давно не использованные.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, name: str = "cache"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        # Ключ -> размер записи в байтах; порядок - от давних к свежим
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "puts": 0,
+            "evictions": 0
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_existing()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_existing(self) -> None:
+        """Восстанавливает порядок LRU по времени последнего обращения"""
+        found = []
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                entry_dir = os.path.join(shard_dir, key)
+                meta_path = os.path.join(entry_dir, META_FILENAME)
+                if not os.path.exists(meta_path):
+                    # Незавершенная запись - удаляем
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+                size = sum(
+                    os.path.getsize(os.path.join(entry_dir, filename))
+                    for filename in os.listdir(entry_dir)
+                )
+                found.append((os.path.getmtime(meta_path), key, size))
+
+        for _mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+        if found:
+            logger.info(f"Кеш '{self.name}': восстановлено {len(found)} записей ({self._total_bytes} bytes)")
+        self._evict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Получает запись из кеша
+
+        Args:
+            key: Ключ записи
+
+        Returns:
+            Словарь {"meta": ..., "payload_path": ...} или None при промахе
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return None
+
+            entry_dir = self._entry_dir(key)
+            meta_path = os.path.join(entry_dir, META_FILENAME)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                # mtime метаданных хранит время последнего обращения
+                os.utime(meta_path, None)
+            except (OSError, ValueError):
+                self._remove(key)
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+
+        payload_path = os.path.join(entry_dir, PAYLOAD_FILENAME)
+        return {
+            "meta": meta,
+            "payload_path": payload_path if os.path.exists(payload_path) else None
+        }
+
+    def put(self, key: str, meta: Dict[str, Any], payload_path: Optional[str] = None) -> None:
+        """
+        Сохраняет запись в кеш
+
+        Args:
+            key: Ключ записи
+            meta: JSON-сериализуемые метаданные результата
+            payload_path: Путь к файлу с содержимым (копируется в кеш)
+        """
+        shard_dir = os.path.join(self.cache_dir, key[:2])
+        os.makedirs(shard_dir, exist_ok=True)
+        tmp_dir = os.path.join(shard_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+
+        try:
+            size = 0
+            if payload_path:
+                tmp_payload = os.path.join(tmp_dir, PAYLOAD_FILENAME)
+                shutil.copyfile(payload_path, tmp_payload)
+                size += os.path.getsize(tmp_payload)
+
+            meta = dict(meta, cached_at=time.time())
+            tmp_meta = os.path.join(tmp_dir, META_FILENAME)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            size += os.path.getsize(tmp_meta)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        if size > self.max_bytes:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.warning(f"Кеш '{self.name}': запись {key} больше лимита кеша и не сохранена")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            os.rename(tmp_dir, self._entry_dir(key))
+            self._entries[key] = size
+            self._total_bytes += size
+            self.stats["puts"] += 1
+            self._evict()
+
+    def invalidate(self, key: str) -> None:
+        """Удаляет запись из кеша"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> int:
+        """
+        Полностью очищает кеш
+
+        Returns:
+            Количество удаленных записей
+        """
+        with self._lock:
+            removed = len(self._entries)
+            for key in list(self._entries.keys()):
+                self._remove(key)
+            return removed
+
+    def _remove(self, key: str) -> None:
+        size = self._entries.pop(key, 0)
+        self._total_bytes -= size
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики и заполненность кеша"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            **self.stats
+        }
+
+
+class MemoryLRUCache:
+    """
+    Кеш в памяти процесса с LRU-вытеснением по количеству записей
+
+    При заданном max_bytes учитывается и объем записей (атрибут nbytes
+    значения, например у массивов NumPy): вытесняются давно не использованные
+    записи, пока суммарный объем не уложится в предел.
+    """
+
+    def __init__(self, max_entries: int, name: str = "memory", max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._size_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "puts": 0,
+            "evictions": 0
+        }
+
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        return int(getattr(value, "nbytes", 0))
+
+    def get(self, key: str) -> Optional[Any]:
+        """Получает значение из кеша или None при промахе"""
+        with self._lock:
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        """Сохраняет значение в кеш"""
+        with self._lock:
+            if key in self._entries:
+                self._size_bytes -= self._sizeof(self._entries[key])
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._size_bytes += self._sizeof(value)
+            self.stats["puts"] += 1
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._size_bytes > self.max_bytes and len(self._entries) > 1
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= self._sizeof(evicted)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, key: str) -> None:
+        """Удаляет запись из кеша"""
+        with self._lock:
+            if key in self._entries:
+                self._size_bytes -= self._sizeof(self._entries.pop(key))
+
+    def clear(self) -> int:
+        """Полностью очищает кеш и возвращает количество удаленных записей"""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._size_bytes = 0
+            return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики и заполненность кеша"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        stats = {
+            "name": self.name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            **self.stats
+        }
+        if self.max_bytes is not None:
+            stats["size_bytes"] = self._size_bytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+class TieredCache:
+    """
+    Двухуровневый кеш метаданных: память процесса и диск
+
+    Повторы обслуживаются из памяти; записи, найденные только на диске
+    (например, после перезапуска), поднимаются в память. Вызывающему коду
+    отдаются копии: изменения результата не попадают в кеш.
+    """
+
+    def __init__(self, memory: MemoryLRUCache, disk: DiskLRUCache):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Получает метаданные записи
+
+        Args:
+            key: Ключ записи
+
+        Returns:
+            Копия метаданных записи или None при промахе на обоих уровнях
+        """
+        meta = self.memory.get(key)
+        if meta is not None:
+            return copy.deepcopy(meta)
+
+        entry = self.disk.get(key)
+        if entry is None:
+            return None
+
+        self.memory.put(key, entry["meta"])
+        return copy.deepcopy(entry["meta"])
+
+    def put(self, key: str, meta: Dict[str, Any]) -> None:
+        """Сохраняет метаданные записи на обоих уровнях"""
+        self.memory.put(key, copy.deepcopy(meta))
+        self.disk.put(key, meta)
+
+    def invalidate(self, key: str) -> None:
+        """Удаляет запись на обоих уровнях"""
+        self.memory.invalidate(key)
+        self.disk.invalidate(key)
+
+    def clear(self) -> int:
+        """Очищает оба уровня и возвращает количество удаленных записей на диске"""
+        self.memory.clear()
+        return self.disk.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает статистику обоих уровней"""
+        return {
+            "memory": self.memory.get_stats(),
+            "disk": self.disk.get_stats()
+        }
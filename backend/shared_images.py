@@ -0,0 +1,388 @@
+"""
+Модуль передачи изображений между процессами через общую память
+Вместо копии изображения (pickle) передается небольшой дескриптор буфера
+"""
+
+import os
+import uuid
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Бюджет памяти под общие буферы изображений: выделение сверх бюджета
+# ждет освобождения буферов не дольше SHARED_IMAGE_WAIT_SECONDS
+SHARED_IMAGE_BUDGET_MB = int(os.getenv("SHARED_IMAGE_BUDGET_MB", "1024"))
+SHARED_IMAGE_WAIT_SECONDS = float(os.getenv("SHARED_IMAGE_WAIT_SECONDS", "30"))
+
+# Способ хранения буферов: shm - POSIX shared memory (/dev/shm), mmap - файлы,
+# отображенные в память (для контейнеров с маленьким /dev/shm), auto - shm
+# с переходом на mmap, если выделить общую память не удалось
+SHARED_IMAGE_BACKEND = os.getenv("SHARED_IMAGE_BACKEND", "auto")
+SHARED_IMAGE_SCRATCH_DIR = os.getenv("SHARED_IMAGE_SCRATCH_DIR", os.path.join("cache", "shared"))
+
+
+class SharedImageDescriptor:
+    """
+    Дескриптор изображения в общем буфере
+
+    Сериализуется в несколько десятков байт и передается между процессами
+    вместо самого изображения.
+    """
+
+    __slots__ = ("name", "shape", "dtype", "backend")
+
+    def __init__(self, name: str, shape: Tuple[int, ...], dtype: str, backend: str):
+        self.name = name
+        self.shape = tuple(int(size) for size in shape)
+        self.dtype = str(dtype)
+        self.backend = backend
+
+    def __getstate__(self) -> Tuple[str, Tuple[int, ...], str, str]:
+        return self.name, self.shape, self.dtype, self.backend
+
+    def __setstate__(self, state: Tuple[str, Tuple[int, ...], str, str]) -> None:
+        self.name, self.shape, self.dtype, self.backend = state
+
+    @property
+    def nbytes(self) -> int:
+        """Размер буфера в байтах"""
+        return int(np.prod(self.shape, dtype=np.int64)) * np.dtype(self.dtype).itemsize
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Описание дескриптора для логов и ответов API"""
+        return {
+            "name": self.name,
+            "shape": list(self.shape),
+            "dtype": self.dtype,
+            "backend": self.backend,
+            "nbytes": self.nbytes
+        }
+
+    def __repr__(self) -> str:
+        return f"SharedImageDescriptor({self.name!r}, shape={self.shape}, dtype={self.dtype}, backend={self.backend})"
+
+
+def _create_buffer(
+    shape: Tuple[int, ...],
+    dtype: np.dtype,
+    backend: str,
+    scratch_dir: str
+) -> Tuple[SharedImageDescriptor, Any, np.ndarray]:
+    """
+    Создает общий буфер под изображение
+
+    Returns:
+        Кортеж (дескриптор, дескриптор ОС буфера, массив поверх буфера)
+    """
+    dtype = np.dtype(dtype)
+    nbytes = max(int(np.prod(shape, dtype=np.int64)) * dtype.itemsize, 1)
+
+    if backend in ("auto", "shm"):
+        try:
+            handle = shared_memory.SharedMemory(create=True, size=nbytes, name=f"img_{uuid.uuid4().hex[:20]}")
+            descriptor = SharedImageDescriptor(handle.name, shape, dtype.str, "shm")
+            return descriptor, handle, np.ndarray(shape, dtype=dtype, buffer=handle.buf)
+        except OSError as e:
+            if backend == "shm":
+                raise
+            logger.warning(f"Общая память недоступна ({str(e)}), буфер создается в файле")
+
+    os.makedirs(scratch_dir, exist_ok=True)
+    path = os.path.abspath(os.path.join(scratch_dir, f"img_{uuid.uuid4().hex}.bin"))
+    array = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+    return SharedImageDescriptor(path, shape, dtype.str, "mmap"), None, array
+
+
+def _free_buffer(descriptor: SharedImageDescriptor, handle: Any) -> None:
+    """Удаляет общий буфер (открытые в других процессах отображения остаются действительными)"""
+    if descriptor.backend == "shm":
+        if handle is None:
+            handle = shared_memory.SharedMemory(name=descriptor.name)
+        handle.unlink()
+        try:
+            handle.close()
+        except BufferError:
+            # Массив поверх буфера еще используется - память освободится вместе с ним
+            pass
+    elif os.path.exists(descriptor.name):
+        os.remove(descriptor.name)
+
+
+@contextmanager
+def attach_shared_image(descriptor: SharedImageDescriptor, writable: bool = False) -> Iterator[np.ndarray]:
+    """
+    Открывает изображение из общего буфера без копирования
+
+    Используется в процессе-обработчике. Массив действителен только
+    внутри блока with: для сохранения результата его нужно скопировать.
+
+    Args:
+        descriptor: Дескриптор буфера
+        writable: Разрешить запись в буфер
+
+    Yields:
+        Массив NumPy поверх общего буфера
+    """
+    if descriptor.backend == "shm":
+        handle = shared_memory.SharedMemory(name=descriptor.name)
+        array = np.ndarray(descriptor.shape, dtype=np.dtype(descriptor.dtype), buffer=handle.buf)
+        array.flags.writeable = writable
+        try:
+            yield array
+        finally:
+            del array
+            try:
+                handle.close()
+            except BufferError:
+                logger.warning(f"Ссылка на буфер {descriptor.name} сохранена после выхода из блока")
+    else:
+        array = np.memmap(
+            descriptor.name,
+            dtype=np.dtype(descriptor.dtype),
+            mode="r+" if writable else "r",
+            shape=descriptor.shape
+        )
+        try:
+            yield array
+        finally:
+            if writable:
+                array.flush()
+            del array
+
+
+def export_shared_image(image: np.ndarray, backend: Optional[str] = None) -> SharedImageDescriptor:
+    """
+    Копирует изображение в новый общий буфер для передачи в другой процесс
+
+    Используется в процессе-обработчике для возврата результата.
+    Буфер не учитывается в бюджете, пока получатель не примет его
+    в хранилище (SharedImageStore.adopt) - после этого за освобождение
+    отвечает хранилище.
+
+    Args:
+        image: Изображение
+        backend: Способ хранения (по умолчанию SHARED_IMAGE_BACKEND)
+
+    Returns:
+        Дескриптор созданного буфера
+    """
+    descriptor, handle, array = _create_buffer(
+        image.shape, image.dtype, backend or SHARED_IMAGE_BACKEND, SHARED_IMAGE_SCRATCH_DIR
+    )
+    array[...] = image
+    if descriptor.backend == "mmap":
+        array.flush()
+    del array
+    if handle is not None:
+        handle.close()
+    return descriptor
+
+
+class SharedImageStore:
+    """
+    Хранилище общих буферов изображений с подсчетом ссылок
+
+    Владелец буферов - процесс, создавший хранилище. Каждый буфер
+    освобождается, когда счетчик ссылок доходит до нуля. Суммарный размер
+    буферов ограничен бюджетом: выделение сверх бюджета ждет освобождения
+    других буферов, что ограничивает число изображений в обработке.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: Optional[int] = None,
+        backend: Optional[str] = None,
+        scratch_dir: Optional[str] = None,
+        name: str = "shared_images"
+    ):
+        self.budget_bytes = budget_bytes if budget_bytes is not None else SHARED_IMAGE_BUDGET_MB * 1024 * 1024
+        self.backend = backend or SHARED_IMAGE_BACKEND
+        self.scratch_dir = scratch_dir or SHARED_IMAGE_SCRATCH_DIR
+        self.name = name
+        self._condition = threading.Condition()
+        self._blocks: Dict[str, Dict[str, Any]] = {}
+        self._used_bytes = 0
+        self.stats = {
+            "allocations": 0,
+            "adopted": 0,
+            "released": 0,
+            "waits": 0,
+            "peak_bytes": 0
+        }
+
+    def _reserve(self, nbytes: int, timeout: Optional[float]) -> None:
+        """Резервирует место в бюджете, при необходимости ожидая освобождения буферов"""
+        if nbytes > self.budget_bytes:
+            raise MemoryError(
+                f"Изображение {nbytes // (1024 * 1024)} MB больше бюджета общей памяти "
+                f"{self.budget_bytes // (1024 * 1024)} MB"
+            )
+        timeout = SHARED_IMAGE_WAIT_SECONDS if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        if self._used_bytes + nbytes > self.budget_bytes:
+            self.stats["waits"] += 1
+        while self._used_bytes + nbytes > self.budget_bytes:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._condition.wait(remaining):
+                if self._used_bytes + nbytes > self.budget_bytes:
+                    raise MemoryError(
+                        f"Бюджет общей памяти исчерпан: занято {self._used_bytes // (1024 * 1024)} MB "
+                        f"из {self.budget_bytes // (1024 * 1024)} MB"
+                    )
+        self._account(nbytes)
+
+    def _account(self, nbytes: int) -> None:
+        self._used_bytes += nbytes
+        self.stats["peak_bytes"] = max(self.stats["peak_bytes"], self._used_bytes)
+
+    def allocate(
+        self,
+        shape: Tuple[int, ...],
+        dtype: Any = np.uint8,
+        refs: int = 1,
+        timeout: Optional[float] = None
+    ) -> Tuple[SharedImageDescriptor, np.ndarray]:
+        """
+        Выделяет общий буфер, в который изображение можно записать напрямую
+
+        Args:
+            shape: Форма изображения
+            dtype: Тип элементов
+            refs: Начальное число ссылок
+            timeout: Предельное ожидание места в бюджете в секундах
+
+        Returns:
+            Кортеж (дескриптор, массив поверх буфера)
+        """
+        nbytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        with self._condition:
+            self._reserve(nbytes, timeout)
+        try:
+            descriptor, handle, array = _create_buffer(shape, dtype, self.backend, self.scratch_dir)
+        except Exception:
+            with self._condition:
+                self._used_bytes -= nbytes
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            self._blocks[descriptor.name] = {"descriptor": descriptor, "handle": handle, "refs": refs}
+            self.stats["allocations"] += 1
+        return descriptor, array
+
+    def put(self, image: np.ndarray, refs: int = 1, timeout: Optional[float] = None) -> SharedImageDescriptor:
+        """
+        Копирует изображение в общий буфер (единственная копия при передаче)
+
+        Args:
+            image: Изображение
+            refs: Начальное число ссылок
+            timeout: Предельное ожидание места в бюджете в секундах
+
+        Returns:
+            Дескриптор буфера
+        """
+        descriptor, array = self.allocate(image.shape, image.dtype, refs, timeout)
+        array[...] = image
+        return descriptor
+
+    def adopt(self, descriptor: SharedImageDescriptor, refs: int = 1) -> SharedImageDescriptor:
+        """
+        Принимает во владение буфер, созданный другим процессом (export_shared_image)
+
+        Буфер уже существует, поэтому он учитывается в бюджете без ожидания.
+
+        Args:
+            descriptor: Дескриптор буфера
+            refs: Начальное число ссылок
+
+        Returns:
+            Тот же дескриптор
+        """
+        with self._condition:
+            self._account(descriptor.nbytes)
+            self._blocks[descriptor.name] = {"descriptor": descriptor, "handle": None, "refs": refs}
+            self.stats["adopted"] += 1
+            if self._used_bytes > self.budget_bytes:
+                logger.warning(f"Принятый буфер {descriptor.name} превысил бюджет общей памяти")
+        return descriptor
+
+    def acquire(self, descriptor: SharedImageDescriptor) -> SharedImageDescriptor:
+        """Добавляет ссылку на буфер (например, перед передачей второму обработчику)"""
+        with self._condition:
+            block = self._blocks.get(descriptor.name)
+            if block is None:
+                raise KeyError(f"Буфер {descriptor.name} уже освобожден")
+            block["refs"] += 1
+        return descriptor
+
+    def release(self, descriptor: SharedImageDescriptor) -> None:
+        """Снимает ссылку на буфер и освобождает его, если ссылок не осталось"""
+        with self._condition:
+            block = self._blocks.get(descriptor.name)
+            if block is None:
+                return
+            block["refs"] -= 1
+            if block["refs"] > 0:
+                return
+            del self._blocks[descriptor.name]
+        try:
+            _free_buffer(block["descriptor"], block["handle"])
+        except FileNotFoundError:
+            pass
+        with self._condition:
+            self._used_bytes -= descriptor.nbytes
+            self.stats["released"] += 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def lease(self, image: np.ndarray, timeout: Optional[float] = None) -> Iterator[SharedImageDescriptor]:
+        """
+        Размещает изображение в общем буфере на время блока with
+
+        Yields:
+            Дескриптор буфера (освобождается при выходе из блока)
+        """
+        descriptor = self.put(image, timeout=timeout)
+        try:
+            yield descriptor
+        finally:
+            self.release(descriptor)
+
+    def close(self) -> None:
+        """Освобождает все буферы независимо от числа ссылок"""
+        with self._condition:
+            blocks = list(self._blocks.values())
+            self._blocks.clear()
+        for block in blocks:
+            try:
+                _free_buffer(block["descriptor"], block["handle"])
+            except FileNotFoundError:
+                pass
+        with self._condition:
+            self._used_bytes = 0
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает занятость бюджета и счетчики операций"""
+        with self._condition:
+            return {
+                "name": self.name,
+                "backend": self.backend,
+                "buffers": len(self._blocks),
+                "used_bytes": self._used_bytes,
+                "budget_bytes": self.budget_bytes,
+                **self.stats
+            }
+
+
+# Общее хранилище процесса сервера
+shared_images = SharedImageStore()
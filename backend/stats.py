@@ -14,6 +14,10 @@ import json
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from request_coalescing import processing_flights
+from structured_results import read_result_meta, structured_result_path
+from language_detection import AUTO_LANGUAGE
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -396,10 +400,14 @@ async def _get_ocr_stats(period: str = "week", start_date: str = None, end_date:
                     ocr_count += 1
                     file_path = os.path.join(ocr_results_dir, filename)
                     with open(file_path, "r", encoding="utf-8") as f:
-                        text = f.read()
-                        total_text_length += len(text)
-                        # В реальной реализации здесь будет определение языка
-                        languages["ru"] += 1
+                        total_text_length += len(f.read())
+                    # Язык, определенный при распознавании, хранится в структурированном результате
+                    file_id, _, timestamp = filename[len("ocr_result_"):-len(".txt")].rpartition("_")
+                    structured_path = structured_result_path(file_id, timestamp)
+                    language = None
+                    if filename.startswith("ocr_result_") and os.path.exists(structured_path):
+                        language = read_result_meta(structured_path).get("language")
+                    languages[language if language and language != AUTO_LANGUAGE else "unknown"] += 1
         
         return {
             "total_ocr_results": ocr_count,
@@ -499,7 +507,8 @@ async def _get_performance_stats(period: str = "week", start_date: str = None, e
             "memory_usage": 512.3,
             "disk_usage": 1024.7,
             "active_connections": 12,
-            "queue_length": 3
+            "queue_length": 3,
+            "request_coalescing": processing_flights.get_stats()
         }
     except Exception as e:
         logger.error(f"Ошибка при сборе статистики производительности: {str(e)}")
@@ -0,0 +1,453 @@
+"""
+Модуль структурированных результатов OCR
+Компактное хранение страниц, блоков, строк и слов с рамками и уверенностью
+и сериализация в текст, JSON и ALTO XML
+"""
+
+import os
+import io
+import json
+import logging
+from typing import Any, Dict, List, Optional, Union
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Каталог структурированных результатов (отдельно от .txt: модули, читающие
+# ocr_results как текст, находят файлы по вхождению file_id в имя)
+STRUCTURED_RESULTS_DIR = os.getenv("OCR_STRUCTURED_DIR", os.path.join("ocr_results", "structured"))
+STRUCTURED_RESULT_EXTENSION = ".npz"
+
+# Версия формата файла
+RESULT_FORMAT_VERSION = 1
+
+# Уверенность хранится в uint8: 0-255 соответствует 0.0-1.0
+CONFIDENCE_SCALE = 255
+
+# Форматы сериализации и их типы содержимого
+RESULT_MEDIA_TYPES = {
+    "text": "text/plain; charset=utf-8",
+    "json": "application/json",
+    "alto": "application/xml"
+}
+RESULT_FORMATS = tuple(RESULT_MEDIA_TYPES)
+
+ALTO_NAMESPACE = "http://www.loc.gov/standards/alto/ns-v4#"
+ALTO_SCHEMA = "http://www.loc.gov/standards/alto/v4/alto-4-2.xsd"
+
+
+def _encode_confidence(values: List[float]) -> np.ndarray:
+    scaled = np.rint(np.clip(np.asarray(values, dtype=np.float64), 0.0, 1.0) * CONFIDENCE_SCALE)
+    return scaled.astype(np.uint8)
+
+
+def _bbox_row(bbox: Optional[Dict[str, int]]) -> List[int]:
+    if not bbox:
+        return [0, 0, 0, 0]
+    return [int(bbox["x"]), int(bbox["y"]), int(bbox["width"]), int(bbox["height"])]
+
+
+def _union(rows: List[List[int]]) -> List[int]:
+    rows = [row for row in rows if row[2] or row[3]]
+    if not rows:
+        return [0, 0, 0, 0]
+    x0 = min(row[0] for row in rows)
+    y0 = min(row[1] for row in rows)
+    x1 = max(row[0] + row[2] for row in rows)
+    y1 = max(row[1] + row[3] for row in rows)
+    return [x0, y0, x1 - x0, y1 - y0]
+
+
+def text_statistics(text: str) -> Dict[str, int]:
+    """
+    Статистика текста результата (те же определения, что в ответах /ocr)
+
+    Args:
+        text: Распознанный текст
+
+    Returns:
+        Словарь: text_length, word_count, character_count, line_count
+    """
+    return {
+        "text_length": len(text),
+        "word_count": len(text.split()),
+        "character_count": len(text.replace(" ", "")),
+        "line_count": len(text.split("\n"))
+    }
+
+
+class StructuredResult:
+    """
+    Структурированный результат распознавания
+
+    Текст хранится один раз, строки и слова ссылаются на него отрезками
+    [начало, конец); рамки - int32 (x, y, ширина, высота), уверенность -
+    uint8. Статистика вычисляется при сохранении и при чтении не пересчитывается.
+    """
+
+    __slots__ = ("text", "meta", "arrays")
+
+    def __init__(self, text: str, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.text = text
+        self.meta = meta
+        self.arrays = arrays
+
+    @classmethod
+    def build(cls, recognized_text: str, pages: List[Dict[str, Any]], **meta: Any) -> "StructuredResult":
+        """
+        Собирает результат из блоков строк recognize_page
+
+        Args:
+            recognized_text: Распознанный текст документа
+            pages: Страницы по порядку: page, width, height и text_blocks
+                (строки с text, confidence, bbox, language, model_type,
+                необязательными block и words)
+            **meta: Сведения о распознавании (file_id, engine_version, language...)
+
+        Returns:
+            Структурированный результат
+        """
+        languages: List[str] = []
+        models: List[str] = []
+
+        def vocabulary_index(vocabulary: List[str], value: Optional[str]) -> int:
+            value = value or ""
+            if value not in vocabulary:
+                vocabulary.append(value)
+            return vocabulary.index(value)
+
+        text = recognized_text
+        cursor = 0
+        page_rows = []
+        block_page, block_bbox = [], []
+        line_block, line_bbox, line_conf, line_span, line_language, line_model = [], [], [], [], [], []
+        word_line, word_bbox, word_conf, word_span = [], [], [], []
+
+        for page in pages:
+            blocks: Dict[Any, int] = {}
+            block_lines: Dict[int, List[List[int]]] = {}
+            for line in page["text_blocks"]:
+                key = line.get("block", 0)
+                if key not in blocks:
+                    blocks[key] = len(block_page)
+                    block_page.append(int(page["page"]))
+                    block_bbox.append(None)
+                block_index = blocks[key]
+
+                line_text = line["text"]
+                start = text.find(line_text, cursor, len(recognized_text)) if line_text else cursor
+                if start < 0:
+                    # Текст страницы не совпадает со строками (например, текстовый слой PDF):
+                    # строка дописывается после основного текста
+                    start = len(text) + 1
+                    text = f"{text}\n{line_text}"
+                else:
+                    cursor = start + len(line_text)
+                end = start + len(line_text)
+
+                row = _bbox_row(line.get("bbox"))
+                block_lines.setdefault(block_index, []).append(row)
+                line_number = len(line_block)
+                line_block.append(block_index)
+                line_bbox.append(row)
+                line_conf.append(line.get("confidence", 0.0))
+                line_span.append([start, end])
+                line_language.append(vocabulary_index(languages, line.get("language")))
+                line_model.append(vocabulary_index(models, line.get("model_type")))
+
+                word_cursor = start
+                for word in line.get("words") or []:
+                    word_start = -1
+                    if word.get("text"):
+                        word_start = text.find(word["text"], word_cursor, end)
+                    if word_start >= 0:
+                        word_cursor = word_start + len(word["text"])
+                        word_span.append([word_start, word_cursor])
+                    else:
+                        word_span.append([-1, -1])
+                    word_line.append(line_number)
+                    word_bbox.append(_bbox_row(word.get("bbox")))
+                    word_conf.append(word.get("confidence", line.get("confidence", 0.0)))
+
+            for block_index, rows in block_lines.items():
+                block_bbox[block_index] = _union(rows)
+            page_rows.append({
+                "page": int(page["page"]),
+                "width": int(page.get("width") or 0),
+                "height": int(page.get("height") or 0)
+            })
+
+        arrays = {
+            "block_page": np.asarray(block_page, dtype=np.int32),
+            "block_bbox": np.asarray(block_bbox, dtype=np.int32).reshape(-1, 4),
+            "line_block": np.asarray(line_block, dtype=np.int32),
+            "line_bbox": np.asarray(line_bbox, dtype=np.int32).reshape(-1, 4),
+            "line_conf": _encode_confidence(line_conf),
+            "line_span": np.asarray(line_span, dtype=np.int32).reshape(-1, 2),
+            "line_language": np.asarray(line_language, dtype=np.uint8),
+            "line_model": np.asarray(line_model, dtype=np.uint8),
+            "word_line": np.asarray(word_line, dtype=np.int32),
+            "word_bbox": np.asarray(word_bbox, dtype=np.int32).reshape(-1, 4),
+            "word_conf": _encode_confidence(word_conf),
+            "word_span": np.asarray(word_span, dtype=np.int32).reshape(-1, 2)
+        }
+        meta = {
+            **meta,
+            "format_version": RESULT_FORMAT_VERSION,
+            "pages": page_rows,
+            "languages": languages,
+            "model_types": models,
+            "statistics": {
+                **text_statistics(recognized_text),
+                "pages": len(page_rows),
+                "blocks": len(block_page),
+                "lines": len(line_block),
+                "words": len(word_line)
+            }
+        }
+        return cls(text, meta, arrays)
+
+    @property
+    def statistics(self) -> Dict[str, int]:
+        return self.meta["statistics"]
+
+    def to_text(self) -> str:
+        """Распознанный текст без строк, дописанных после него"""
+        return self.text[:self.statistics["text_length"]]
+
+    def _span_text(self, span: List[int]) -> Optional[str]:
+        return self.text[span[0]:span[1]] if span[0] >= 0 else None
+
+    def _lists(self) -> Dict[str, list]:
+        # Списки Python вместо поэлементного обращения к массивам numpy
+        return {name: array.tolist() for name, array in self.arrays.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Иерархия страниц, блоков, строк и слов
+
+        Returns:
+            Словарь с текстом, статистикой, сведениями о распознавании и страницами
+        """
+        a = self._lists()
+        scale = float(CONFIDENCE_SCALE)
+        languages = self.meta["languages"]
+        models = self.meta["model_types"]
+
+        words_by_line: List[List[Dict[str, Any]]] = [[] for _ in a["line_block"]]
+        for line_index, bbox, confidence, span in zip(a["word_line"], a["word_bbox"], a["word_conf"], a["word_span"]):
+            words_by_line[line_index].append({
+                "text": self._span_text(span),
+                "bbox": dict(zip(("x", "y", "width", "height"), bbox)),
+                "confidence": round(confidence / scale, 4)
+            })
+
+        blocks = [
+            {"bbox": dict(zip(("x", "y", "width", "height"), bbox)), "confidence": 0.0, "lines": []}
+            for bbox in a["block_bbox"]
+        ]
+        for line_index, (block_index, bbox, confidence, span, language, model) in enumerate(zip(
+            a["line_block"], a["line_bbox"], a["line_conf"], a["line_span"], a["line_language"], a["line_model"]
+        )):
+            blocks[block_index]["lines"].append({
+                "text": self._span_text(span),
+                "bbox": dict(zip(("x", "y", "width", "height"), bbox)),
+                "confidence": round(confidence / scale, 4),
+                "language": languages[language] or None,
+                "model_type": models[model] or None,
+                "words": words_by_line[line_index]
+            })
+
+        pages = {page["page"]: {**page, "blocks": []} for page in self.meta["pages"]}
+        for page_number, block in zip(a["block_page"], blocks):
+            lines = block["lines"]
+            # Уверенность блока - среднее по строкам, взвешенное длиной строк
+            length = sum(len(line["text"] or "") for line in lines)
+            if length:
+                block["confidence"] = round(sum(line["confidence"] * len(line["text"] or "") for line in lines) / length, 4)
+            pages[page_number]["blocks"].append(block)
+
+        info = {key: value for key, value in self.meta.items() if key not in ("pages", "languages", "model_types")}
+        return {**info, "text": self.to_text(), "pages": list(pages.values())}
+
+    def to_json(self) -> str:
+        """Сериализация to_dict() в JSON"""
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def to_alto(self) -> str:
+        """
+        Сериализация в ALTO XML (версия 4)
+
+        Координаты - в пикселях изображения страницы; WC - уверенность 0.0-1.0.
+        Строка, слова которой не сопоставлены с текстом, записывается одним
+        элементом String с рамкой строки.
+
+        Returns:
+            Документ ALTO
+        """
+        a = self._lists()
+        scale = float(CONFIDENCE_SCALE)
+        out = io.StringIO()
+        write = out.write
+
+        def position(bbox: List[int]) -> str:
+            return f'HPOS="{bbox[0]}" VPOS="{bbox[1]}" WIDTH="{bbox[2]}" HEIGHT="{bbox[3]}"'
+
+        words_by_line: List[List[int]] = [[] for _ in a["line_block"]]
+        for word_index, line_index in enumerate(a["word_line"]):
+            words_by_line[line_index].append(word_index)
+        lines_by_block: List[List[int]] = [[] for _ in a["block_page"]]
+        for line_index, block_index in enumerate(a["line_block"]):
+            lines_by_block[block_index].append(line_index)
+
+        write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        write(
+            f'<alto xmlns="{ALTO_NAMESPACE}" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            f'xsi:schemaLocation="{ALTO_NAMESPACE} {ALTO_SCHEMA}">\n'
+        )
+        write("<Description><MeasurementUnit>pixel</MeasurementUnit>")
+        if self.meta.get("source_file"):
+            write(f"<sourceImageInformation><fileName>{escape(str(self.meta['source_file']))}</fileName></sourceImageInformation>")
+        write(
+            "<OCRProcessing ID=\"OCR_0\"><ocrProcessingStep><processingSoftware>"
+            f"<softwareName>mosarchive-ocr</softwareName><softwareVersion>{escape(str(self.meta.get('engine_version', '')))}</softwareVersion>"
+            "</processingSoftware></ocrProcessingStep></OCRProcessing></Description>\n"
+        )
+        write("<Layout>\n")
+        for page in self.meta["pages"]:
+            page_blocks = [index for index, number in enumerate(a["block_page"]) if number == page["page"]]
+            width, height = page["width"], page["height"]
+            if not width or not height:
+                extent = _union([a["block_bbox"][index] for index in page_blocks])
+                width, height = extent[0] + extent[2], extent[1] + extent[3]
+            write(f'<Page ID="P{page["page"]}" PHYSICAL_IMG_NR="{page["page"]}" WIDTH="{width}" HEIGHT="{height}">\n')
+            write(f'<PrintSpace HPOS="0" VPOS="0" WIDTH="{width}" HEIGHT="{height}">\n')
+            for block_index in page_blocks:
+                write(f'<TextBlock ID="B{block_index}" {position(a["block_bbox"][block_index])}>\n')
+                for line_index in lines_by_block[block_index]:
+                    line_bbox = a["line_bbox"][line_index]
+                    line_wc = a["line_conf"][line_index] / scale
+                    write(f'<TextLine ID="L{line_index}" {position(line_bbox)}>')
+                    word_indices = words_by_line[line_index]
+                    if word_indices and all(a["word_span"][index][0] >= 0 for index in word_indices):
+                        for position_index, word_index in enumerate(word_indices):
+                            if position_index:
+                                write("<SP/>")
+                            write(
+                                f'<String ID="W{word_index}" {position(a["word_bbox"][word_index])} '
+                                f'CONTENT={quoteattr(self._span_text(a["word_span"][word_index]))} '
+                                f'WC="{a["word_conf"][word_index] / scale:.2f}"/>'
+                            )
+                    else:
+                        line_text = self._span_text(a["line_span"][line_index]) or ""
+                        write(
+                            f'<String ID="L{line_index}S" {position(line_bbox)} '
+                            f'CONTENT={quoteattr(line_text)} WC="{line_wc:.2f}"/>'
+                        )
+                    write("</TextLine>\n")
+                write("</TextBlock>\n")
+            write("</PrintSpace>\n</Page>\n")
+        write("</Layout>\n</alto>\n")
+        return out.getvalue()
+
+    def save(self, path: str) -> str:
+        """
+        Сохраняет результат в сжатый архив numpy
+
+        Args:
+            path: Путь к файлу .npz
+
+        Returns:
+            Путь к файлу
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(
+            path,
+            text=np.frombuffer(self.text.encode("utf-8"), dtype=np.uint8),
+            meta=np.frombuffer(json.dumps(self.meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+            **self.arrays
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "StructuredResult":
+        """
+        Загружает результат, сохраненный save()
+
+        Args:
+            path: Путь к файлу .npz
+
+        Returns:
+            Структурированный результат
+        """
+        with np.load(path, allow_pickle=False) as archive:
+            arrays = {name: archive[name] for name in archive.files}
+        text = arrays.pop("text").tobytes().decode("utf-8")
+        meta = json.loads(arrays.pop("meta").tobytes().decode("utf-8"))
+        return cls(text, meta, arrays)
+
+
+def read_result_meta(path: str) -> Dict[str, Any]:
+    """
+    Читает только сведения о результате, не распаковывая текст и массивы
+
+    Args:
+        path: Путь к файлу .npz
+
+    Returns:
+        Словарь meta результата (язык, движок, статистика...)
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        return json.loads(archive["meta"].tobytes().decode("utf-8"))
+
+
+def structured_result_path(file_id: str, timestamp: Union[int, str]) -> str:
+    """Путь структурированного результата для файла и момента распознавания"""
+    return os.path.join(STRUCTURED_RESULTS_DIR, f"{file_id}_{timestamp}{STRUCTURED_RESULT_EXTENSION}")
+
+
+def find_structured_results(file_id: str) -> List[str]:
+    """
+    Находит структурированные результаты файла
+
+    Args:
+        file_id: ID файла
+
+    Returns:
+        Пути к файлам, от новых к старым
+    """
+    if not os.path.isdir(STRUCTURED_RESULTS_DIR):
+        return []
+    prefix = f"{file_id}_"
+    paths = [
+        os.path.join(STRUCTURED_RESULTS_DIR, filename)
+        for filename in os.listdir(STRUCTURED_RESULTS_DIR)
+        if filename.startswith(prefix) and filename.endswith(STRUCTURED_RESULT_EXTENSION)
+    ]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def serialize_result(result: StructuredResult, result_format: str) -> str:
+    """
+    Сериализует результат в заданный формат
+
+    Args:
+        result: Структурированный результат
+        result_format: "text", "json" или "alto"
+
+    Returns:
+        Строка в запрошенном формате
+    """
+    if result_format == "text":
+        return result.to_text()
+    if result_format == "json":
+        return result.to_json()
+    if result_format == "alto":
+        return result.to_alto()
+    raise ValueError(f"Неподдерживаемый формат результата: {result_format}")